@@ -13,6 +13,8 @@ from typing import Dict, Union, Optional
 
 AUTHORIZATION_ALGORITHM = "HMAC-SHA256"
 SIG_LIFETIME = datetime.timedelta(minutes=2, seconds=30)
+# Size of the chunks of the hashed files, the file isn't loaded into memory
+HASH_CHUNK_SIZE = 64 * 1024
 
 
 def _is_file_like(obj) -> bool:
@@ -21,10 +23,12 @@ def _is_file_like(obj) -> bool:
 
 
 def _hash_file(obj):
-    '''Return file-like hash'''
-    hash_ = hashlib.sha1(obj.read()).hexdigest()
+    '''Return file-like hash. The file is read in chunks and rewound.'''
+    hash_ = hashlib.sha1()
+    for chunk in iter(lambda: obj.read(HASH_CHUNK_SIZE), b""):
+        hash_.update(chunk)
     obj.seek(0)
-    return hash_
+    return hash_.hexdigest()
 
 
 def _serialize_single_item(key, value):
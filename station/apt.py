@@ -0,0 +1,333 @@
+'''
+NOAA APT decoder based only on NumPy.
+
+The signal (WAV file, e.g. 11025 Hz from sox) is processed in chunks, so
+the memory usage doesn't depend on the pass length (except the image):
+
+1. AM demodulation - envelope (magnitude of the analytic signal, Hilbert
+   transform via FFT) of the 2400 Hz subcarrier.
+2. Polyphase resampling to 4160 Hz - one sample per pixel (word).
+3. Sync A correlation via FFT and line assembly - each line (2080 words)
+   starts at the sync A, found near the end of the previous line.
+'''
+
+from fractions import Fraction
+import wave
+
+import numpy as np
+
+# Words (pixels) per second and per line (two lines per second)
+WORD_RATE = 4160
+LINE_WORDS = 2080
+# Sync A: 7 cycles of 1040 Hz square wave (at the word rate), preceded and followed by the space
+SYNC_A = np.array([0] * 4 + [1, 1, 0, 0] * 7 + [0] * 7, dtype=np.float64)
+# The sync is searched within this distance (words) from the expected position, if
+# the previous line was synchronized. Otherwise, within the whole line.
+SYNC_TOLERANCE = 20
+# Min normalized correlation (from -1 to 1) of the synchronized line
+SYNC_THRESHOLD = 0.5
+# Number of samples of the signal processed at once
+CHUNK_SAMPLES = 1 << 16
+# Number of samples on each side of the chunk used only as the context of the Hilbert transform
+ENVELOPE_MARGIN = 1024
+# Taps of each phase of the resampling filter
+TAPS_PER_PHASE = 24
+# Percentiles of the envelope mapped to black and white
+CONTRAST_PERCENTILES = (0.5, 99.5)
+
+
+def _next_power_of_2(n):
+    return 1 << max(int(n) - 1, 0).bit_length()
+
+
+def get_envelope(samples: np.ndarray) -> np.ndarray:
+    """
+    Get envelope of the signal - magnitude of the analytic signal
+
+    :param samples: Real signal
+    :return: Envelope, the same length as the signal
+    """
+    n = _next_power_of_2(samples.size)
+    spectrum = np.fft.rfft(samples - np.mean(samples), n)
+    # Analytic signal: the positive frequencies doubled, the negative ones removed
+    analytic = np.zeros(n, dtype=np.complex128)
+    analytic[0] = spectrum[0]
+    analytic[1:n // 2] = 2.0 * spectrum[1:n // 2]
+    analytic[n // 2] = spectrum[n // 2]
+    return np.abs(np.fft.ifft(analytic)[:samples.size])
+
+
+class EnvelopeDetector():
+    """
+    Streaming AM demodulator. Each chunk is transformed with the context
+    of `margin` samples on both sides, so the output is delayed by `margin`
+    samples until the flush.
+    """
+
+    def __init__(self, margin=ENVELOPE_MARGIN):
+        self.margin = margin
+        self._buffer = np.zeros(0)
+        # Number of samples at the beginning of the buffer, which are only the context
+        self._context = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Add samples, returns the envelope of the next samples"""
+        buffer = np.concatenate([self._buffer, samples])
+        end = buffer.size - self.margin
+        if end - self._context < self.margin:
+            self._buffer = buffer
+            return np.zeros(0)
+        envelope = get_envelope(buffer)[self._context:end]
+        self._buffer = buffer[end - self.margin:]
+        self._context = self.margin
+        return envelope
+
+    def flush(self) -> np.ndarray:
+        """Returns the envelope of the remaining samples"""
+        if self._buffer.size == 0:
+            return np.zeros(0)
+        envelope = get_envelope(self._buffer)[self._context:]
+        self._buffer = np.zeros(0)
+        self._context = 0
+        return envelope
+
+
+def get_lowpass_filter(up: int, down: int, taps_per_phase: int = TAPS_PER_PHASE) -> np.ndarray:
+    """
+    Design the anti-aliasing filter of the resampler (windowed sinc) at the
+    rate `up` times the input rate. The gain is `up`, so the interpolated
+    signal keeps the amplitude.
+    """
+    length = up * taps_per_phase
+    # Cutoff (cycles per sample) at the lower of the Nyquist frequencies
+    cutoff = 0.5 / max(up, down)
+    t = np.arange(length) - (length - 1) / 2.0
+    return up * 2.0 * cutoff * np.sinc(2.0 * cutoff * t) * np.kaiser(length, 8.0)
+
+
+class Resampler():
+    """
+    Streaming rational resampler (polyphase FIR). Each output sample is
+    computed only from the `taps_per_phase` input samples, with the phase
+    of the filter selected by its position between the input samples.
+
+    :param input_rate: Input sample rate (Hz)
+    :param output_rate: Output sample rate (Hz)
+    """
+
+    def __init__(self, input_rate: int, output_rate: int, taps_per_phase: int = TAPS_PER_PHASE):
+        ratio = Fraction(int(output_rate), int(input_rate))
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self.taps = taps_per_phase
+        # phases[p, k] is the coefficient of the input sample base - k for phase p
+        self.phases = get_lowpass_filter(self.up, self.down, taps_per_phase).reshape(taps_per_phase, self.up).T.copy()
+        # The samples before the first one are zeros
+        self._buffer = np.zeros(taps_per_phase - 1)
+        self._offset = -(taps_per_phase - 1)
+        self._next = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Add samples, returns the output samples computed from all the input samples so far"""
+        buffer = np.concatenate([self._buffer, samples])
+        last = self._offset + buffer.size - 1
+        # The last output sample, which is based on the available input samples
+        end = ((last + 1) * self.up - 1) // self.down + 1
+        if end <= self._next:
+            self._buffer = buffer
+            return np.zeros(0)
+
+        n = np.arange(self._next, end, dtype=np.int64)
+        position = n * self.down
+        base = position // self.up - self._offset
+        indices = base[:, None] - np.arange(self.taps)[None, :]
+        output = np.einsum('ij,ij->i', buffer[indices], self.phases[position % self.up])
+
+        self._next = end
+        # When downsampling, the next output may not need the last input samples
+        first_needed = min((end * self.down) // self.up - (self.taps - 1), last + 1)
+        self._buffer = buffer[first_needed - self._offset:]
+        self._offset = first_needed
+        return output
+
+
+def correlate(signal: np.ndarray, pattern: np.ndarray) -> np.ndarray:
+    """
+    Cross-correlation via FFT, valid part only: result[i] = sum(signal[i:i + len(pattern)] * pattern)
+    """
+    count = signal.size - pattern.size + 1
+    if count <= 0:
+        return np.zeros(0)
+    n = _next_power_of_2(signal.size + pattern.size)
+    product = np.fft.rfft(signal, n) * np.conj(np.fft.rfft(pattern, n))
+    return np.fft.irfft(product, n)[:count]
+
+
+class LineAssembler():
+    """
+    Splits the stream of words (at 4160 Hz) into lines. Each line starts at
+    the sync A. If the sync isn't found (e.g. noise at AOS), the line starts
+    one line length after the previous line. The lines are only counted if
+    keep_lines is False (e.g. to rate the signal).
+    """
+
+    def __init__(self, keep_lines: bool = True):
+        # Zero mean pattern, so the correlation doesn't depend on the signal offset
+        self.pattern = SYNC_A - np.mean(SYNC_A)
+        self.keep_lines = keep_lines
+        self.lines = []
+        # Number of the assembled and synchronized lines
+        self.count = 0
+        self.synchronized = 0
+        # Normalized correlation of the sync A of each line
+        self.correlations = []
+        self._signal = np.zeros(0)
+        self._correlation = np.zeros(0)
+        self._offset = 0
+        self._expected = None
+        self._locked = False
+
+    def process(self, words: np.ndarray):
+        """Add words, assembles the complete lines"""
+        self._signal = np.concatenate([self._signal, words])
+        # The correlation of the new positions (the previous ones are already computed)
+        start = self._correlation.size
+        segment = self._signal[start:]
+        self._correlation = np.concatenate([self._correlation, correlate(segment, self.pattern)])
+        while self._assemble_line():
+            pass
+
+    def _assemble_line(self):
+        if self._expected is None:
+            # Start with the search within the first line
+            self._expected = self._offset + LINE_WORDS // 2
+        tolerance = SYNC_TOLERANCE if self._locked else LINE_WORDS // 2
+        begin = max(self._expected - tolerance, self._offset)
+        end = self._expected + tolerance
+        if end - self._offset > self._correlation.size or begin + LINE_WORDS - self._offset > self._signal.size:
+            return False
+
+        window = self._correlation[begin - self._offset:end - self._offset]
+        start = begin + int(np.argmax(window))
+        correlation = self._get_normalized_correlation(start)
+        locked = correlation >= SYNC_THRESHOLD
+        if not locked:
+            start = self._expected
+        if start + LINE_WORDS - self._offset > self._signal.size:
+            return False
+
+        self._locked = locked
+        self.synchronized += locked
+        self.count += 1
+        self.correlations.append(correlation if locked else 0.0)
+        if self.keep_lines:
+            self.lines.append(self._signal[start - self._offset:start - self._offset + LINE_WORDS].astype(np.float32))
+        self._expected = start + LINE_WORDS
+        # Drop the words before the next search window
+        drop = max(self._expected - LINE_WORDS // 2 - self._offset, 0)
+        drop = min(drop, self._correlation.size)
+        self._signal = self._signal[drop:]
+        self._correlation = self._correlation[drop:]
+        self._offset += drop
+        return True
+
+    def _get_normalized_correlation(self, start):
+        words = self._signal[start - self._offset:start - self._offset + self.pattern.size]
+        norm = np.linalg.norm(words - np.mean(words)) * np.linalg.norm(self.pattern)
+        return np.dot(words, self.pattern) / norm if norm != 0 else 0.0
+
+
+class APTDecoder():
+    """
+    Streaming APT decoder: demodulation, resampling and line assembly
+
+    :param sample_rate: Sample rate of the signal (Hz)
+    :param keep_lines: Keep the lines for the image, see LineAssembler
+    """
+
+    def __init__(self, sample_rate: int, keep_lines: bool = True):
+        self.envelope = EnvelopeDetector()
+        self.resampler = Resampler(sample_rate, WORD_RATE)
+        self.assembler = LineAssembler(keep_lines)
+
+    def process(self, samples: np.ndarray):
+        """Add samples of the signal"""
+        self.assembler.process(self.resampler.process(self.envelope.process(samples)))
+
+    def flush(self):
+        """Process the remaining samples"""
+        self.assembler.process(self.resampler.process(self.envelope.flush()))
+
+    def finish(self) -> np.ndarray:
+        """
+        Process the remaining samples and returns the image
+
+        :return: Image (lines x 2080 words), 8-bit grayscale
+        :rtype: np.ndarray of uint8
+        """
+        self.flush()
+        return to_image(self.assembler.lines)
+
+
+def to_image(lines) -> np.ndarray:
+    """Map the envelope of the lines into 8-bit grayscale image, the contrast is stretched"""
+    if len(lines) == 0:
+        return np.zeros((0, LINE_WORDS), dtype=np.uint8)
+    image = np.stack(lines)
+    low, high = np.percentile(image, CONTRAST_PERCENTILES)
+    scale = 255.0 / (high - low) if high > low else 0.0
+    return np.clip((image - low) * scale, 0.0, 255.0).astype(np.uint8)
+
+
+def read_wav(path: str, chunk_samples: int = CHUNK_SAMPLES):
+    """
+    Read the WAV file (8, 16 or 32-bit PCM) in chunks, the channels are averaged.
+    The samples are signed (8-bit ones are shifted by -128).
+
+    :return: Sample rate and iterator of the chunks (float arrays)
+    """
+    f = wave.open(path, "rb")
+    sample_rate = f.getframerate()
+    channels = f.getnchannels()
+    dtype = {1: np.uint8, 2: np.dtype('<i2'), 4: np.dtype('<i4')}[f.getsampwidth()]
+
+    def chunks():
+        with f:
+            while True:
+                frames = f.readframes(chunk_samples)
+                if not frames:
+                    break
+                samples = np.frombuffer(frames, dtype=dtype).astype(np.float64)
+                if dtype == np.uint8:
+                    # 8-bit PCM is unsigned, centered at 128
+                    samples -= 128
+                yield samples.reshape(-1, channels).mean(axis=1)
+
+    return sample_rate, chunks()
+
+
+def decode_wav(path: str) -> np.ndarray:
+    """
+    Decode the APT image from the WAV file
+
+    :return: Image (lines x 2080 words), 8-bit grayscale
+    :rtype: np.ndarray of uint8
+    """
+    sample_rate, chunks = read_wav(path)
+    decoder = APTDecoder(sample_rate)
+    for chunk in chunks:
+        decoder.process(chunk)
+    return decoder.finish()
+
+
+if __name__ == '__main__':
+    import sys
+    from utils.png import write_png
+
+    if len(sys.argv) < 2:
+        print("Usage: apt.py signal.wav [product.png]")
+        sys.exit(-1)
+
+    infile = sys.argv[1]
+    outfile = sys.argv[2] if len(sys.argv) >= 3 else infile[:infile.rfind(".")] + ".png"
+    write_png(outfile, decode_wav(infile))
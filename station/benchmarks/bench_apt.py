@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Measures the decoding time of the NumPy APT decoder (apt.py) on a synthetic
+pass. The decoder should be faster than real time (the real time factor
+is the pass length divided by the decoding time).
+
+Usage (from the station directory):
+
+    PYTHONPATH=. python3 benchmarks/bench_apt.py [minutes] [sample rate]
+"""
+
+import os.path
+import resource
+import sys
+import tempfile
+import time
+import wave
+
+import numpy as np
+
+import apt
+
+SUBCARRIER_HZ = 2400
+CHUNK_LINES = 120
+
+
+def write_synthetic_pass(path: str, minutes: float, sample_rate: int):
+    """AM modulated subcarrier with the sync A at the beginning of each line and noise, written in chunks."""
+    rng = np.random.default_rng(0)
+    line = rng.uniform(0, 255, apt.LINE_WORDS)
+    line[0:39] = apt.SYNC_A * 255
+    lines = int(minutes * 60 * apt.WORD_RATE / apt.LINE_WORDS)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        sample = 0
+        for start in range(0, lines, CHUNK_LINES):
+            words = np.tile(line, min(CHUNK_LINES, lines - start))
+            count = int((start * apt.LINE_WORDS + words.size) * sample_rate / apt.WORD_RATE) - sample
+            t = (sample + np.arange(count)) / sample_rate
+            index = np.minimum((t * apt.WORD_RATE).astype(np.int64) - start * apt.LINE_WORDS, words.size - 1)
+            signal = (0.1 + 0.9 * words[index] / 255.0) * np.sin(2 * np.pi * SUBCARRIER_HZ * t)
+            signal += rng.normal(0, 0.1, count)
+            f.writeframes((signal * 10000).astype('<i2').tobytes())
+            sample += count
+    return lines
+
+
+if __name__ == '__main__':
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 15.0
+    sample_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 11025
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "signal.wav")
+    try:
+        lines = write_synthetic_pass(path, minutes, sample_rate)
+        start = time.perf_counter()
+        image = apt.decode_wav(path)
+        elapsed = time.perf_counter() - start
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(directory)
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print("%.1f min pass at %d Hz: %d/%d lines decoded in %.1f s, real time factor %.1fx, max RSS %.0f MB" % (
+        minutes, sample_rate, image.shape[0], lines, elapsed, minutes * 60 / elapsed, max_rss_mb))
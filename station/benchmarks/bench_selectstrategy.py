@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Compares the reference (create_strategy) and the interval
+(create_interval_strategy) pass selection engines on synthetic pass sets.
+
+Usage (from the station directory):
+
+    PYTHONPATH=. python3 benchmarks/bench_selectstrategy.py [days] [satellites]
+"""
+
+import datetime
+import random
+import sys
+import timeit
+
+from orbit_predictor.locations import Location
+from orbit_predictor.predictors import PredictedPass
+
+import selectstrategy
+
+LOCATION = Location("BENCHMARK", 54.35, 18.65, 10)
+START = datetime.datetime(2020, 1, 1)
+
+
+def get_synthetic_passes(days: int, satellites: int, seed: int = 0):
+    """LEO-like passes: ~100 min period, 4 to 16 min long, visible roughly 6 times a day."""
+    rnd = random.Random(seed)
+    dataset = []
+    for sat in range(satellites):
+        name = "SAT %d" % (sat,)
+        t = rnd.uniform(0, 100 * 60)
+        while t < days * 24 * 60 * 60:
+            duration = rnd.uniform(4 * 60, 16 * 60)
+            aos = START + datetime.timedelta(seconds=t)
+            los = aos + datetime.timedelta(seconds=duration)
+            tca = aos + datetime.timedelta(seconds=duration * rnd.uniform(0.3, 0.7))
+            dataset.append((name, PredictedPass(LOCATION, name, rnd.uniform(0, 90), aos, los, duration,
+                                                max_elevation_date=tca)))
+            t += rnd.choice((1, 1, 2, 8)) * 100 * 60
+    return dataset
+
+
+def benchmark(name, reference, interval, dataset, repeat=3):
+    reference_time = min(timeit.repeat(lambda: reference(dataset), number=1, repeat=repeat))
+    interval_time = min(timeit.repeat(lambda: interval(dataset), number=1, repeat=repeat))
+    print("%-14s %6d passes   reference: %8.1f ms   interval: %8.1f ms   speedup: %6.1fx" % (
+        name, len(dataset), reference_time * 1000, interval_time * 1000, reference_time / interval_time))
+
+
+if __name__ == '__main__':
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+    satellites = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    dataset = get_synthetic_passes(days, satellites)
+
+    aos_key, aos_selector = (lambda o: o.pass_.aos), (lambda _d, _p, _lr, rr: rr)
+    benchmark("aos", selectstrategy.create_strategy(aos_key, aos_selector),
+              selectstrategy.create_interval_strategy(aos_key, aos_selector), dataset)
+
+    elevation_key = (lambda o: -o.pass_.max_elevation_deg)
+    benchmark("max-elevation", selectstrategy.create_strategy(elevation_key, selectstrategy.max_elevation_selector),
+              selectstrategy.create_interval_strategy(elevation_key, selectstrategy.max_elevation_selector), dataset)
+
+    for weight in ("elevation", "duration"):
+        optimal = selectstrategy.strategy_factory("optimal", weight)
+        optimal_time = min(timeit.repeat(lambda: optimal(dataset), number=1, repeat=3))
+        print("optimal/%-9s %d passes   %8.1f ms   selected: %d" % (weight, len(dataset), optimal_time * 1000, len(optimal(dataset))))
@@ -13,10 +13,7 @@ import itertools
 from pprint import pprint
 from dateutil import tz
 
-from deepdiff import DeepHash
-
 import planner
-from orbitdb import OrbitDatabase
 from metadata import Metadata
 from utils.models import Configuration, SatelliteConfiguration, get_location, get_satellite
 from utils.configuration import open_config, save_config
@@ -26,10 +23,8 @@ from utils.dates import from_iso_format
 from utils.cron import get_planner_command, get_receiver_command, open_crontab
 from utils.observations import obs_list
 from crontab import CronItem
-from orbit_predictor.locations import Location
 from recipes.factory import get_recipe_names
 from quality_ratings import get_rate_names
-import az_elev_chart
 
 
 def get_interval(job: CronItem) -> int:
@@ -61,6 +56,7 @@ def update_config(config: Configuration, args, names: Tuple):
 
 def get_hash(obj):
     """Retuns a hash for a given object."""
+    from deepdiff import DeepHash
     return DeepHash(obj)[obj]
 
 
@@ -96,10 +92,7 @@ def parse_receiver_job(job) -> Tuple[str, datetime.datetime, datetime.datetime]:
     Returns satellite name, AOS and LOS.
     AOS is recover from job start date. Therefore it has one minute accuracy.
     '''
-    parameters = job.command.replace(RECEIVER_COMMAND, "")
-    sat_name, los_raw = parameters.rsplit(maxsplit=1)
-    sat_name = sat_name.strip('"')
-    los_raw = los_raw.strip('"')
+    sat_name, los, _ = planner.parse_command(job.command)
 
     now = datetime.datetime.now()
     now = now.replace(tzinfo=tz.tzlocal())
@@ -115,7 +108,6 @@ def parse_receiver_job(job) -> Tuple[str, datetime.datetime, datetime.datetime]:
     else:
         aos = prev
 
-    los = from_iso_format(los_raw)
     los = los.replace(tzinfo=tz.tzutc())
 
     return sat_name, aos, los
@@ -140,6 +132,10 @@ plan_parser.add_argument("--force", action="store_true", default=False, help="Pe
 plan_parser.add_argument("--show", action="store_true", default=False, help="Just show incoming passes, don't plan anything (default: %(default)s)")
 plan_parser.add_argument("--skip-update", action="store_true", default=False, help="Disables periodic update. (default: %(default)s)")
 
+daemon_parser = subparsers.add_parser("daemon", help="Run long-running station process instead of cron jobs")
+daemon_parser.add_argument("--interval", type=float, default=4, help="How often to re-plan passes [hours] (default: %(default)s)")
+daemon_parser.add_argument("--horizon", type=float, default=24, help="How far to plan passes [hours] (default: %(default)s)")
+
 pass_parser = subparsers.add_parser("pass", help="Information about passes")
 pass_parser.add_argument("target", type=str, help="Pass number or satellite name")
 pass_parser.add_argument("--aos", help="AOS in ISO format. If not provided then display next pass", type=from_iso_format, required=False)
@@ -179,7 +175,16 @@ location_config_parser.add_argument("-ele", "--elevation", type=float, help="Ele
 global_config_parser = config_subparsers.add_parser("global", help="Change global prediction parameters")
 global_config_parser.add_argument("-aos", type=int, help="Elevation (in degress) on AOS")
 global_config_parser.add_argument("-me", "--max-elevation", type=int, help="Max elevation greater than")
-global_config_parser.add_argument("-s", "--strategy", choices=["aos", "max-elevation"], help="Select strategy to track satellites")
+global_config_parser.add_argument("-s", "--strategy", choices=["aos", "max-elevation", "optimal"], help="Select strategy to track satellites")
+global_config_parser.add_argument("--weight", choices=["elevation", "duration"],
+                                  help="Select weight of observation used by the optimal strategy (elevation - max elevation, duration - observation length)")
+global_config_parser.add_argument("--prediction", choices=["batch", "iterative"],
+                                  help="Select pass prediction engine (batch - all satellites at once, iterative - one by one)")
+global_config_parser.add_argument("--planning", choices=["full", "incremental"],
+                                  help="Select planning mode (full - replan all passes, incremental - keep scheduled passes, plan only new ones)")
+global_config_parser.add_argument("--receivers", nargs="*", type=str,
+                                  help="Devices (rtl-sdr indexes or serials, or SoapySDR device strings) to receive overlapping passes "
+                                       "in parallel. Empty for single default device")
 submit_global_config_parser = global_config_parser.add_mutually_exclusive_group()
 submit_global_config_parser.add_argument("--submit", action="store_true", help="Submit observations to content server", dest="submit", default=None)
 submit_global_config_parser.add_argument("--no-submit", action="store_false", help="Don't submit observations to content server", dest="submit", default=None)
@@ -194,6 +199,7 @@ satellite_config_parser.add_argument("-me", "--max-elevation", type=int, help="M
 satellite_config_parser.add_argument("-d", "--delete", action="store_true", default=False, help="Delete satellite")
 satellite_config_parser.add_argument("--recipe", choices=get_recipe_names(), help="Recipe name to handle observation")
 satellite_config_parser.add_argument("--rate", choices=get_rate_names(), help="Function to rate quality of imagery")
+satellite_config_parser.add_argument("--priority", type=float, help="Multiplier of observation weight used by the optimal strategy")
 submit_satellite_config_parser = satellite_config_parser.add_mutually_exclusive_group()
 submit_satellite_config_parser.add_argument("--submit", action="store_true", help="Submit observations to content server", dest="submit", default=None)
 submit_satellite_config_parser.add_argument(
@@ -238,6 +244,7 @@ if command == "clear":
     cron.remove_all(comment=COMMENT_PASS_TAG)
     cron.remove_all(comment=COMMENT_PLAN_TAG)
     cron.write()
+    planner.set_planned_until(None)
     print("Cleared all existing jobs")
 
 elif command == "logs":
@@ -309,6 +316,20 @@ elif command == "plan":
 
             print(" ".join([str(idx).rjust(2), status, description, parameters]))
 
+elif command == "daemon":
+    # The daemon replaces the planner and receiver jobs. Keeping them would
+    # record every pass twice.
+    if planner_job is not None or len(list(cron.find_comment(COMMENT_PASS_TAG))) != 0:
+        cron.remove_all(comment=COMMENT_PASS_TAG)
+        cron.remove_all(comment=COMMENT_PLAN_TAG)
+        cron.write()
+        planner.set_planned_until(None)
+        print("Removed planner and receiver cron jobs, they are replaced by the daemon. Use plan command to restore them.")
+
+    import daemon
+    print("Starting station daemon (re-plan every %.1f h, horizon %.1f h)" % (args.interval, args.horizon))
+    daemon.execute(args.interval * 60 * 60, args.horizon * 60 * 60)
+
 elif command == "pass":
     pass_target = args.target
     if pass_target.isdecimal():
@@ -328,6 +349,11 @@ elif command == "pass":
             aos = datetime.datetime.utcnow()
             aos = aos.replace(tzinfo=tz.tzutc())
 
+    # The prediction and chart modules are loaded only by the commands using them
+    from orbit_predictor.locations import Location
+    from orbitdb import OrbitDatabase
+    import az_elev_chart
+
     aos = aos.astimezone(tz.tzutc())
     db = OrbitDatabase()
     config = open_config()
@@ -366,6 +392,10 @@ elif command == "config":
             ("aos_at", "aos"),
             ("max_elevation_greater_than", "max_elevation"),
             "strategy",
+            "weight",
+            "prediction",
+            "planning",
+            "receivers",
             "submit",
             "save_to_disk",
             ("directory", "obsdir")
@@ -400,7 +430,7 @@ elif command == "config":
                     ("freq", "frequency"),
                     ("aos_at", "aos"),
                     ("max_elevation_greater_than", "max_elevation"),
-                    "recipe", "rate"
+                    "recipe", "rate", "priority"
                 ))
                 if args.submit and 'submit' in sat:
                     del sat['submit']
@@ -420,6 +450,7 @@ elif command == "config":
         elif args.delete:
             section.clear()
     elif config_command == "norad":
+        from orbitdb import OrbitDatabase
         section = config["norad"]
         if args.urls is None:
             if args.delete:
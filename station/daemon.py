@@ -0,0 +1,239 @@
+"""
+Long-running station process. It replaces the cron jobs (planner and one
+receiver job per pass). The configuration, the orbit catalog and the
+recipe modules are loaded once, so nothing is imported or parsed in the
+critical moment before AOS.
+
+The upcoming passes are kept in a heap ordered by AOS. The receptions are
+started at AOS in the worker threads and the passes are re-planned
+periodically. The reception is only the capture phase of the recipe; the
+processing queue (see postprocessing) is drained in the dedicated thread,
+so the decoding never holds a worker thread needed by the next reception.
+"""
+
+import asyncio
+import concurrent.futures
+import datetime
+import heapq
+import itertools
+import logging
+from typing import Callable, List, Optional, Set, Tuple
+
+from planner import get_passes
+from selectstrategy import Observation
+from utils.configuration import open_config
+from utils.models import Configuration
+
+# How often (in seconds) the passes are re-planned
+REPLAN_INTERVAL_S = 4 * 60 * 60
+# How far (in seconds) the passes are planned
+HORIZON_S = 24 * 60 * 60
+# The longest sleep (in seconds). The daemon wakes up periodically, so it
+# isn't affected by the system clock changes.
+MAX_SLEEP_S = 60
+
+Receive = Callable[[str, datetime.datetime, Optional[str], Configuration], None]
+Drain = Callable[[Configuration], None]
+
+
+def _default_receive(name: str, los: datetime.datetime, device: Optional[str], config: Configuration):
+    from receiver import receive
+    receive(name, los, device, config, drain=False)
+
+
+def _default_drain(config: Configuration):
+    import postprocessing
+    postprocessing.drain(config)
+
+
+class StationDaemon:
+    """
+    Schedules and executes the receptions.
+
+    :param config: station configuration, read from the config file if not specified
+    :param interval_s: how often the passes are re-planned
+    :param horizon_s: how far the passes are planned
+    :param receive: function executing the reception (the capture), receiver.receive by default
+    :param drain: function processing the queued jobs, postprocessing.drain by default
+    """
+
+    def __init__(self, config: Optional[Configuration] = None,
+                 interval_s: float = REPLAN_INTERVAL_S, horizon_s: float = HORIZON_S,
+                 receive: Receive = _default_receive, drain: Drain = _default_drain):
+        self.config = config if config is not None else open_config()
+        self.interval = datetime.timedelta(seconds=interval_s)
+        self.horizon = datetime.timedelta(seconds=horizon_s)
+        self.receive = receive
+        self.drain = drain
+        # Entries are (AOS, sequence number, observation). The sequence number
+        # prevents comparing the observations.
+        self._queue: List[Tuple[datetime.datetime, int, Observation]] = []
+        self._counter = itertools.count()
+        self._running: Set[asyncio.Future] = set()
+        self._drain_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="drain")
+        self._draining: Optional[asyncio.Future] = None
+        self._drain_requested = False
+        self._planned_until: Optional[datetime.datetime] = None
+        self._last_los: Optional[datetime.datetime] = None
+        self.next_planning: Optional[datetime.datetime] = None
+
+    def pending(self) -> List[Observation]:
+        """Returns the queued observations ordered by AOS."""
+        return [o for _, _, o in sorted(self._queue)]
+
+    def get_new_passes(self, now: datetime.datetime) -> Tuple[List[Observation], datetime.datetime]:
+        """
+        Computes passes up to now + horizon (naive UTC). The new passes start
+        after the queued ones (the same rules as in the incremental planning).
+        It doesn't modify the queue, so it may be executed in the worker thread.
+
+        :return: List of new observations and end of the planned horizon
+        """
+        end = now + self.horizon
+        from_ = max(d for d in (now, self._planned_until, self._last_los) if d is not None)
+
+        observations: List[Observation] = []
+        if from_ < end:
+            observations = get_passes(self.config, from_, end)  # type: ignore
+
+        selected = []
+        for entry in observations:
+            if entry.range.start_datetime < from_:
+                entry.range.set_start_datetime(from_)
+            if entry.range.get_timedelta_second() >= 1:
+                selected.append(entry)
+        return selected, end
+
+    def add_passes(self, observations: List[Observation], planned_until: datetime.datetime):
+        """Adds the planned observations to the queue."""
+        for entry in observations:
+            self.push(entry)
+        self._planned_until = planned_until
+        logging.info("Planned %d new passes until %s, %d passes in queue" % (len(observations), planned_until, len(self._queue)))
+
+    def plan(self, now: datetime.datetime) -> List[Observation]:
+        """
+        Plans passes up to now + horizon and adds them to the queue.
+
+        :return: List of new observations
+        """
+        self.next_planning = now + self.interval
+        observations, planned_until = self.get_new_passes(now)
+        self.add_passes(observations, planned_until)
+        return observations
+
+    def push(self, observation: Observation):
+        """Adds the observation to the queue."""
+        heapq.heappush(self._queue, (observation.range.start_datetime, next(self._counter), observation))
+        los = observation.range.end_datetime
+        if self._last_los is None or los > self._last_los:
+            self._last_los = los
+
+    def pop_due(self, now: datetime.datetime) -> List[Observation]:
+        """Removes and returns observations with AOS before now. The ones already finished are dropped."""
+        due = []
+        while len(self._queue) != 0 and self._queue[0][0] <= now:
+            _, _, observation = heapq.heappop(self._queue)
+            if observation.range.end_datetime <= now:
+                logging.warning("Pass of %s (LOS: %s) missed" % (observation.data, observation.range.end_datetime))
+                continue
+            due.append(observation)
+        return due
+
+    def get_sleep_time(self, now: datetime.datetime) -> float:
+        """Returns time (in seconds) to the next event (AOS or planning)."""
+        events = [now + datetime.timedelta(seconds=MAX_SLEEP_S)]
+        if len(self._queue) != 0:
+            events.append(self._queue[0][0])
+        if self.next_planning is not None:
+            events.append(self.next_planning)
+        return max(0.0, (min(events) - now).total_seconds())
+
+    def launch(self, observation: Observation) -> asyncio.Future:
+        """Starts the reception in the worker thread."""
+        logging.info("Starting reception of %s (LOS: %s, device: %s)" % (observation.data, observation.range.end_datetime, observation.device))
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self.receive, observation.data, observation.range.end_datetime,
+                                      observation.device, self.config)
+        self._running.add(future)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _on_done(self, future: asyncio.Future):
+        self._running.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Reception failed", exc_info=future.exception())
+        self.request_drain()
+
+    def request_drain(self):
+        """
+        Starts draining the processing queue in the dedicated thread. If it
+        is already draining, it drains again when finished (the job may be
+        queued after the queue was checked).
+        """
+        if self._draining is not None:
+            self._drain_requested = True
+            return
+        self._drain_requested = False
+        loop = asyncio.get_running_loop()
+        self._draining = loop.run_in_executor(self._drain_executor, self.drain, self.config)
+        self._draining.add_done_callback(self._on_drained)
+
+    def _on_drained(self, future: asyncio.Future):
+        self._draining = None
+        if not future.cancelled() and future.exception() is not None:
+            logging.error("Processing failed", exc_info=future.exception())
+        if self._drain_requested:
+            self.request_drain()
+
+    async def run(self, until: Optional[datetime.datetime] = None):
+        """
+        Main loop. Runs forever if until isn't specified. The planning is
+        executed in the worker thread, so it doesn't delay the receptions.
+        """
+        loop = asyncio.get_running_loop()
+        planning: Optional[asyncio.Future] = None
+        # The jobs left by the previous run
+        self.request_drain()
+        while until is None or datetime.datetime.utcnow() < until:
+            now = datetime.datetime.utcnow()
+            for observation in self.pop_due(now):
+                self.launch(observation)
+
+            if planning is None and (self.next_planning is None or self.next_planning <= now):
+                self.next_planning = now + self.interval
+                planning = loop.run_in_executor(None, self.get_new_passes, now)
+
+            now = datetime.datetime.utcnow()
+            timeout = self.get_sleep_time(now)
+            if until is not None:
+                timeout = max(0.0, min(timeout, (until - now).total_seconds()))
+            if planning is None:
+                await asyncio.sleep(timeout)
+                continue
+
+            done, _ = await asyncio.wait({planning}, timeout=timeout)
+            if planning in done:
+                try:
+                    self.add_passes(*planning.result())
+                except Exception:
+                    logging.error("Planning failed", exc_info=True)
+                    self.next_planning = datetime.datetime.utcnow() + datetime.timedelta(seconds=MAX_SLEEP_S)
+                planning = None
+
+        if len(self._running) != 0:
+            await asyncio.wait(self._running)
+        while self._draining is not None:
+            await asyncio.wait({self._draining})
+
+
+def execute(interval_s: float = REPLAN_INTERVAL_S, horizon_s: float = HORIZON_S):
+    """Runs the station daemon until interrupted."""
+    daemon = StationDaemon(interval_s=interval_s, horizon_s=horizon_s)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        logging.info("Station daemon stopped")
+
+
+__all__ = ["StationDaemon", "execute"]
@@ -4,29 +4,292 @@ Celestrak database and keeps it locally. Basic query mechanism is available
 to retrieve the data.
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import datetime
+import json
 import logging
+import mmap
 import os
-from typing import List, Sequence
-import requests
-import requests.exceptions
+import struct
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 import time
 
-from orbit_predictor.sources import NoradTLESource
+from orbit_predictor.sources import TLESource
 from orbit_predictor.predictors.base import CartesianPredictor
 
 from utils.globalvars import CONFIG_DIRECTORY, APP_NAME
 from utils.configuration import open_config
 from utils.filenames import safe_filename
+from utils.files import atomic_write
+
+if TYPE_CHECKING:
+    import requests
 
 CELESTRAK = [
     r"https://celestrak.org/NORAD/elements/gp.php?GROUP=active&FORMAT=tle"
 ]
 
+# Timeout (in seconds) for single TLE request
+FETCH_TIMEOUT = 30
+# Max number of TLE files downloaded at the same time
+FETCH_WORKERS = 4
+
+TLELines = Tuple[str, str]
+FileSignature = Tuple[int, int]
+
+
+class TLECatalog(TLESource):
+    """
+    Parsed content of the NORAD-like multi-line TLE file (the same format as
+    used by NoradTLESource). The entries are indexed by the satellite name
+    and by the NORAD catalog number, so the lookups don't scan the whole file.
+
+    The name lookup prefers the exact match. If there is none, then it falls
+    back to the NoradTLESource behavior (the first entry which name contains
+    the requested one). The results are remembered.
+    """
+    def __init__(self, lines: Iterable[str]):
+        self._lookups: Dict[Union[str, int], Optional[TLELines]] = {}
+        self._entries: List[Tuple[str, TLELines]] = []
+        self._by_name: Dict[str, TLELines] = {}
+        self._by_norad: Dict[int, TLELines] = {}
+
+        content = iter(lines)
+        for name, line_1, line_2 in zip(content, content, content):
+            tle = (line_1, line_2)
+            self._entries.append((name, tle))
+            self._by_name.setdefault(name.strip(), tle)
+            norad = _get_norad_from_line(line_1)
+            if norad is not None:
+                self._by_norad.setdefault(norad, tle)
+
+    @classmethod
+    def from_file(cls, filename: str) -> "TLECatalog":
+        with open(filename, 'r') as f:
+            lines = f.read().splitlines()
+        return cls(lines)
+
+    def entries(self) -> Iterable[Tuple[str, TLELines]]:
+        """Returns pairs with satellite name and TLE lines in the file order."""
+        return iter(self._entries)
+
+    def _find_name(self, name: str) -> Optional[TLELines]:
+        return self._by_name.get(name)
+
+    def _find_norad(self, norad: int) -> Optional[TLELines]:
+        return self._by_norad.get(norad)
+
+    def find(self, sat_id: Union[str, int]) -> Optional[TLELines]:
+        """Returns TLE lines for satellite name or NORAD number. None if not found."""
+        if sat_id in self._lookups:
+            return self._lookups[sat_id]
+
+        if isinstance(sat_id, int):
+            tle = self._find_norad(sat_id)
+        else:
+            tle = self._find_name(sat_id)
+            if tle is None:
+                tle = next((t for name, t in self.entries() if sat_id in name), None)
+
+        self._lookups[sat_id] = tle
+        return tle
+
+    def __contains__(self, sat_id) -> bool:
+        return self.find(sat_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get_tle(self, sate_id, date):
+        tle = self.find(sate_id)
+        if tle is None:
+            raise LookupError("Couldn't find it. Wrong file?")
+        return tle
+
+
+def _get_norad_from_line(line_1: str) -> Optional[int]:
+    try:
+        return int(line_1[2:7])
+    except ValueError:
+        return None
+
+
+# Layout of the binary index file (all integers are little-endian):
+#
+# - header: magic, format version, mtime (ns) and size of the TLE file,
+#   length of the URL, number of entries,
+# - URL of the TLE file (UTF-8),
+# - entries in the TLE file order: name, NORAD number (-1 if unknown), lines,
+# - entry indices sorted by the stripped name,
+# - entry indices sorted by the NORAD number.
+#
+# Text fields are UTF-8, padded with zero bytes.
+INDEX_MAGIC = b"SVRGTLE"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<7sBqqII")
+INDEX_ENTRY = struct.Struct("<48si72s72s")
+INDEX_POSITION = struct.Struct("<I")
+
+
+def get_index_path(tle_path: str) -> str:
+    """Returns path to the binary index file for the TLE file."""
+    return tle_path + ".idx"
+
+
+def write_index(index_path: str, catalog: TLECatalog, url: str, signature: FileSignature):
+    """
+    Writes the catalog to the binary index file. The file is written to
+    temporary location and then renamed, so readers never see partial data.
+
+    Throw ValueError if entry doesn't fit in fixed-size index fields.
+    """
+    entries = []
+    for name, (line_1, line_2) in catalog.entries():
+        norad = _get_norad_from_line(line_1)
+        entries.append((name, -1 if norad is None else norad, line_1, line_2))
+
+    url_raw = url.encode()
+    chunks = [INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, signature[0], signature[1], len(url_raw), len(entries)), url_raw]
+    for name, norad, line_1, line_2 in entries:
+        fields = [f.encode() for f in (name, line_1, line_2)]
+        if len(fields[0]) > 48 or len(fields[1]) > 72 or len(fields[2]) > 72:
+            raise ValueError("TLE entry %s is too long for the index" % (name.strip(),))
+        chunks.append(INDEX_ENTRY.pack(fields[0], norad, fields[1], fields[2]))
+
+    positions = range(len(entries))
+    by_name = sorted(positions, key=lambda i: entries[i][0].strip())
+    by_norad = sorted(positions, key=lambda i: entries[i][1])
+    chunks.extend(INDEX_POSITION.pack(i) for i in by_name)
+    chunks.extend(INDEX_POSITION.pack(i) for i in by_norad)
+
+    atomic_write(index_path, b"".join(chunks))
+
+
+def _bisect_left(count: int, key_at: Callable[[int], Any], target: Any) -> int:
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key_at(mid) < target:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class MappedTLECatalog(TLECatalog):
+    """
+    TLECatalog backed by the memory-mapped binary index file created by
+    write_index. Nothing is parsed on load. The entries are decoded on demand
+    and the lookups are binary searches over the sorted positions.
+    """
+    def __init__(self, buffer: mmap.mmap, count: int, offset: int):
+        self._lookups = {}
+        self._buffer = buffer
+        self._count = count
+        self._entries_offset = offset
+        self._by_name_offset = offset + count * INDEX_ENTRY.size
+        self._by_norad_offset = self._by_name_offset + count * INDEX_POSITION.size
+
+    @classmethod
+    def open(cls, index_path: str, url: str, signature: FileSignature) -> Optional["MappedTLECatalog"]:
+        """
+        Maps the index file. Returns None if the index doesn't exist, is corrupted
+        or was created for other URL or other version of the TLE file.
+        """
+        try:
+            with open(index_path, "rb") as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, mtime, size, url_length, count = INDEX_HEADER.unpack_from(buffer)
+            offset = INDEX_HEADER.size + url_length
+            expected_size = offset + count * (INDEX_ENTRY.size + 2 * INDEX_POSITION.size)
+            if magic == INDEX_MAGIC and version == INDEX_VERSION and (mtime, size) == signature \
+                    and len(buffer) == expected_size and buffer[INDEX_HEADER.size:offset] == url.encode():
+                return cls(buffer, count, offset)
+        except struct.error:
+            pass
+        buffer.close()
+        return None
+
+    def _entry(self, position: int) -> Tuple[str, int, str, str]:
+        name, norad, line_1, line_2 = INDEX_ENTRY.unpack_from(self._buffer, self._entries_offset + position * INDEX_ENTRY.size)
+        return name.rstrip(b"\0").decode(), norad, line_1.rstrip(b"\0").decode(), line_2.rstrip(b"\0").decode()
+
+    def _position(self, offset: int, rank: int) -> int:
+        return INDEX_POSITION.unpack_from(self._buffer, offset + rank * INDEX_POSITION.size)[0]
+
+    def entries(self) -> Iterable[Tuple[str, TLELines]]:
+        for position in range(self._count):
+            name, _, line_1, line_2 = self._entry(position)
+            yield name, (line_1, line_2)
+
+    def _find_sorted(self, offset: int, key: Callable[[Tuple[str, int, str, str]], Any], target: Any) -> Optional[TLELines]:
+        def key_at(rank):
+            return key(self._entry(self._position(offset, rank)))
+
+        rank = _bisect_left(self._count, key_at, target)
+        if rank == self._count:
+            return None
+        entry = self._entry(self._position(offset, rank))
+        if key(entry) != target:
+            return None
+        return entry[2], entry[3]
+
+    def _find_name(self, name: str) -> Optional[TLELines]:
+        return self._find_sorted(self._by_name_offset, lambda e: e[0].strip(), name)
+
+    def _find_norad(self, norad: int) -> Optional[TLELines]:
+        return self._find_sorted(self._by_norad_offset, lambda e: e[1], norad)
+
+    def __len__(self) -> int:
+        return self._count
+
+
+# Catalogs loaded in this process. Key is the TLE file path, value is pair
+# with the file signature (mtime and size) and the catalog.
+_catalogs: Dict[str, Tuple[FileSignature, TLECatalog]] = {}
+
+
+def get_catalog(path: str, url: Optional[str] = None) -> TLECatalog:
+    """
+    Returns the catalog for TLE file. The catalog is loaded only once per
+    process and loaded again only if the file was modified.
+
+    If the URL of the TLE file is provided, then the catalog is mapped from
+    the binary index file stored alongside. The index is (re)created if
+    it is missing or out-of-date.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _catalogs.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    catalog: Optional[TLECatalog] = None
+    index_path = get_index_path(path)
+    if url is not None:
+        catalog = MappedTLECatalog.open(index_path, url, signature)
+
+    if catalog is None:
+        catalog = TLECatalog.from_file(path)
+        if url is not None:
+            try:
+                write_index(index_path, catalog, url, signature)
+            except (OSError, ValueError) as e:
+                logging.warning("Unable to write TLE index %s: %s", index_path, e)
+
+    _catalogs[path] = (signature, catalog)
+    return catalog
+
 
 class OrbitDatabase:
-    def __init__(self, urls=None, max_period=7 * 24 * 60 * 60):
+    def __init__(self, urls=None, max_period=7 * 24 * 60 * 60, timeout=FETCH_TIMEOUT, max_workers=FETCH_WORKERS):
         self.max_period = max_period
+        self.timeout = timeout
+        self.max_workers = max_workers
         if urls is None:
             config = open_config()
             urls = config['norad']
@@ -35,19 +298,44 @@ class OrbitDatabase:
         self.urls: Sequence[str]
         self.urls = urls
 
-    def _get_tle_from_url(self, url):
+    def _get_tle_from_url(self, url, validators: Optional[Dict] = None) -> "requests.Response":
+        """
+        Requests TLE file. If validators (ETag and Last-Modified values of
+        the stored file) are provided, then the request is conditional
+        and the response may be 304 (Not Modified).
+        """
+        # Loaded on demand, most runs use the stored files only
+        import requests
+
         headers = {'user-agent': APP_NAME, 'Accept': 'text/plain'}
+        if validators is not None:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last-modified"):
+                headers["If-Modified-Since"] = validators["last-modified"]
         try:
-            response = requests.get(url, headers=headers)
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
         except requests.exceptions.RequestException as error:
             logging.error("Exception requesting TLE: %s", error)
             raise
-        return response.content.decode("UTF-8")
+        return response
 
     def _fetch_tle_and_save(self, url, tle_path):
-        content = self._get_tle_from_url(url)
-        with open(tle_path, "w") as f:
-            f.write(content)
+        validators = self._read_fetch_info(tle_path) if os.path.exists(tle_path) else None
+        response = self._get_tle_from_url(url, validators)
+
+        if response.status_code == 304:
+            logging.info("TLE from %s not modified", url)
+        else:
+            atomic_write(tle_path, response.content)
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last-modified": response.headers.get("Last-Modified")
+            }
+
+        info = dict(validators or {}, url=url, fetched=time.time())
+        atomic_write(self._get_fetch_info_path(tle_path), json.dumps(info).encode())
         return tle_path
 
     def _get_tle_path_from_url(self, url):
@@ -55,7 +343,25 @@ class OrbitDatabase:
         tle_path = os.path.join(CONFIG_DIRECTORY, tle_filename)
         return tle_path
 
+    def _get_fetch_info_path(self, tle_path):
+        return tle_path + ".json"
+
+    def _read_fetch_info(self, tle_path) -> Optional[Dict]:
+        """Returns ETag, Last-Modified and fetch time of the TLE file. None if unknown."""
+        try:
+            with open(self._get_fetch_info_path(tle_path)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
     def _get_create_time(self, path):
+        """
+        Returns time when the TLE file was fetched (or confirmed as not modified)
+        last time.
+        """
+        info = self._read_fetch_info(path)
+        if info is not None and "fetched" in info:
+            return info["fetched"]
         stat = os.stat(path)
         ctime = stat.st_ctime
         return ctime
@@ -79,17 +385,22 @@ class OrbitDatabase:
             else:
                 raise
 
-    def _is_in_source(self, source, sat_id):
-        try:
-            source.get_tle(sat_id, datetime.datetime.utcnow())
-            return True
-        except LookupError:
-            return False
+    def _fetch_all(self, urls: Sequence[str]) -> List[str]:
+        """
+        Fetches TLE files concurrently. Returns paths in order of the URLs.
+        Throw the first exception if any fetch fails.
+        """
+        workers = max(1, min(self.max_workers, len(urls)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda u: self._get_current_tle_file(u, force_fetch=True), urls))
 
-    def _get_source(self, sat_id):
+    def _is_in_source(self, source: TLECatalog, sat_id):
+        return sat_id in source
+
+    def _get_source(self, sat_id) -> TLECatalog:
         for url in self.urls:
             path = self._get_current_tle_file(url)
-            source = NoradTLESource.from_file(path)
+            source = get_catalog(path, url)
             if self._is_in_source(source, sat_id):
                 return source
         raise LookupError("Could not find %s in orbit data." % (sat_id,))
@@ -112,13 +423,13 @@ class OrbitDatabase:
     def refresh_satellites(self, sat_ids):
         all_sat_ids = set(sat_ids)
         found_sat_ids = set()
-        for url in self.urls:
+        paths = self._fetch_all(self.urls)
+        for url, path in zip(self.urls, paths):
             satellites_to_search = all_sat_ids.difference(found_sat_ids)
             if len(satellites_to_search) == 0:
                 return
 
-            path = self._get_current_tle_file(url, force_fetch=True)
-            source = NoradTLESource.from_file(path)
+            source = get_catalog(path, url)
 
             for sat_id in satellites_to_search:
                 if self._is_in_source(source, sat_id):
@@ -128,10 +439,7 @@ class OrbitDatabase:
             raise LookupError("Could not find %s in orbit data." % (", ".join(all_sat_ids.difference(found_sat_ids))))
 
     def refresh_urls(self):
-        urls = self.urls
-
-        for url in urls:
-            self._get_current_tle_file(url, force_fetch=True)
+        self._fetch_all(self.urls)
 
     def __str__(self):
         data = []
@@ -3,65 +3,162 @@ Code related to getting upcoming sat passes and planning observations.
 """
 
 import datetime
+import json
+import logging
+import os
+import shlex
+import shutil
 import sys
-from typing import Sequence
-from colored import fg
+from typing import List, Optional, Sequence, Tuple
 
-from orbit_predictor.locations import Location
 from datetimerange import DateTimeRange
 from dateutil import tz
 
 from selectstrategy import strategy_factory, Observation
-from utils.globalvars import COMMENT_PASS_TAG
+from utils.globalvars import COMMENT_PASS_TAG, PLANNER_STATE_FILE
 from utils.models import set_satellite_defaults, get_location, Configuration
 from utils.cron import get_receiver_command, open_crontab
 from utils.configuration import open_config
-from utils.dates import utc_to_local
-from orbitdb import OrbitDatabase
+from utils.dates import utc_to_local, from_iso_format
+from utils.files import atomic_write
 
 RECEIVER_COMMAND = get_receiver_command()
 
 prediction_config = open_config()
 
 
-def get_command(name: str, range_: DateTimeRange):
-    return RECEIVER_COMMAND + '"%s" "%s"' % (name, range_.end_datetime.isoformat())
+def get_command(name: str, range_: DateTimeRange, device: Optional[str] = None):
+    command = RECEIVER_COMMAND + '"%s" "%s"' % (name, range_.end_datetime.isoformat())
+    if device is not None:
+        command += ' "%s"' % (device,)
+    return command
+
+
+def parse_command(command: str) -> Tuple[str, datetime.datetime, Optional[str]]:
+    """
+    Returns satellite name, LOS (naive UTC) and device (None if not specified)
+    from the receiver command created by get_command.
+    """
+    parameters = command.replace(RECEIVER_COMMAND, "")
+    sat_name, los_raw, *opts = shlex.split(parameters)
+    device = opts[0] if len(opts) != 0 else None
+    return sat_name, from_iso_format(los_raw), device
 
 
 def get_passes(config: Configuration, from_: datetime.datetime, to: datetime.datetime):
+    # The prediction modules (orbit_predictor, numpy, sgp4) are loaded on demand,
+    # the planner module is imported also by the commands which don't predict passes.
+    from orbit_predictor.locations import Location
+    from orbitdb import OrbitDatabase
+    from prediction import predict_passes
+
     location = Location(*get_location(config))
-    satellites = filter(lambda s: not s.get("disabled", False), config["satellites"])
+    satellites = [s for s in config["satellites"] if not s.get("disabled", False)]
     strategy_name: str = config.get("strategy", "max-elevation")  # type: ignore
+    weight_name: str = config.get("weight", "elevation")  # type: ignore
+    prediction: str = config.get("prediction", "batch")  # type: ignore
 
     orbit_db = OrbitDatabase(config["norad"])
-    strategy = strategy_factory(strategy_name)
+    priorities = {sat["name"]: sat["priority"] for sat in satellites if sat.get("priority") is not None}
+    devices = config.get("receivers") or [None]
+    strategy = strategy_factory(strategy_name, weight_name, priorities, devices)  # type: ignore
 
-    init = []
     for sat in satellites:
         set_satellite_defaults(config, sat)
-        aos_at = sat["aos_at"]
-        max_elevation_greater_than = sat["max_elevation_greater_than"]
-        predictor = orbit_db.get_predictor(sat["name"])
-
-        passes = predictor.passes_over(location, from_, to, max_elevation_greater_than, aos_at_dg=aos_at)
-
-        # orbit predictor is using naive dates (no timezone info)
-        # We could force the tzinfo to be utc here like this:
-        #
-        # p.aos = p.aos.replace(tzinfo=datetime.timezone.utc)
-        # p.los = p.los.replace(tzinfo=datetime.timezone.utc)
-        #
-        # but then many places in the code would have to be updated to
-        # also deal with timezones. Let's play along and keep it naive.
-        init += [(sat["name"], p) for p in passes]
+    predictors = [orbit_db.get_predictor(sat["name"]) for sat in satellites]
+
+    # orbit predictor is using naive dates (no timezone info)
+    # We could force the tzinfo to be utc here like this:
+    #
+    # p.aos = p.aos.replace(tzinfo=datetime.timezone.utc)
+    # p.los = p.los.replace(tzinfo=datetime.timezone.utc)
+    #
+    # but then many places in the code would have to be updated to
+    # also deal with timezones. Let's play along and keep it naive.
+    init = []
+    if prediction == "batch":
+        # All satellites are propagated at once, see prediction.py
+        batch = predict_passes(predictors, location, from_, to,
+                               [sat["max_elevation_greater_than"] for sat in satellites],  # type: ignore
+                               [sat["aos_at"] for sat in satellites])  # type: ignore
+        for sat, passes in zip(satellites, batch):
+            init += [(sat["name"], p) for p in passes]
+    else:
+        for sat, predictor in zip(satellites, predictors):
+            aos_at = sat["aos_at"]
+            max_elevation_greater_than = sat["max_elevation_greater_than"]
+            passes = predictor.passes_over(location, from_, to, max_elevation_greater_than, aos_at_dg=aos_at)
 
-        for p in passes:
-            init.append((sat["name"], p))
+            init += [(sat["name"], p) for p in passes]
 
     selected = strategy(init)
+    for warning in check_resources(config, selected):
+        logging.warning(warning)
     return selected
 
 
+def _get_recipe_info(config: Configuration, name: str):
+    from recipes import recipes
+    satellite = next((s for s in config["satellites"] if s["name"] == name), {})
+    recipe = satellite.get("recipe") or recipes.find_for_satellite(name)
+    if recipe is None or recipe not in recipes:
+        return None
+    return recipes.info(recipe)
+
+
+def _get_free_disk_mb(path: str) -> float:
+    # The observation directory may not exist yet
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free / (1024 * 1024)
+
+
+def check_resources(config: Configuration, observations: Sequence[Observation],
+                    cpu_count: Optional[int] = None, free_disk_mb: Optional[float] = None) -> List[str]:
+    """
+    Checks if the station can execute the planned observations, based on the
+    recipe metadata: the required binaries are installed, the recorded files
+    fit on the disk (the upper bound, the files are deleted after processing)
+    and the overlapping receptions don't need more CPU cores than available.
+    The recipe modules aren't imported.
+
+    :return: List of warnings, empty if everything is fine
+    """
+    warnings = []
+    infos = {o.data: _get_recipe_info(config, o.data) for o in observations}
+
+    for name, info in sorted(infos.items()):
+        if info is None:
+            warnings.append("No recipe for %s" % (name,))
+            continue
+        missing = [b for b in info.binaries if shutil.which(b) is None]
+        if len(missing) != 0:
+            warnings.append("Recipe %s (%s) requires missing program(s): %s" % (info.name, name, ", ".join(missing)))
+
+    disk_mb = sum(infos[o.data].disk_mb_per_minute * o.range.get_timedelta_second() / 60.0
+                  for o in observations if infos[o.data] is not None)
+    if free_disk_mb is None:
+        free_disk_mb = _get_free_disk_mb(config.get("obsdir") or "/tmp/observations_tmp")
+    if disk_mb > free_disk_mb:
+        warnings.append("Planned observations may need %.0f MB of disk space, only %.0f MB is free" % (disk_mb, free_disk_mb))
+
+    # Sweep over AOS and LOS of the observations
+    if cpu_count is None:
+        cpu_count = os.cpu_count() or 1
+    events = []
+    for o in observations:
+        info = infos[o.data]
+        if info is not None:
+            events.append((o.range.start_datetime, 1, info.cpu, o.data))
+            events.append((o.range.end_datetime, 0, -info.cpu, o.data))
+    load = 0.0
+    for time, _, cpu, name in sorted(events, key=lambda e: e[:2]):
+        load += cpu
+        if cpu > 0 and load > cpu_count:
+            warnings.append("Receptions overlapping at %s (%s) need %.1f CPU cores, only %d available" % (time, name, load, cpu_count))
+    return warnings
+
+
 def get_timestamp_str(timestamp: datetime, timezone: tz.tz) -> str:
     # orbital predictor returns timestamps in naive format (no timezones).
     # To do any timezone conversions, we need to first force it to UTC
@@ -74,7 +171,7 @@ def get_timestamp_str(timestamp: datetime, timezone: tz.tz) -> str:
 def plan_passes(selected: Sequence[Observation], cron):
     selected = sorted(selected, key=lambda o: o.pass_.aos)
     for entry in selected:
-        cmd = get_command(entry.data, entry.range)
+        cmd = get_command(entry.data, entry.range, entry.device)
         job = cron.new(cmd, COMMENT_PASS_TAG)
         start_datetime = utc_to_local(entry.range.start_datetime)
         job.setall(start_datetime)
@@ -84,6 +181,9 @@ def plan_passes(selected: Sequence[Observation], cron):
 def print_passes(passes, config: Configuration):
     """Pretty prints the passes."""
 
+    from colored import fg
+    from orbitdb import OrbitDatabase
+
     orbit_db = OrbitDatabase(config["norad"])
 
     name_width = 12  # width of the sat names
@@ -111,33 +211,101 @@ def print_passes(passes, config: Configuration):
         print(f"{p[0]:{name_width}} | {norad:3.0f} | {c}{aos_txt:<24}{n} | {c}{los_txt:<24}{n} | {c}{p[1].max_elevation_deg:4.1f}{n}")
 
 
+def get_planned_until() -> Optional[datetime.datetime]:
+    """Returns end (naive UTC) of the horizon covered by the last planning. None if unknown."""
+    try:
+        with open(PLANNER_STATE_FILE) as f:
+            return from_iso_format(json.load(f)["planned_until"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def set_planned_until(until: Optional[datetime.datetime]):
+    """Stores end of the horizon covered by the planning. None resets it."""
+    if until is None:
+        if os.path.exists(PLANNER_STATE_FILE):
+            os.remove(PLANNER_STATE_FILE)
+        return
+    atomic_write(PLANNER_STATE_FILE, json.dumps({"planned_until": until.isoformat()}).encode())
+
+
 def clear(cron):
     """Clears all pass entries from the crontab."""
     cron.remove_all(comment=COMMENT_PASS_TAG)
     cron.write()
+    set_planned_until(None)
 
 
-def execute(interval: int, cron=None, dry_run: bool = False):
+def plan_incremental(config: Configuration, cron, start: datetime.datetime, end: datetime.datetime) -> List[Observation]:
+    """
+    Plans passes without dropping the already scheduled ones. The pass jobs
+    from the past are removed, the future jobs are kept and the passes are
+    computed only for the part of the horizon which wasn't planned yet.
+
+    :return: List of new passes
+    """
+    scheduled: List[datetime.datetime] = []
+    for job in list(cron.find_comment(COMMENT_PASS_TAG)):
+        _, los, _ = parse_command(job.command)
+        if los <= start:
+            cron.remove(job)
+        else:
+            scheduled.append(los)
+
+    # Without any scheduled job, the stored horizon can't be trusted (e.g. the
+    # crontab was edited by hand), so we plan the whole interval.
+    from_ = start
+    planned_until = get_planned_until()
+    if len(scheduled) != 0:
+        from_ = max([from_, *scheduled] + ([planned_until] if planned_until is not None else []))
+
+    passes: List[Observation] = []
+    if from_ < end:
+        passes = get_passes(config, from_, end)
+
+    # Passes in progress at the beginning are trimmed, so they don't overlap
+    # the already scheduled ones.
+    selected = []
+    for entry in passes:
+        if entry.range.start_datetime < from_:
+            entry.range.set_start_datetime(from_)
+        if entry.range.get_timedelta_second() >= 1:
+            selected.append(entry)
+
+    plan_passes(selected, cron)
+    set_planned_until(end)
+    return selected
+
+
+def execute(interval: int, cron=None, dry_run: bool = False, incremental: Optional[bool] = None):
     """Plans incoming passes jobs in the crontab.
 
     :param interval: interval, expressed in seconds
     :param cron: cron instance, if not specified (None), new instance will be opened
     :param dry_run: True means just print, don't set jobs. The default is False
+    :param incremental: True means keep already scheduled passes and plan only
+        the new part of the interval. If not specified (None), the "planning" option
+        from the config is used
     :return: List of passes
     """
     if cron is None:
         cron = open_crontab()
+    if incremental is None:
+        incremental = prediction_config.get("planning") == "incremental"
     start = datetime.datetime.utcnow()
     delta = datetime.timedelta(seconds=interval)
     end = start + delta
 
-    passes = get_passes(prediction_config, start, end)
-
     if dry_run:
+        passes = get_passes(prediction_config, start, end)
         print_passes(passes, prediction_config)
+    elif incremental:
+        passes = plan_incremental(prediction_config, cron, start, end)
     else:
+        passes = get_passes(prediction_config, start, end)
         clear(cron)
         plan_passes(passes, cron)
+        set_planned_until(end)
 
     return passes
 
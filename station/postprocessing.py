@@ -0,0 +1,210 @@
+"""
+Post-processing of the receptions. The recipes are split into the capture
+phase (recording, executed by the receiver at the pass time) and the process
+phase (decoding, rating, submitting). The process phase is queued in the
+persistent queue (utils.jobqueue) and executed by the bounded pool of worker
+processes with lower priority (niceness) and optionally restricted to some
+CPUs, so the capture of the next pass is never starved. If the worker
+process dies (e.g. killed by the OOM killer), its jobs are retried at most
+utils.jobqueue.MAX_ATTEMPTS times.
+
+The pool is configured in the "processing" section of the config:
+
+    processing:
+      workers: 1      # number of worker processes, 0 - process in the receiver
+      nice: 10        # niceness increment of the workers
+      cpus: [1, 2, 3] # CPUs used by the workers, all if not specified
+      skip_empty: true # rate the APT signal first, don't decode and submit
+                       # the empty passes (see quality_ratings.apt_signal)
+"""
+
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import datetime
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Callable, Iterable, Optional, Tuple
+
+from utils.configuration import open_config
+from utils.jobqueue import Job, JobQueue
+from utils.models import Configuration
+
+DEFAULT_WORKERS = 1
+DEFAULT_NICE = 10
+
+
+def _init_worker(nice: int, cpus: Optional[Iterable[int]]):
+    """Sets the priority and the CPU affinity of the worker process."""
+    if nice:
+        os.nice(nice)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, set(cpus))
+
+
+def _run_job(job: Job) -> float:
+    """Executes the job in the worker process. Returns the processing time in seconds."""
+    from receiver import process_job
+    start = time.monotonic()
+    process_job(job)
+    return time.monotonic() - start
+
+
+def _get_context():
+    """
+    Returns the context creating the worker processes. Forking the process
+    with many threads (e.g. the station daemon) may copy the locks held by
+    the other threads, so the workers are started by the fork server then.
+    """
+    if threading.active_count() == 1:
+        return None
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _get_latency(job: Job) -> float:
+    """Returns time (in seconds) since the job was enqueued."""
+    enqueued = datetime.datetime.fromisoformat(job["enqueued"])
+    return (datetime.datetime.utcnow() - enqueued).total_seconds()
+
+
+def drain(config: Optional[Configuration] = None, queue: Optional[JobQueue] = None,
+          run: Callable[[Job], float] = _run_job) -> int:
+    """
+    Processes the queued jobs until the queue is empty. Only one process
+    drains the queue at a time, the function returns immediately if another
+    one does it (it will process the new jobs too).
+
+    :return: Number of the processed jobs
+    """
+    if config is None:
+        config = open_config()
+    if queue is None:
+        queue = JobQueue()
+    processing = config.get("processing") or {}
+    workers = processing.get("workers", DEFAULT_WORKERS)
+    nice = processing.get("nice", DEFAULT_NICE)
+    cpus = processing.get("cpus")
+
+    processed = 0
+    while True:
+        with queue.lock() as acquired:
+            if not acquired:
+                logging.info("The processing queue is drained by another process, queue depth %d" % (queue.depth(),))
+                return processed
+            recovered, failed = queue.recover()
+            if recovered != 0 or failed != 0:
+                logging.warning("Returned %d interrupted job(s) to the processing queue, %d failed after too many attempts" % (
+                    recovered, failed))
+            processed += _drain_locked(queue, workers, nice, cpus, run)
+        # The job may be added just before the lock was released
+        if queue.depth() == 0:
+            return processed
+
+
+def _drain_locked(queue: JobQueue, workers: int, nice: int, cpus: Optional[Iterable[int]],
+                  run: Callable[[Job], float]) -> int:
+    if workers <= 0:
+        processed = 0
+        while True:
+            claimed = queue.claim()
+            if claimed is None:
+                return processed
+            job_id, job = claimed
+            _log_start(queue, job_id, job)
+            try:
+                duration = run(job)
+            except Exception as e:
+                _finish(queue, job_id, job, error=e)
+            else:
+                _finish(queue, job_id, job, duration=duration)
+            processed += 1
+
+    processed = 0
+    while True:
+        count, broken = _drain_pool(queue, workers, nice, cpus, run)
+        processed += count
+        if not broken:
+            return processed
+        logging.warning("The worker process died, restarting the processing pool")
+
+
+def _drain_pool(queue: JobQueue, workers: int, nice: int, cpus: Optional[Iterable[int]],
+                run: Callable[[Job], float]) -> Tuple[int, bool]:
+    """
+    Processes the jobs in the pool until the queue is empty or the pool is
+    broken (a worker died). The jobs of the broken pool are retried.
+
+    :return: Number of the processed jobs and True if the pool is broken
+    """
+    processed = 0
+    broken = False
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=_get_context(),
+                                                initializer=_init_worker, initargs=(nice, cpus)) as executor:
+        running = {}
+        while True:
+            while not broken and len(running) < workers:
+                claimed = queue.claim()
+                if claimed is None:
+                    break
+                job_id, job = claimed
+                _log_start(queue, job_id, job)
+                try:
+                    running[executor.submit(run, job)] = (job_id, job)
+                except BrokenProcessPool as e:
+                    broken = True
+                    if not _retry(queue, job_id, job, e):
+                        processed += 1
+
+            if len(running) == 0:
+                return processed, broken
+
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                job_id, job = running.pop(future)
+                try:
+                    duration = future.result()
+                except BrokenProcessPool as e:
+                    # All jobs of the pool fail, it isn't known which one killed the worker
+                    broken = True
+                    if not _retry(queue, job_id, job, e):
+                        processed += 1
+                except Exception as e:
+                    _finish(queue, job_id, job, error=e)
+                    processed += 1
+                else:
+                    _finish(queue, job_id, job, duration=duration)
+                    processed += 1
+
+
+def _log_start(queue: JobQueue, job_id: str, job: Job):
+    logging.info("Processing job %s (%s), waited %.1f s, queue depth %d" % (
+        job_id, job.get("satellite"), _get_latency(job), queue.depth()))
+
+
+def _retry(queue: JobQueue, job_id: str, job: Job, error: Exception) -> bool:
+    """Returns the interrupted job to the queue. Returns False if it failed after too many attempts."""
+    if queue.retry(job_id, repr(error)):
+        logging.warning("Processing job %s (%s) was interrupted, returned to the queue" % (job_id, job.get("satellite")))
+        return True
+    logging.error("Processing job %s (%s) failed after %d attempts, queue depth %d" % (
+        job_id, job.get("satellite"), job.get("attempts", 0) + 1, queue.depth()))
+    return False
+
+
+def _finish(queue: JobQueue, job_id: str, job: Job, duration: Optional[float] = None,
+            error: Optional[Exception] = None):
+    if error is not None:
+        queue.fail(job_id, repr(error))
+        logging.error("Processing job %s (%s) failed after %.1f s since enqueued, queue depth %d" % (
+            job_id, job.get("satellite"), _get_latency(job), queue.depth()), exc_info=error)
+        return
+    queue.done(job_id)
+    logging.info("Processing job %s (%s) finished in %.1f s, latency %.1f s since enqueued, queue depth %d" % (
+        job_id, job.get("satellite"), duration, _get_latency(job), queue.depth()))
+
+
+if __name__ == '__main__':
+    drain()
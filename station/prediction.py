@@ -0,0 +1,189 @@
+"""
+Batched pass prediction. All satellites are propagated at once over
+the whole planning window on a coarse time grid (NumPy arrays of
+satellites x time). The threshold crossings of elevation are found on
+the grid and only these points are refined (AOS, LOS and TCA).
+
+The results are orbit_predictor PredictedPass objects, the same as
+returned by the predictor.passes_over, but the computation is much faster
+for many satellites and long windows.
+"""
+
+import datetime
+from math import degrees
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from sgp4.api import Satrec, SatrecArray, WGS84
+from orbit_predictor.locations import Location
+from orbit_predictor.predictors import PredictedPass
+from orbit_predictor.predictors.base import CartesianPredictor
+from orbit_predictor.utils import jday_from_datetime
+
+# Step of the coarse time grid in seconds. Passes which stay above
+# the AOS elevation for a shorter time may be missed.
+GRID_STEP_S = 60.0
+# The grid is extended by this margin on both sides, so the passes which
+# cross the window boundary are complete. It must be longer than a pass.
+PASS_MARGIN_S = 30 * 60.0
+SECONDS_PER_DAY = 86400.0
+
+
+def _gmst(jd: np.ndarray) -> np.ndarray:
+    """Greenwich mean sidereal time in radians (vectorized sgp4.propagation.gstime)."""
+    tut1 = (jd - 2451545.0) / 36525.0
+    temp = -6.2e-6 * tut1 * tut1 * tut1 + 0.093104 * tut1 * tut1 + \
+        (876600.0 * 3600 + 8640184.812866) * tut1 + 67310.54841
+    return np.mod(np.radians(temp / 240.0), 2 * np.pi)
+
+
+class _Observer:
+    """Computes elevation (in radians) of TEME positions seen from location."""
+
+    def __init__(self, location: Location):
+        self.position = np.array(location.position_ecef)
+        lat, lon = location.latitude_rad, location.longitude_rad
+        self.zenith = np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    def elevation(self, teme: np.ndarray, jd: np.ndarray, fr: np.ndarray) -> np.ndarray:
+        gmst = _gmst(jd + fr)
+        sin_gmst, cos_gmst = np.sin(gmst), np.cos(gmst)
+        x = teme[..., 0] * cos_gmst + teme[..., 1] * sin_gmst - self.position[0]
+        y = -teme[..., 0] * sin_gmst + teme[..., 1] * cos_gmst - self.position[1]
+        z = teme[..., 2] - self.position[2]
+        top_z = self.zenith[0] * x + self.zenith[1] * y + self.zenith[2] * z
+        range_ = np.sqrt(x * x + y * y + z * z)
+        return np.arcsin(top_z / range_)
+
+
+class BatchPredictor:
+    """
+    Predicts passes of many satellites over single location.
+
+    :param predictors: orbit_predictor TLE predictors (returned by OrbitDatabase.get_predictor)
+    :param location: observer location
+    """
+
+    def __init__(self, predictors: Sequence[CartesianPredictor], location: Location,
+                 step_s: float = GRID_STEP_S, tolerance_s: float = 1.0):
+        self.predictors = list(predictors)
+        self.location = location
+        self.step_s = step_s
+        self.tolerance_s = tolerance_s
+        self._satrecs = [Satrec.twoline2rv(*p.tle.lines, WGS84) for p in self.predictors]  # type: ignore
+        self._observer = _Observer(location)
+
+    def _elevations(self, start: Tuple[float, float], sat_idx: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """Elevation of satellite sat_idx[i] at t[i] seconds after start."""
+        jd0, fr0 = start
+        result = np.full(t.shape, -np.inf)
+        for sat in np.unique(sat_idx):
+            mask = sat_idx == sat
+            jd = np.full(np.count_nonzero(mask), jd0)
+            fr = fr0 + t[mask] / SECONDS_PER_DAY
+            errors, teme, _ = self._satrecs[sat].sgp4_array(jd, fr)
+            elevation = self._observer.elevation(teme, jd, fr)
+            elevation[errors != 0] = -np.inf
+            result[mask] = elevation
+        return result
+
+    def _bisect_crossing(self, start, sat_idx, lo, hi, threshold, rising: bool):
+        """Refines the time when elevation crosses threshold inside [lo, hi]."""
+        while np.any(hi - lo > self.tolerance_s):
+            mid = (lo + hi) / 2
+            above = self._elevations(start, sat_idx, mid) >= threshold
+            move_hi = above if rising else ~above
+            hi = np.where(move_hi, mid, hi)
+            lo = np.where(move_hi, lo, mid)
+        return hi if rising else lo
+
+    def _bisect_culmination(self, start, sat_idx, lo, hi):
+        """Refines the time of max elevation inside [lo, hi]."""
+        while np.any(hi - lo > self.tolerance_s):
+            mid = (lo + hi) / 2
+            ascending = self._elevations(start, sat_idx, mid) <= self._elevations(start, sat_idx, mid + self.tolerance_s)
+            lo = np.where(ascending, mid, lo)
+            hi = np.where(ascending, hi, mid)
+        return lo
+
+    def passes_over(self, from_: datetime.datetime, to: datetime.datetime,
+                    max_elevation_gt: Sequence[float], aos_at_dg: Sequence[float]) -> List[List[PredictedPass]]:
+        """
+        Returns passes for each satellite (in the order of predictors).
+        The semantics of the parameters are the same as in
+        predictor.passes_over, but max_elevation_gt and aos_at_dg are
+        per satellite. Dates are naive UTC.
+        """
+        result: List[List[PredictedPass]] = [[] for _ in self.predictors]
+        if len(self.predictors) == 0:
+            return result
+
+        grid_start = from_ - datetime.timedelta(seconds=PASS_MARGIN_S)
+        start = jday_from_datetime(grid_start)
+        window_s = (to - grid_start).total_seconds() + PASS_MARGIN_S
+        t = np.arange(0.0, window_s + self.step_s, self.step_s)
+
+        aos_at = np.radians(np.asarray(aos_at_dg, dtype=float))
+        min_culmination = np.maximum(np.radians(np.asarray(max_elevation_gt, dtype=float)), aos_at)
+
+        jd = np.full(t.shape, start[0])
+        fr = start[1] + t / SECONDS_PER_DAY
+        errors, teme, _ = SatrecArray(self._satrecs).sgp4(jd, fr)
+        elevation = self._observer.elevation(teme, jd, fr)
+        elevation[errors != 0] = -np.inf
+
+        # Passes in progress on the grid boundaries are ignored, the margins
+        # guarantee they are outside the window.
+        above = elevation >= aos_at[:, None]
+        above[:, 0] = False
+        above[:, -1] = False
+        edges = np.diff(above.astype(np.int8), axis=1)
+        sat_idx, rise_idx = np.nonzero(edges == 1)
+        _, set_idx = np.nonzero(edges == -1)
+        if len(sat_idx) == 0:
+            return result
+
+        threshold = aos_at[sat_idx]
+        aos = self._bisect_crossing(start, sat_idx, t[rise_idx], t[rise_idx + 1], threshold, rising=True)
+        los = self._bisect_crossing(start, sat_idx, t[set_idx], t[set_idx + 1], threshold, rising=False)
+
+        # The highest grid point of the pass brackets the culmination.
+        culmination_idx = np.array([r + 1 + np.argmax(elevation[s, r + 1:f + 1])
+                                    for s, r, f in zip(sat_idx, rise_idx, set_idx)])
+        lo = np.maximum(t[culmination_idx - 1], aos)
+        hi = np.minimum(t[culmination_idx + 1], los)
+        tca = self._bisect_culmination(start, sat_idx, lo, hi)
+        max_elevation = self._elevations(start, sat_idx, tca)
+
+        for sat, aos_s, los_s, tca_s, elevation_rad in zip(sat_idx, aos, los, tca, max_elevation):
+            if elevation_rad <= min_culmination[sat]:
+                continue
+            aos_date = grid_start + datetime.timedelta(seconds=float(aos_s))
+            tca_date = grid_start + datetime.timedelta(seconds=float(tca_s))
+            los_date = grid_start + datetime.timedelta(seconds=float(los_s))
+            # Same rules as orbit_predictor: the pass descending at the window
+            # start is skipped, the pass starting after the window end too.
+            if tca_date < from_ or aos_date > to:
+                continue
+
+            predictor = self.predictors[sat]
+            result[sat].append(PredictedPass(
+                self.location, predictor.sate_id,
+                max_elevation_deg=degrees(elevation_rad),
+                aos=aos_date,
+                los=los_date,
+                duration_s=(los_date - aos_date).total_seconds(),
+                max_elevation_position=predictor.get_position(tca_date),
+                max_elevation_date=tca_date
+            ))
+        return result
+
+
+def predict_passes(predictors: Sequence[CartesianPredictor], location: Location,
+                   from_: datetime.datetime, to: datetime.datetime,
+                   max_elevation_gt: Sequence[float], aos_at_dg: Sequence[float]) -> List[List[PredictedPass]]:
+    """Shorthand for BatchPredictor(predictors, location).passes_over(...)."""
+    return BatchPredictor(predictors, location).passes_over(from_, to, max_elevation_gt, aos_at_dg)
+
+
+__all__ = ["BatchPredictor", "predict_passes"]
@@ -1,42 +1,116 @@
+'''
+Quality ratings of the products. Each rating module declares its metadata
+in the module-level RATING dictionary (literal), see RatingInfo. The
+metadata is read without importing the modules, so listing the ratings
+(e.g. for the CLI) doesn't load NumPy or the rating dependencies. The
+module is imported on the first use and the functions are cached in the
+process.
+
+The module provides:
+
+- "rate" function - takes the image, returns the rating (float),
+- "reducer" function - returns new Reducer (see quality_ratings.engine),
+  which computes the metric in a single pass over the image.
+'''
+
 import importlib
 import os
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from utils.modules import get_constants_in_directory
+
+RATINGS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class RatingInfo(NamedTuple):
+    name: str
+    # Python module of the rating
+    module: str
+    # The module provides "rate" function
+    rate: bool = False
+    # The module provides "reducer" function
+    reducer: bool = False
+    description: str = ""
+
+
+def discover_ratings(directory: str = RATINGS_DIRECTORY) -> Dict[str, RatingInfo]:
+    '''Returns metadata of the ratings in the directory by name, without importing them.'''
+    infos = {}
+    for module_name, metadata in get_constants_in_directory(directory, "RATING"):
+        info = RatingInfo(module="%s.%s" % (os.path.basename(directory), module_name), **metadata)
+        infos[info.name] = info
+    return infos
+
+
+class _Ratings():
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._infos: Optional[Dict[str, RatingInfo]] = None
+        self._functions: Dict[Tuple[str, str], Callable] = {}
 
+    @property
+    def infos(self) -> Dict[str, RatingInfo]:
+        if self._infos is None:
+            self._infos = discover_ratings(self._directory)
+        return self._infos
 
-def get_rate_by_name(name):
+    def get_function(self, name: str, function_name: str) -> Callable:
+        function = self._functions.get((name, function_name))
+        if function is not None:
+            return function
+
+        info = self.infos.get(name)
+        if info is None:
+            raise LookupError("Rate module not found")
+        try:
+            module = importlib.import_module(info.module)
+        except ImportError as ex:
+            raise LookupError("Rate module can't be loaded", ex)
+
+        if not hasattr(module, function_name):
+            raise LookupError("%s function not found" % (function_name.capitalize(),))
+
+        function = getattr(module, function_name)
+
+        if not callable(function):
+            raise LookupError("%s isn't callable" % (function_name.capitalize(),))
+
+        self._functions[(name, function_name)] = function
+        return function
+
+
+_ratings = _Ratings(RATINGS_DIRECTORY)
+
+
+def get_rate_by_name(name: str) -> Callable:
     """
-    Load rate function by name.
-    Name of rate function is name of file which contains an implementation of
-    "rate" function.
+    Load rate function by name (see RatingInfo). The function is cached.
+    Throws LookupError if the rating doesn't exist or can't be loaded.
     """
-    module_path = "%s.%s" % (os.path.basename(os.path.dirname(__file__)), name)
-    try:
-        module = importlib.import_module(module_path)
-    except ModuleNotFoundError as ex:
-        raise LookupError("Rate module not found", ex)
+    return _ratings.get_function(name, "rate")
 
-    if not hasattr(module, "rate"):
-        raise LookupError("Rate function not found")
 
-    function = getattr(module, "rate")
+def get_reducer_by_name(name: str) -> Callable:
+    """
+    Load reducer factory by name. It returns new Reducer (see
+    quality_ratings.engine), the metrics are computed in a single pass over
+    the image. Throws LookupError as get_rate_by_name.
+    """
+    return _ratings.get_function(name, "reducer")
 
-    if not callable(function):
-        raise LookupError("Rate isn't callable")
 
-    return function
+def get_rate_names() -> List[str]:
+    return sorted(name for name, info in _ratings.infos.items() if info.rate)
 
 
-def _is_rate(name):
-    try:
-        get_rate_by_name(name)
-        return True
-    except LookupError:
-        return False
+def get_metric_names() -> List[str]:
+    return sorted(name for name, info in _ratings.infos.items() if info.reducer)
 
 
-def get_rate_names():
-    candidates = [os.path.splitext(p)[0]
-                  for p in os.listdir(os.path.dirname(__file__))]
-    return [n for n in candidates if _is_rate(n)]
+def get_rating_info(name: str) -> RatingInfo:
+    """Returns metadata of the rating. Throws KeyError if not found."""
+    return _ratings.infos[name]
 
 
-__all__ = ["get_rate_by_name", "get_rate_names"]
+__all__ = ["get_rate_by_name", "get_rate_names", "get_reducer_by_name", "get_metric_names",
+           "get_rating_info", "discover_ratings", "RatingInfo"]
@@ -1,14 +1,54 @@
 import numpy as np
 from analog_noise_estimator import estimate as estimate_analog_noise
 
+from quality_ratings.engine import Reducer, to_grayscale
+
+RATING = {
+    "name": "analog",
+    "rate": True,
+    "reducer": True,
+    "description": "Analog noise (Gaussian) estimation"
+}
+
+# The noise estimation needs the neighbourhood (3 x 3) of the pixels
+MIN_TILE_ROWS = 3
+
+
+class AnalogNoise(Reducer):
+    """
+    Analog noise rating of the image (see rate), the mean of the estimates
+    of the tiles, weighted by the number of pixels. The tiles too short to
+    estimate the noise (e.g. the last rows of the image) are skipped.
+    """
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, tile):
+        if tile.shape[0] < MIN_TILE_ROWS:
+            return
+        gray = to_grayscale(tile)
+        self.total += float(estimate_analog_noise(gray)) * gray.size
+        self.count += gray.size
+
+    def result(self):
+        if self.count == 0:
+            return None
+        return 1.0 - self.total / self.count
+
 
 def rate(img):
     '''Uses noise estimation based on Gauss distribution. Only for analog
        noise in form similar to "groats" in old TV.
 
-       Supports both 1D (grayscale) and RGBA images.'''
+       Supports both 1D (grayscale) and RGBA images, float (from matplotlib)
+       or 8-bit (from the rating engine).'''
 
-    if len(img.shape) == 3:
+    if len(img.shape) == 3 and img.dtype == np.uint8:
+        # Decoded by the rating engine (RGB), the channels are averaged
+        img = to_grayscale(img)
+    elif len(img.shape) == 3:
         # Magic happens here. If the image is read as RGBA, then it's really a 3D array
         # (each pixel is an 4 element array of values for each channel).
         # Since the alpha channel is always 1.0, we need to use offset sum, which starts
@@ -26,3 +66,7 @@ def rate(img):
         img = img * 255
 
     return 1.0 - estimate_analog_noise(img)
+
+
+def reducer():
+    return AnalogNoise()
@@ -0,0 +1,147 @@
+'''
+Rating of the APT signal (FM demodulated audio, e.g. signal.wav from the
+noaa-apt recipes) before decoding, so the empty passes can be skipped
+without the costly decoder. The file is processed in chunks:
+
+- Carrier SNR - the power density of the 2400 Hz subcarrier to the noise
+  density in the band above the APT spectrum (320 - 4480 Hz), from the
+  spectra of the short segments averaged over each second. The seconds
+  with the SNR over ACTIVE_SNR_DB are active.
+- Subcarrier power - the ratio of the power around 2400 Hz to the power of
+  the whole signal (without DC).
+- Sync - the ratio of the lines with the strong sync A, found by the APT
+  decoder (apt.py) without building the image. Each sync is searched near
+  the end of the previous line, so the line timing drift (Doppler, the
+  clock offset of the receiver) is tracked.
+
+The FM noise grows with the frequency, so the noise density measured
+above the APT spectrum makes the SNR conservative (lower).
+'''
+
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from apt import APTDecoder, read_wav
+
+# Samples of each segment of the spectrum
+SEGMENT_SAMPLES = 1024
+CARRIER_HZ = 2400
+# Width of the band around the subcarrier
+CARRIER_BANDWIDTH_HZ = 100
+# Noise band, above the APT spectrum and below the anti-aliasing filter of 11025 Hz WAV
+NOISE_BAND_HZ = (4600, 5200)
+# The frequencies below are skipped (DC offset after the FM demodulation)
+MIN_FREQUENCY_HZ = 100
+# Min normalized correlation of the sync A counted by the rating. The decoder
+# accepts lower (apt.SYNC_THRESHOLD), which the noise often reaches too.
+SYNC_RATING_THRESHOLD = 0.7
+# Carrier SNR of the active second of the signal
+ACTIVE_SNR_DB = 10.0
+# The pass is empty if the ratios of the active seconds and the synchronized lines are below
+MIN_ACTIVE_RATIO = 0.05
+MIN_SYNC_RATIO = 0.05
+
+
+class SignalRating():
+    """
+    Streaming rating of the APT signal
+
+    :param sample_rate: Sample rate of the signal (Hz), at least 10.4 kHz (the noise band)
+    :param sync: Detect the sync (the most of the CPU time)
+    """
+
+    def __init__(self, sample_rate: int, sync: bool = True):
+        frequencies = np.fft.rfftfreq(SEGMENT_SAMPLES, 1.0 / sample_rate)
+        self.carrier_bins = np.abs(frequencies - CARRIER_HZ) <= CARRIER_BANDWIDTH_HZ / 2
+        self.noise_bins = (frequencies >= NOISE_BAND_HZ[0]) & (frequencies <= NOISE_BAND_HZ[1])
+        self.signal_bins = frequencies >= MIN_FREQUENCY_HZ
+        if not np.any(self.noise_bins):
+            raise ValueError("Sample rate %d Hz is too low to measure the noise" % (sample_rate,))
+        self.sample_rate = sample_rate
+        self.window = np.hanning(SEGMENT_SAMPLES)
+        self.decoder = APTDecoder(sample_rate, keep_lines=False) if sync else None
+        self.samples = 0
+        self._buffer = np.zeros(0)
+        # Power density of the carrier and the noise, power of the carrier and the signal in each segment
+        self._segments = []
+
+    def process(self, samples: np.ndarray):
+        """Add samples of the signal"""
+        self.samples += samples.size
+        if self.decoder is not None:
+            self.decoder.process(samples)
+
+        buffer = np.concatenate([self._buffer, samples])
+        count = buffer.size // SEGMENT_SAMPLES
+        self._buffer = buffer[count * SEGMENT_SAMPLES:]
+        if count == 0:
+            return
+        segments = buffer[:count * SEGMENT_SAMPLES].reshape(count, SEGMENT_SAMPLES)
+        power = np.abs(np.fft.rfft(segments * self.window, axis=1)) ** 2
+        carrier = power[:, self.carrier_bins].sum(axis=1)
+        self._segments.append(np.stack([
+            carrier / np.count_nonzero(self.carrier_bins),
+            power[:, self.noise_bins].mean(axis=1),
+            carrier,
+            power[:, self.signal_bins].sum(axis=1)
+        ], axis=1))
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Returns the metrics of the signal: duration_s, carrier_snr_db (90th
+        percentile of the seconds), active_ratio, subcarrier_ratio and
+        sync_ratio (None if the sync isn't detected). The metrics are None
+        if the signal is shorter than a second.
+        """
+        metrics: Dict[str, Any] = {
+            "duration_s": self.samples / self.sample_rate,
+            "carrier_snr_db": None,
+            "active_ratio": None,
+            "subcarrier_ratio": None,
+            "sync_ratio": None
+        }
+        if self.decoder is not None:
+            self.decoder.flush()
+            correlations = np.array(self.decoder.assembler.correlations)
+            if correlations.size != 0:
+                metrics["sync_ratio"] = float(np.mean(correlations >= SYNC_RATING_THRESHOLD))
+
+        per_second = max(int(round(self.sample_rate / SEGMENT_SAMPLES)), 1)
+        segments = np.concatenate(self._segments) if self._segments else np.zeros((0, 4))
+        seconds = segments.shape[0] // per_second
+        if seconds == 0:
+            return metrics
+        density = segments[:seconds * per_second, :2].reshape(seconds, per_second, 2).mean(axis=1)
+        with np.errstate(divide="ignore"):
+            snr_db = 10 * np.log10(density[:, 0] / np.maximum(density[:, 1], 1e-30))
+        total = segments[:, 3].sum()
+        metrics["carrier_snr_db"] = float(np.percentile(snr_db, 90))
+        metrics["active_ratio"] = float(np.mean(snr_db >= ACTIVE_SNR_DB))
+        metrics["subcarrier_ratio"] = float(segments[:, 2].sum() / total) if total > 0 else 0.0
+        return metrics
+
+
+def rate_signal(path: str, sync: bool = True) -> Dict[str, Any]:
+    """Rate the APT signal from the WAV file, see SignalRating.result"""
+    sample_rate, chunks = read_wav(path)
+    rating = SignalRating(sample_rate, sync)
+    for chunk in chunks:
+        rating.process(chunk)
+    return rating.result()
+
+
+def is_empty(metrics: Dict[str, Optional[float]]) -> bool:
+    """
+    Returns True if the signal clearly contains no APT transmission: the
+    carrier is (almost) never present and (if detected) the sync isn't found.
+    The signal too short to rate isn't considered empty.
+    """
+    active_ratio = metrics.get("active_ratio")
+    if active_ratio is None or active_ratio >= MIN_ACTIVE_RATIO:
+        return False
+    sync_ratio = metrics.get("sync_ratio")
+    return sync_ratio is None or sync_ratio < MIN_SYNC_RATIO
+
+
+__all__ = ["SignalRating", "rate_signal", "is_empty"]
@@ -1,3 +1,33 @@
+import numpy as np
+
+from quality_ratings.engine import Reducer
+
+RATING = {
+    "name": "digital",
+    "rate": True,
+    "reducer": True,
+    "description": "Ratio of the pixels that aren't black"
+}
+
+
+class BlackPixels(Reducer):
+    """Ratio of the pixels that aren't completely black to all pixels"""
+
+    def __init__(self):
+        self.black = 0
+        self.total = 0
+
+    def update(self, tile):
+        noise_mask = tile == 0
+        if tile.ndim == 3:
+            noise_mask = noise_mask.all(axis=2)
+        self.black += int(np.count_nonzero(noise_mask))
+        self.total += noise_mask.size
+
+    def result(self):
+        if self.total == 0:
+            return None
+        return 1 - self.black / self.total
 
 
 def rate(img):
@@ -8,3 +38,7 @@ def rate(img):
     else:  # 2D or 1D
         noise_factors = noise_mask
     return 1 - noise_factors.mean()
+
+
+def reducer():
+    return BlackPixels()
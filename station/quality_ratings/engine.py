@@ -0,0 +1,178 @@
+"""
+Rating engine. The product is decoded once into 8-bit pixels (grayscale or
+RGB, without the alpha channel), instead of the float RGBA array from
+matplotlib, and the same buffer is passed to all rating functions.
+
+Several metrics are computed in a single pass: each metric module provides
+a "reducer" (see Reducer), which is fed with the consecutive tiles (bands
+of rows) of the image, and returns the metric at the end.
+
+The large products may be sampled before rating. The sample consists of
+the bands of full-resolution rows spread evenly over the image, so the
+neighbourhood of each pixel (used e.g. by the noise estimation) is kept.
+The signal quality changes along the rows (time of the pass), so the
+fraction of the rows with any feature (e.g. black, lost lines) differs
+from the fraction in the full image by at most one band period per its
+boundary.
+"""
+
+from abc import ABC, abstractmethod
+import logging
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from quality_ratings import get_metric_names, get_rate_by_name, get_reducer_by_name
+
+# Number of rows of each band of the sample
+BAND_ROWS = 16
+# Number of rows of each tile passed to the reducers
+TILE_ROWS = 64
+
+
+def read_image(path: str) -> np.ndarray:
+    """
+    Decode the image file into 8-bit pixels
+
+    :return: Grayscale (height x width) or RGB (height x width x 3) image
+    :rtype: np.ndarray of uint8
+    """
+    # Pillow is the dependency of matplotlib, but it is much lighter to import
+    from PIL import Image
+
+    with Image.open(path) as image:
+        if image.mode not in ("L", "RGB"):
+            # Palette, alpha, 16-bit etc.
+            grayscale = image.mode in ("1", "LA", "I", "I;16", "F")
+            image = image.convert("L" if grayscale else "RGB")
+        return np.asarray(image, dtype=np.uint8)
+
+
+def to_grayscale(pixels: np.ndarray) -> np.ndarray:
+    """Mean of the RGB channels (rounded), 8-bit. The grayscale image is returned as is."""
+    if pixels.ndim == 2:
+        return pixels
+    total = pixels[..., 0].astype(np.uint16)
+    total += pixels[..., 1]
+    total += pixels[..., 2]
+    return ((total * 2 + 3) // 6).astype(np.uint8)
+
+
+def sample_rows(pixels: np.ndarray, max_pixels: int, band_rows: int = BAND_ROWS) -> np.ndarray:
+    """
+    Returns the bands of `band_rows` rows spread evenly over the image, with
+    at most `max_pixels` pixels (at least one band). The image with at
+    most `max_pixels` pixels is returned as is (without copy).
+    """
+    height, width = pixels.shape[:2]
+    if height * width <= max_pixels or height <= band_rows:
+        return pixels
+    bands = max(max_pixels // (band_rows * width), 1)
+    starts = np.linspace(0, height - band_rows, bands).astype(np.intp)
+    rows = (starts[:, None] + np.arange(band_rows)[None, :]).ravel()
+    return pixels[rows]
+
+
+def iter_tiles(pixels: np.ndarray, tile_rows: int = TILE_ROWS) -> Iterator[np.ndarray]:
+    """Yields the consecutive bands of `tile_rows` rows (views, without copy); the last one may be shorter"""
+    for start in range(0, pixels.shape[0], tile_rows):
+        yield pixels[start:start + tile_rows]
+
+
+class Reducer(ABC):
+    """
+    Computes the metric from the consecutive tiles of the image. The tiles
+    are 8-bit grayscale (rows x columns) or RGB (rows x columns x 3) and
+    shared by all reducers, they must not be modified.
+    """
+
+    @abstractmethod
+    def update(self, tile: np.ndarray):
+        """Add the tile (the next rows of the image)"""
+
+    @abstractmethod
+    def result(self) -> Any:
+        """Returns the metric (JSON serializable), None if it can't be computed"""
+
+
+class RatingEngine():
+    """
+    Rates the product with the rating functions from quality_ratings. The
+    image is decoded (and sampled) once, on the first rating.
+
+    :param path: Path of the product image
+    :param pixels: Already decoded image (instead of the path)
+    :param max_pixels: Limit of the number of rated pixels, see sample_rows.
+        None - the full image is rated.
+    """
+
+    def __init__(self, path: Optional[str] = None, pixels: Optional[np.ndarray] = None,
+                 max_pixels: Optional[int] = None):
+        if path is None and pixels is None:
+            raise ValueError("Path or pixels must be provided")
+        self.path = path
+        self.max_pixels = max_pixels
+        self._pixels = pixels
+
+    @property
+    def pixels(self) -> np.ndarray:
+        """Decoded (and sampled) image. It is shared, the rating functions must not modify it."""
+        if self._pixels is None:
+            self._pixels = read_image(self.path)
+        if self.max_pixels is not None:
+            self._pixels = sample_rows(self._pixels, self.max_pixels)
+            self.max_pixels = None
+        return self._pixels
+
+    def rate(self, name: str) -> float:
+        """Rate the image with the rating function. Throws LookupError if the rate isn't found."""
+        return get_rate_by_name(name)(self.pixels)
+
+    def rate_all(self, names: Iterable[str]) -> Dict[str, Optional[float]]:
+        """Rate the image with all rating functions. The rating is None if the function fails."""
+        ratings = {}
+        for name in names:
+            try:
+                ratings[name] = self.rate(name)
+            except Exception:
+                logging.error("Error during rating the product with %s" % (name,), exc_info=True)
+                ratings[name] = None
+        return ratings
+
+    def metrics(self, names: Optional[Iterable[str]] = None, tile_rows: int = TILE_ROWS) -> Dict[str, Any]:
+        """
+        Compute the metrics in a single pass over the image. The metric is
+        None if its reducer fails.
+
+        :param names: Names of the metrics, all available if not provided
+        """
+        if names is None:
+            names = get_metric_names()
+        reducers = {}
+        metrics: Dict[str, Any] = {}
+        for name in names:
+            try:
+                reducers[name] = get_reducer_by_name(name)()
+            except Exception:
+                logging.error("Error during creating the reducer of %s metric" % (name,), exc_info=True)
+                metrics[name] = None
+
+        for tile in iter_tiles(self.pixels, tile_rows):
+            for name, reducer in list(reducers.items()):
+                try:
+                    reducer.update(tile)
+                except Exception:
+                    logging.error("Error during computing %s metric" % (name,), exc_info=True)
+                    metrics[name] = None
+                    del reducers[name]
+
+        for name, reducer in reducers.items():
+            try:
+                metrics[name] = reducer.result()
+            except Exception:
+                logging.error("Error during computing %s metric" % (name,), exc_info=True)
+                metrics[name] = None
+        return metrics
+
+
+__all__ = ["RatingEngine", "Reducer", "iter_tiles", "read_image", "to_grayscale", "sample_rows"]
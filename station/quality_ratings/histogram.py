@@ -0,0 +1,42 @@
+'''
+Histograms of the channels of the image (8-bit values in BINS bins), e.g.
+to find the saturated or dark products.
+'''
+
+import numpy as np
+
+from quality_ratings.engine import Reducer
+
+RATING = {
+    "name": "histogram",
+    "reducer": True,
+    "description": "Histograms of the channels"
+}
+
+# Number of bins (power of 2)
+BINS = 32
+CHANNEL_NAMES = ("red", "green", "blue")
+
+
+class Histogram(Reducer):
+    def __init__(self, bins: int = BINS):
+        self.bins = bins
+        self.counts = None
+
+    def update(self, tile):
+        channels = tile.reshape(-1, tile.shape[2]) if tile.ndim == 3 else tile.reshape(-1, 1)
+        if self.counts is None:
+            self.counts = np.zeros((channels.shape[1], self.bins), dtype=np.int64)
+        shift = 8 - int(np.log2(self.bins))
+        for channel in range(channels.shape[1]):
+            self.counts[channel] += np.bincount(channels[:, channel] >> shift, minlength=self.bins)
+
+    def result(self):
+        if self.counts is None:
+            return None
+        names = CHANNEL_NAMES if self.counts.shape[0] == 3 else ("gray",)
+        return {name: counts.tolist() for name, counts in zip(names, self.counts)}
+
+
+def reducer():
+    return Histogram()
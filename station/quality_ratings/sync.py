@@ -0,0 +1,74 @@
+'''
+Quality of the sync A of the APT image. Each line of the decoded image
+(2080 words) starts with sync A (see apt.py). The rows of the image are
+compared with the sync pattern: the ratio of the rows, which contain it,
+and the SNR of the sync, i.e. the power of the pattern to the power of
+the residual. The images of other width (e.g. Meteor) have no metric and
+their rate is 0.0 (no line has sync A).
+'''
+
+import numpy as np
+
+from apt import LINE_WORDS, SYNC_A, SYNC_THRESHOLD
+from quality_ratings.engine import Reducer, to_grayscale
+
+RATING = {
+    "name": "sync",
+    # The ratio of the lines with sync A, 0.0 for other images (e.g. Meteor)
+    "rate": True,
+    "reducer": True,
+    "description": "Ratio of the APT lines with sync A and its SNR"
+}
+
+# Zero mean pattern, so the correlation doesn't depend on the brightness
+PATTERN = SYNC_A - np.mean(SYNC_A)
+
+
+class SyncDetector(Reducer):
+    def __init__(self):
+        self.rows = 0
+        self.synchronized = 0
+        self.signal_power = 0.0
+        self.noise_power = 0.0
+        self.compatible = True
+
+    def update(self, tile):
+        if tile.shape[1] != LINE_WORDS:
+            self.compatible = False
+            return
+        words = to_grayscale(tile)[:, :PATTERN.size].astype(np.float64)
+        words -= words.mean(axis=1, keepdims=True)
+        # Amplitude of the pattern in each row (least squares) and the rest
+        amplitude = words @ PATTERN / (PATTERN @ PATTERN)
+        residual = words - amplitude[:, None] * PATTERN[None, :]
+        norm = np.linalg.norm(words, axis=1) * np.linalg.norm(PATTERN)
+        correlation = np.divide(words @ PATTERN, norm, out=np.zeros(words.shape[0]), where=norm != 0)
+
+        self.rows += words.shape[0]
+        self.synchronized += int(np.count_nonzero(correlation >= SYNC_THRESHOLD))
+        self.signal_power += float(np.sum(amplitude ** 2)) * float(PATTERN @ PATTERN)
+        self.noise_power += float(np.sum(residual ** 2))
+
+    def result(self):
+        if not self.compatible or self.rows == 0:
+            return None
+        # Undefined (None) for the image without noise, e.g. synthetic
+        snr_db = None
+        if self.noise_power != 0:
+            snr_db = float(10 * np.log10(max(self.signal_power, 1e-12) / self.noise_power))
+        return {
+            "ratio": self.synchronized / self.rows,
+            "snr_db": snr_db
+        }
+
+
+def rate(img):
+    """Ratio of the lines of APT image (8-bit) with sync A, 0.0 for other images"""
+    detector = SyncDetector()
+    detector.update(np.asarray(img, dtype=np.uint8))
+    result = detector.result()
+    return 0.0 if result is None else result["ratio"]
+
+
+def reducer():
+    return SyncDetector()
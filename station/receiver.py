@@ -6,15 +6,15 @@ import sys
 import typing
 import json
 
-from matplotlib.pyplot import imread
-
 from utils.functional import first
-from utils.models import get_satellite
+from utils.models import Configuration, get_satellite
 from utils.dates import from_iso_format
 from utils.configuration import open_config
+from utils.jobqueue import JobQueue
+from utils import instrumentation
 from submitobs import submit_observation, SubmitRequestData
 from recipes import factory
-from quality_ratings import get_rate_by_name
+import postprocessing
 from sh import CommandNotFound
 from metadata import Metadata
 
@@ -30,38 +30,113 @@ def move_to_satellite_directory(root: str, sat_name: str, path: str):
     shutil.move(path, new_path)
 
 
-config = open_config()
-
-
-def get_rating_for_product(product_path: str, rate_name: typing.Optional[str]) \
-        -> typing.Optional[float]:
+def get_rating_for_product(product_path: str, rate_name: typing.Optional[str],
+                           max_pixels: typing.Optional[int] = None) -> typing.Optional[float]:
+    """
+    Rates the product image. The image is decoded into 8-bit pixels (see
+    quality_ratings.engine), optionally sampled to at most max_pixels.
+    Returns None if the rating fails.
+    """
     if rate_name is None:
         return None
 
     try:
-        rate = get_rate_by_name(rate_name)
-        img = imread(product_path)
-        return rate(img)
+        # Loaded on demand, the station doesn't need NumPy until the rating
+        from quality_ratings.engine import RatingEngine
+        return RatingEngine(product_path, max_pixels=max_pixels).rate(rate_name)
     except Exception:
         logging.error("Error during rating the product", exc_info=True)
         return None
 
 
+def rate_product(product_path: str, rate_name: typing.Optional[str], max_pixels: typing.Optional[int] = None) \
+        -> typing.Tuple[typing.Optional[float], typing.Dict[str, typing.Any]]:
+    """
+    Rates the product and computes all metrics from quality_ratings in a
+    single pass. The image is decoded once and shared.
+
+    :return: Rating (None if the rate isn't specified or fails) and metrics
+        by name (empty if the image can't be decoded)
+    """
+    from quality_ratings.engine import RatingEngine
+    engine = RatingEngine(product_path, max_pixels=max_pixels)
+
+    rating = None
+    if rate_name is not None:
+        try:
+            rating = engine.rate(rate_name)
+        except Exception:
+            logging.error("Error during rating the product", exc_info=True)
+
+    try:
+        metrics = engine.metrics()
+    except Exception:
+        logging.error("Error during computing the metrics of the product", exc_info=True)
+        metrics = {}
+    return rating, metrics
+
+
+def get_signal_metrics(signal_path: str) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """
+    Rates the APT signal (WAV) before decoding, see quality_ratings.apt_signal.
+    Returns None if the rating fails.
+    """
+    try:
+        from quality_ratings.apt_signal import rate_signal
+        return rate_signal(signal_path)
+    except Exception:
+        logging.error("Error during rating the signal", exc_info=True)
+        return None
+
+
+def _is_empty_signal(recipe_name: str, results, skip_empty: bool) \
+        -> typing.Tuple[bool, typing.Optional[typing.Dict[str, typing.Any]]]:
+    """Rates the APT signal of the capture (if enabled). Returns True if it is clearly empty, and the metrics."""
+    if not skip_empty or "APT" not in factory.recipes.info(recipe_name).modulations:
+        return False, None
+    signal = first(results, lambda r: r[0] == "SIGNAL" and r[1].endswith(".wav") and os.path.exists(r[1]))
+    if signal is None:
+        return False, None
+    metrics = get_signal_metrics(signal[1])
+    if metrics is None:
+        return False, None
+    from quality_ratings.apt_signal import is_empty
+    return is_empty(metrics), metrics
+
+
 def cmd():
     if len(sys.argv) < 3:
-        print("Usage: receiver.py <name> <los> [opts]")
+        print("Usage: receiver.py <name> <los> [device]")
         print("name - name of the receiver")
         print("los - loss of signal time (UTC)")
+        print("device - SDR device used for reception (default: the recipe's default)")
         return
 
     _, name, los, *opts = sys.argv
+    device = opts[0] if len(opts) != 0 else None
+    # It sets also the logging level
+    config = open_config()
 
-    logging.info("Starting receiver job: name=%s los=%s, PATH=%s" % (name, los, os.getenv('PATH')))
+    logging.info("Starting receiver job: name=%s los=%s device=%s, PATH=%s" % (name, los, device, os.getenv('PATH')))
 
+    receive(name, from_iso_format(los), device, config)
+
+
+def receive(name: str, los_datetime: datetime.datetime, device: typing.Optional[str] = None,
+            config: typing.Optional[Configuration] = None, drain: bool = True):
+    """
+    Receives the transmission from the satellite until LOS (naive UTC), then
+    queues the processing (see process_job). It is used by the receiver cron
+    job (cmd) and by the station daemon.
+
+    :param drain: Drain the processing queue after the capture. The station
+        daemon drains it in its own task, so the reception ends after the capture.
+    """
+    if config is None:
+        config = open_config()
     satellite = get_satellite(config, name)
 
     aos_datetime = datetime.datetime.utcnow()
-    los_datetime = from_iso_format(los)
 
     # TODO: calculate TCA properly. There may be cases when an observation is interrupted by another,
     # better pass. Also, part of the pass could be obscured by buildings.
@@ -83,11 +158,54 @@ def cmd():
     logging.info(f"INFO: metadata written to {metadata_file}.")
 
     try:
-        results, dir, metadata = factory.execute_recipe(satellite, los_datetime)
+        results, dir, metadata = factory.capture_recipe(satellite, los_datetime, device)
     except Exception as e:
         logging.error(f"ERROR: Recipe execution failed, exception: {e}, {str(e)}")
         return
 
+    # The decoding, rating and submission are queued, so they don't slow down
+    # the capture of the next pass. The queue is drained by this process
+    # (unless another one is already doing it) or by the station daemon.
+    queue = JobQueue()
+    job_id = queue.put({
+        "satellite": satellite["name"],
+        "recipe": metadata["recipe"],
+        "dir": dir,
+        "results": results,
+        "metadata": metadata,
+        "aos": aos_datetime.isoformat(),
+        "tca": tca_datetime.isoformat(),
+        "los": los_datetime.isoformat()
+    })
+    logging.info("Capture complete, processing job %s queued, queue depth %d" % (job_id, queue.depth()))
+    if drain:
+        postprocessing.drain(config, queue)
+
+
+def process_job(job: dict, config: typing.Optional[Configuration] = None):
+    """
+    Executes the process phase of the recipe on the captured files, then
+    rates, submits and stores the results. The job is created by receive.
+    """
+    if config is None:
+        config = open_config()
+    name = job["satellite"]
+    satellite = get_satellite(config, name)
+    dir = job["dir"]
+    metadata = job["metadata"]
+    aos_datetime = from_iso_format(job["aos"])
+    tca_datetime = from_iso_format(job["tca"])
+    los_datetime = from_iso_format(job["los"])
+
+    results = [(category, path) for category, path in job["results"]]
+    # The empty passes (e.g. the satellite transmitter is off) aren't decoded and submitted
+    processing = config.get("processing") or {}
+    empty, signal_metrics = _is_empty_signal(job["recipe"], results, processing.get("skip_empty", False))
+    if empty:
+        logging.info("The signal is empty (%s), the decoding and the submission are skipped" % (signal_metrics,))
+    else:
+        results += factory.process_recipe(job["recipe"], dir)
+
     # We're entirely sure the recipe is honest and reported only files that were actually created *cough*.
     # However, if things go south and for some reason the recipe is mistaken (e.g. the noaa-apt fails to
     # create a .png file, because the input WAV file was junk), then we should filter out the files
@@ -122,6 +240,15 @@ def cmd():
     m.set("aos", aos_datetime.isoformat())
     m.set("los", los_datetime.isoformat())
     m.set("tca", tca_datetime.isoformat())
+    if signal_metrics is not None:
+        m.set("signal-metrics", signal_metrics)
+    # Resource usage of the recipe phases and the tools, to find the bottlenecks across the stations
+    timings = instrumentation.load(dir)
+    if timings["stages"] or timings["commands"]:
+        m.set("timings", timings)
+        for record in timings["stages"]:
+            logging.info("Recipe %s phase took %.1f s (CPU %.1f s, written %d B)" % (
+                record["name"], record["wall_s"], record["cpu_s"], record["bytes_written"]))
     # Write metadata to local file
     metadata_file = os.path.join(dir, "metadata.json")
     m.writeFile(metadata_file)
@@ -131,10 +258,11 @@ def cmd():
         product = first(products, lambda _: True)
         if product is not None:
             logging.info(f"Submitting results, Getting rating for product {product[1]} (rating algorithm is {satellite.get('rate')}")
-            rating = get_rating_for_product(product[1], satellite.get("rate"))
-            logging.info(f"Product {product[1]} got rating {rating}.")
+            rating, metrics = rate_product(product[1], satellite.get("rate"))
+            logging.info(f"Product {product[1]} got rating {rating}, metrics {', '.join(sorted(metrics))}.")
             m.set("rating-algorithm", satellite.get("rate"))
             m.set("rating", rating)
+            m.set("metrics", metrics)
 
             # TODO: Submit ALL products and logs
             logging.warning("TODO: signal and logs submission not implemented yet")
@@ -1,12 +1,110 @@
-import recipes.noaa_apt
-import recipes.meteor_qpsk
-import recipes.noaa_apt_gr
-
-# Each recipe should be registered in this dictionary
-recipes = {
-    'noaa-apt': recipes.noaa_apt.execute,
-    'noaa-apt-gr': recipes.noaa_apt_gr.execute,
-    'meteor-qpsk': recipes.meteor_qpsk.execute
-}
-
-__all__ = ["recipes"]
+import importlib
+import os
+from typing import Callable, Dict, Iterator, Mapping, NamedTuple, Optional, Tuple
+
+from utils.modules import get_constants_in_directory, get_function_in_module
+
+RECIPES_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+class RecipeInfo(NamedTuple):
+    """
+    Recipe metadata, declared in the recipe module as RECIPE dictionary
+    (literal) with the same keys. Only the name is required.
+    """
+    name: str
+    # Python module of the recipe
+    module: str
+    # Supported modulations, e.g. "APT", "LRPT"
+    modulations: Tuple[str, ...] = ()
+    # External programs required by the recipe
+    binaries: Tuple[str, ...] = ()
+    # Expected number of CPU cores used during the capture
+    cpu: float = 1.0
+    # Expected disk usage (MB) per minute of the pass
+    disk_mb_per_minute: float = 0.0
+    # The signal is processed while it is received
+    streaming: bool = False
+    # Prefixes of satellite names, which use this recipe if no recipe is configured
+    satellites: Tuple[str, ...] = ()
+
+
+def discover_recipes(directory: str = RECIPES_DIRECTORY) -> Dict[str, RecipeInfo]:
+    """
+    Returns metadata of the recipes in the directory by recipe name. The
+    recipe modules aren't imported, the RECIPE constants are read from source.
+    """
+    infos = {}
+    for module_name, metadata in get_constants_in_directory(directory, "RECIPE"):
+        fields = {key: tuple(value) if isinstance(value, list) else value for key, value in metadata.items()}
+        info = RecipeInfo(module="%s.%s" % (os.path.basename(directory), module_name), **fields)
+        infos[info.name] = info
+    return infos
+
+
+class _LazyRecipes(Mapping):
+    """
+    Maps recipe names to "execute" functions. The recipes are discovered
+    from metadata on the first use and the recipe module is imported on the
+    first access, so the station doesn't load the dependencies (e.g. GNU Radio,
+    matplotlib) of the recipes it doesn't use.
+    """
+
+    def __init__(self, directory: str):
+        self._directory = directory
+        self._infos: Optional[Dict[str, RecipeInfo]] = None
+        self._functions: Dict[str, Callable] = {}
+
+    @property
+    def infos(self) -> Dict[str, RecipeInfo]:
+        if self._infos is None:
+            self._infos = discover_recipes(self._directory)
+        return self._infos
+
+    def info(self, name: str) -> RecipeInfo:
+        """Returns metadata of the recipe. Throws KeyError if not found."""
+        return self.infos[name]
+
+    def find_for_satellite(self, satellite_name: str) -> Optional[str]:
+        """Returns name of the default recipe for the satellite, None if not found."""
+        for name in sorted(self.infos):
+            if any(satellite_name.startswith(prefix) for prefix in self.infos[name].satellites):
+                return name
+        return None
+
+    def _get_module(self, name: str):
+        return importlib.import_module(self.infos[name].module)
+
+    def __getitem__(self, name: str) -> Callable:
+        function = self._functions.get(name)
+        if function is None:
+            function = get_function_in_module(self._get_module(name), "execute")
+            if function is None:
+                raise LookupError("Recipe %s has no execute function" % (name,))
+            self._functions[name] = function
+        return function
+
+    def get_phases(self, name: str) -> Tuple[Callable, Optional[Callable]]:
+        """
+        Returns the "capture" and "process" functions of the recipe. The recipe
+        without them is executed entirely in the capture phase ("execute"
+        function) and the process function is None.
+        """
+        module = self._get_module(name)
+        capture = get_function_in_module(module, "capture")
+        process = get_function_in_module(module, "process")
+        if capture is None or process is None:
+            return self[name], None
+        return capture, process
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.infos)
+
+    def __len__(self) -> int:
+        return len(self.infos)
+
+
+# Each recipe declares its metadata in the RECIPE dictionary (see RecipeInfo)
+recipes = _LazyRecipes(RECIPES_DIRECTORY)
+
+__all__ = ["recipes", "RecipeInfo", "discover_recipes"]
@@ -9,6 +9,11 @@ Each recipe takes three parameters:
 * Frequency - transmission frequency in MHz
 * Duration - after this time script should stop SDR, in seconds
 
+and optional "device" keyword parameter - identifier of SDR device used
+when the station has many receivers: rtl-sdr device index or serial, or
+SoapySDR device string. The recipe converts it to the form of its tools
+(see recipes.helpers.get_rtl_fm_device_args and get_soapy_device).
+
 As output the script returns a dictionary where key is a category
 and value is a path or paths to file(s). Currently the following categories
 are supported:
@@ -35,18 +40,41 @@ config. Now it is optional and script try to deduce recipe based on satellite.
 recipe for NOAA).
 
 All recipes must be located in directory with this file ("recipes") and have
-"execute" method which accept all parameters.
+"execute" method which accept all parameters. Each recipe declares its
+metadata in the module-level RECIPE dictionary (name, modulations, required
+binaries, expected CPU and disk usage, streaming, default satellites), see
+recipes.RecipeInfo. The metadata is read without importing the module.
+
+The recipe may be split into two phases: "capture" (the same parameters as
+"execute", records the signal until LOS) and "process" (takes the working
+directory, decodes the recorded files). Both return the results as above;
+"execute" runs them one after another. The station runs the capture phase
+at the pass time and queues the process phase (see postprocessing.py), so
+the decoding doesn't compete for the CPU with the capture of the next pass.
+
+The recipe may accept extra keyword options in "execute" and "capture".
+They are configured in the "recipes" section of the config, by recipe name:
+
+    recipes:
+      noaa-apt:
+        pipeline: true   # stream rtl_fm | sox while receiving
+        keep_raw: false  # keep the raw samples (signal.raw)
+
+The wall time and the resource usage of the phases and of the commands
+executed through "sh" are recorded in timings.json in the working directory
+(see utils.instrumentation).
 '''
 
 import datetime
 import os
 import sys
 import logging
-from typing import Iterable, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
-from utils.models import SatelliteConfiguration
+from utils.models import Configuration, SatelliteConfiguration
 from recipes import recipes
 from utils.configuration import open_config
+from utils import instrumentation
 
 if sys.version_info[0] == 3 and sys.version_info[1] >= 8:
     from typing import Literal
@@ -81,14 +109,26 @@ def get_recipe(sat: SatelliteConfiguration):
     recipe = None
     if "recipe" in sat:
         recipe = sat["recipe"]
-    if recipe is None and sat["name"].startswith("NOAA"):
-        recipe = "noaa-apt"
     if recipe is None:
+        # The recipes declare the satellites they handle by default (see RecipeInfo)
+        recipe = recipes.find_for_satellite(sat["name"])
+    if recipe is None or recipe not in recipes:
         raise LookupError("Unknown recipe")
 
     return recipes[recipe], recipe
 
 
+def get_recipe_options(recipe_name: str, config: Optional[Configuration] = None) -> Dict[str, Any]:
+    '''
+    Returns the options of the recipe from the "recipes" section of the config.
+    They are passed to "execute" or "capture" as the keyword arguments.
+    '''
+    if config is None:
+        config = open_config()
+    options = (config.get("recipes") or {}).get(recipe_name)
+    return dict(options or {})
+
+
 def get_unique_dir(sat: SatelliteConfiguration, los: datetime.datetime) -> str:
     '''
     Generates unique, but meaningful dir name.
@@ -106,14 +146,15 @@ def get_dir(sat: SatelliteConfiguration, los: datetime.datetime) -> str:
     return reception_dir
 
 
-def execute_recipe(sat: SatelliteConfiguration, los: datetime.datetime) \
+def execute_recipe(sat: SatelliteConfiguration, los: datetime.datetime, device: Optional[str] = None) \
         -> Tuple[Iterable[Tuple[ReceptionResultCategory, str]], str, dict]:
     '''
     Execute recipe for specified satellite and return results.
 
     Return collection of tuples with category, path, and metadata.
     Second item in result is path to temporary observation directory.
-    If no recipe found then throw LookupError.
+    If no recipe found then throw LookupError. Device is passed to the recipe
+    (None means the default device of the recipe).
 
     We use "signal" category for raw, unprocessed received signal file
     and "product" for finished data (e. q. imagery) extracted from signal.
@@ -133,11 +174,53 @@ def execute_recipe(sat: SatelliteConfiguration, los: datetime.datetime) \
         "frequency": sat["freq"],
         "recipe": str(recipe_name)
     }
+    if device is not None:
+        metadata["device"] = device
+
+    with instrumentation.stage(reception_dir, "execute"):
+        output = recipe_function(reception_dir, sat["freq"], record_interval, device=device,
+                                 **get_recipe_options(recipe_name))
+    return output, reception_dir, metadata
+
+
+def capture_recipe(sat: SatelliteConfiguration, los: datetime.datetime, device: Optional[str] = None) \
+        -> Tuple[List[Tuple[ReceptionResultCategory, str]], str, dict]:
+    '''
+    Execute the capture phase of the recipe for specified satellite. The
+    result is the same as of execute_recipe. The recipe without the phases
+    is executed entirely.
+    '''
+    _, recipe_name = get_recipe(sat)
+    capture, _ = recipes.get_phases(recipe_name)
+
+    reception_dir = get_dir(sat, los)
+    record_interval = los - datetime.datetime.utcnow()
+
+    metadata = {
+        "frequency": sat["freq"],
+        "recipe": str(recipe_name)
+    }
+    if device is not None:
+        metadata["device"] = device
 
-    output = recipe_function(reception_dir, sat["freq"], record_interval)
+    with instrumentation.stage(reception_dir, "capture"):
+        output = list(capture(reception_dir, sat["freq"], record_interval, device=device,
+                              **get_recipe_options(recipe_name)))
     return output, reception_dir, metadata
 
 
+def process_recipe(recipe_name: str, reception_dir: str) -> List[Tuple[ReceptionResultCategory, str]]:
+    '''
+    Execute the process phase of the recipe on the captured files. Returns
+    the additional results (e.g. products). Empty if the recipe has no phases.
+    '''
+    _, process = recipes.get_phases(recipe_name)
+    if process is None:
+        return []
+    with instrumentation.stage(reception_dir, "process"):
+        return list(process(reception_dir))
+
+
 def get_recipe_names() -> List[str]:
     '''Returns all recipe names.'''
     return list(recipes.keys())
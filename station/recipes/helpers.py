@@ -1,7 +1,10 @@
 from functools import wraps
+from typing import Any, Optional, Tuple
 
 import sh
 
+from utils.instrumentation import Recorder
+
 
 def set_sh_defaults(f):
     '''
@@ -12,6 +15,9 @@ def set_sh_defaults(f):
 
     - Set working directory to directory provided as
     first arguement.
+    - Record the resource usage of the executed commands
+    into timings.json in the working directory (see
+    utils.instrumentation).
 
     Decorated function must to accept "sh" as keyword argument.
 
@@ -28,7 +34,99 @@ def set_sh_defaults(f):
     '''
     @wraps(f)
     def inner(working_dir, *args, **kwargs):
-        sh2 = sh.bake(_cwd=working_dir)
+        recorder = Recorder(working_dir, f.__name__)
+        sh2 = recorder.wrap(sh.bake(_cwd=working_dir))
         kwargs["sh"] = sh2
-        return f(working_dir, *args, **kwargs)
+        try:
+            return f(working_dir, *args, **kwargs)
+        finally:
+            recorder.write()
     return inner
+
+
+def _parse_soapy_device(device: str) -> dict:
+    '''Split SoapySDR device string (e.g. "driver=rtlsdr,serial=0002") into dictionary'''
+    return dict(item.split("=", 1) for item in device.split(",") if "=" in item)
+
+
+def get_rtl_fm_device_args(device: Optional[str]) -> Tuple[str, ...]:
+    '''
+    Returns the arguments of rtl_fm (and the other rtl-sdr tools) which
+    select the receiver (see "receivers" in the config). The receiver is
+    the device index, the serial or the SoapySDR device string of rtl-sdr
+    (e.g. "driver=rtlsdr,serial=00000002"). None - the default device.
+    Throws ValueError if the device isn't rtl-sdr.
+    '''
+    if device is None:
+        return ()
+    if "=" not in device:
+        return ("-d", device)
+    args = _parse_soapy_device(device)
+    if args.get("driver", "rtlsdr") != "rtlsdr":
+        raise ValueError("Device %s isn't supported by rtl_fm" % (device,))
+    if "serial" in args:
+        return ("-d", args["serial"])
+    if "rtl" in args:
+        return ("-d", args["rtl"])
+    return ()
+
+
+def get_soapy_device(device: Optional[str], default: str) -> str:
+    '''
+    Returns the SoapySDR device string of the receiver (see
+    get_rtl_fm_device_args). The index and the serial are rtl-sdr devices.
+    The number without leading zeros (e.g. "1") is the index, the rtl-sdr
+    serials are usually zero-padded (e.g. "00000002").
+    '''
+    if device is None:
+        return default
+    if "=" in device:
+        return device
+    if device.isdigit() and str(int(device)) == device:
+        return "driver=rtlsdr,rtl=%s" % (device,)
+    return "driver=rtlsdr,serial=%s" % (device,)
+
+
+def get_rtl_fm_raw_args(frequency: str, device: Optional[str] = None) -> Tuple[Any, ...]:
+    '''
+    Returns the arguments of rtl_fm which record the raw I/Q samples
+    (e.g. of Meteor QPSK signal) on the receiver (see
+    get_rtl_fm_device_args). The samples are written to the path (or "-"
+    for stdout) passed after them. The signal is sampled at 288 kHz (see
+    get_sox_raw_args).
+    '''
+    return get_rtl_fm_device_args(device) + (
+        # Modulation raw
+        "-M", "raw",
+        # Set frequency (in Hz, e.g. 137MHz)
+        "-f", frequency,
+        # Enable bias-T (disabled)
+        # "-T",
+        # Specify sampling rate (e.g. 48000 Hz)
+        "-s", 48000,
+        # Almost maximal possible value. Probably is wrong for other SDR then rtl-sdr
+        "-g", 48,
+        # Copy-paste from suspicious www
+        "-p", 1
+    )
+
+
+def get_sox_raw_args(channels: int = 2) -> Tuple[Any, ...]:
+    '''
+    Returns the input arguments of sox which read the raw samples recorded
+    by rtl_fm (see get_rtl_fm_raw_args). The input path (or "-" for stdin)
+    is passed after them.
+    '''
+    return (
+        # Type of input
+        "-t", "raw",
+        "-r", "288k",
+        # Channels - 2 - stereo
+        "-c", channels,
+        # Sample size
+        "-b", 16,
+        # Signed integer encoding
+        "-e", "s",
+        # Verbosity level (0 - silence, 1 - failure messages, 2 - warnings, 3 - processing phases, 4 - debug)
+        "-V3"
+    )
@@ -1,15 +1,31 @@
 from contextlib import suppress
 from datetime import timedelta, datetime
 import os.path
+from typing import Optional
 import signal
 import sh
-from recipes.helpers import set_sh_defaults
+from recipes.helpers import get_rtl_fm_raw_args, get_sox_raw_args, set_sh_defaults
+
+RECIPE = {
+    "name": "meteor-qpsk",
+    "modulations": ["LRPT"],
+    "binaries": ["rtl_fm", "sox", "meteor_demod", "medet", "convert"],
+    "cpu": 1.0,
+    # Raw samples, WAV and normalized WAV
+    "disk_mb_per_minute": 120.0,
+    "streaming": False
+}
 
 
 @set_sh_defaults
-def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
-    signal_path = os.path.join(working_dir, "signal.wav")
-    product_path = os.path.join(working_dir, "product.png")
+def execute(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh):
+    """Receive and decode Meteor QPSK signal (capture and process)."""
+    return capture(working_dir, frequency, duration, device) + process(working_dir)
+
+
+@set_sh_defaults
+def capture(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh):
+    """Record raw samples of Meteor QPSK signal."""
     raw_path = os.path.join(working_dir, "signal.raw")
     log_path = os.path.join(working_dir, "session.log")
 
@@ -18,31 +34,14 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
     logfile.write(f"meteor-qpsk recipe, writing to {working_dir}, capturing freq {frequency}, duration {duration}\n")
     logfile.flush()
 
-    normalized_signal_path = os.path.join(working_dir, "normalized_signal.wav")
-    qpsk_path = os.path.join(working_dir, "qpsk")
-    dump_prefix_path = os.path.join(working_dir, "dump")
-    dump_path = dump_prefix_path + ".dec"
-    product_raw_prefix_path = os.path.join(working_dir, "product_raw")
-    product_raw_path = product_raw_prefix_path + ".bmp"
-
     # Record signal
 
     logfile.write(f"{str(datetime.now())} --- rtl_fm log ---\n")
     logfile.flush()
     with suppress(sh.TimeoutException):
         fm_proc = sh.rtl_fm(
-            # Modulation raw
-            "-M", "raw",
-            # Set frequency (in Hz, e.g. 137MHz)
-            "-f", frequency,
-            # Enable bias-T (disabled)
-            # "-T",
-            # Specify sampling rate (e.g. 48000 Hz)
-            "-s", 48000,
-            # Almost maximal possible value. Probably is wrong for other SDR then rtl-sdr
-            "-g", 48,
-            # Copy-paste from suspicious www
-            "-p", 1,
+            # Select the device (index, serial or SoapySDR string) if the station has many receivers
+            *get_rtl_fm_raw_args(frequency, device),
             raw_path,
             _timeout=duration.total_seconds(),
             _timeout_signal=signal.SIGKILL,
@@ -50,22 +49,34 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
             _bg_exc=False
             )
         logfile.write(f"rtl_fm started, pid is {fm_proc.pid}\n")
+    logfile.close()
+
+    return [
+        ("LOG", log_path),
+        ("RAW", raw_path)
+    ]
 
+
+@set_sh_defaults
+def process(working_dir: str, sh=sh):
+    """Demodulate and decode the recorded Meteor QPSK signal into PNG image."""
+    signal_path = os.path.join(working_dir, "signal.wav")
+    product_path = os.path.join(working_dir, "product.png")
+    raw_path = os.path.join(working_dir, "signal.raw")
+    log_path = os.path.join(working_dir, "session.log")
+
+    normalized_signal_path = os.path.join(working_dir, "normalized_signal.wav")
+    qpsk_path = os.path.join(working_dir, "qpsk")
+    dump_prefix_path = os.path.join(working_dir, "dump")
+    dump_path = dump_prefix_path + ".dec"
+    product_raw_prefix_path = os.path.join(working_dir, "product_raw")
+    product_raw_path = product_raw_prefix_path + ".bmp"
+
+    logfile = open(log_path, "a")
     logfile.write(f"{str(datetime.now())} --- sox (step 1, convert) log ---\n")
     logfile.flush()
     sh.sox(
-        # Type of input
-        "-t", "raw",
-        "-r", "288k",
-        # Channels - 2 - stereo
-        "-c", 2,
-        # Sample size
-        "-b", 16,
-        # Signed integer encoding
-        "-e", "s",
-        # Verbosity level (0 - silence, 1 - failure messages, 2 - warnings, 3 - processing phases, 4 - debug)
-        "-V3",
-        # Read from stdin (from pipe)
+        *get_sox_raw_args(),
         raw_path,
         # Type of output
         "-t", "wav",
@@ -130,11 +141,9 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
     sh.convert(product_raw_path, product_path, _out=logfile)
 
     logfile.write(f"{str(datetime.now())} meteor_qpsk recipe complete.\n")
-    logfile.flush()
+    logfile.close()
 
     return [
         ("SIGNAL", signal_path),
-        ("PRODUCT", product_path),
-        ("LOG", log_path),
-        ("RAW", raw_path)
+        ("PRODUCT", product_path)
     ]
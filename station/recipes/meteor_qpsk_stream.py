@@ -0,0 +1,270 @@
+"""
+Streaming variant of the meteor-qpsk recipe. The samples flow through the
+pipeline while they are received:
+
+  rtl_fm | sox (resampling) | running gain (in this process) | FIFO | meteor_demod
+
+so the only file written during the pass is the QPSK soft symbols from the
+demodulator (there is no raw file, WAV or normalized WAV on the SD card).
+After LOS the symbols are decoded once by medet straight into the image.
+"""
+
+from contextlib import contextmanager, suppress
+from datetime import timedelta, datetime
+import errno
+import os
+import os.path
+import signal
+import struct
+import time
+from typing import Optional
+
+import numpy as np
+import sh
+
+from recipes.helpers import get_rtl_fm_raw_args, get_sox_raw_args, set_sh_defaults
+from utils.agc import RunningGain
+
+RECIPE = {
+    "name": "meteor-qpsk-stream",
+    "modulations": ["LRPT"],
+    "binaries": ["rtl_fm", "sox", "meteor_demod", "medet", "convert"],
+    "cpu": 1.5,
+    # QPSK soft symbols only
+    "disk_mb_per_minute": 9.0,
+    "streaming": True
+}
+
+# Sample rate of the signal passed to the demodulator
+SAMPLE_RATE = 96000
+CHANNELS = 2
+# Size of the chunks read from sox (bytes)
+CHUNK_SIZE = 1 << 16
+# Time to wait (seconds) for the demodulator to open the FIFO
+FIFO_OPEN_TIMEOUT_S = 10.0
+
+
+def get_wav_header(sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS) -> bytes:
+    """
+    Returns the header of 16-bit PCM WAV with unknown length (streamed). The
+    sizes are set to the maximal values, the reader stops at the end of file.
+    """
+    block_align = channels * 2
+    return b"".join([
+        b"RIFF", struct.pack("<I", 0xFFFFFFFF), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, 16),
+        b"data", struct.pack("<I", 0xFFFFFFFF - 36)
+    ])
+
+
+class _NormalizingWriter():
+    """
+    Receives the raw samples (signed 16-bit, interleaved channels) from sox
+    and writes them normalized by the running gain into the stream. It is
+    used as the sh output handler - without "encoding" attribute it gets
+    the chunks as bytes.
+    """
+
+    def __init__(self, stream, sample_rate: int = SAMPLE_RATE, channels: int = CHANNELS):
+        self.stream = stream
+        self.channels = channels
+        self.agc = RunningGain(sample_rate)
+        self._remainder = b""
+        self.stream.write(get_wav_header(sample_rate, channels))
+
+    def write(self, chunk: bytes):
+        data = self._remainder + chunk
+        frame_size = 2 * self.channels
+        end = len(data) - len(data) % frame_size
+        self._remainder = data[end:]
+        frames = np.frombuffer(data[:end], dtype="<i2").reshape(-1, self.channels)
+        normalized = self.agc.process(frames.astype(np.float32))
+        try:
+            self.stream.write(np.round(normalized).astype("<i2").tobytes())
+        except BrokenPipeError:
+            # The demodulator exited, the samples are dropped
+            pass
+
+    def flush(self):
+        pass
+
+
+def _open_fifo(path: str, reader, timeout_s: float = FIFO_OPEN_TIMEOUT_S):
+    """
+    Opens the FIFO for writing when the reader process opens it. Returns
+    None if the reader exits or doesn't open the FIFO in time.
+    """
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            # No reader yet
+            if e.errno != errno.ENXIO:
+                raise
+            if not reader.is_alive():
+                return None
+            time.sleep(0.1)
+            continue
+        os.set_blocking(fd, True)
+        return os.fdopen(fd, "wb")
+    return None
+
+
+@contextmanager
+def _stage(logfile, name: str):
+    """Logs the start, the end and the duration of the stage."""
+    logfile.write(f"{datetime.now()} --- {name} log ---\n")
+    logfile.flush()
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        logfile.write(f"{datetime.now()} {name} finished in {time.monotonic() - start:.1f} s\n")
+        logfile.flush()
+
+
+@set_sh_defaults
+def execute(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh):
+    """Receive and decode Meteor QPSK signal (capture and process)."""
+    return capture(working_dir, frequency, duration, device) + process(working_dir)
+
+
+@set_sh_defaults
+def capture(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh):
+    """Receive and demodulate Meteor QPSK signal into the soft symbols."""
+    qpsk_path = os.path.join(working_dir, "qpsk")
+    fifo_path = os.path.join(working_dir, "signal.fifo")
+    log_path = os.path.join(working_dir, "session.log")
+
+    # Select the device (index, serial or SoapySDR string) if the station has many receivers
+    rtl_fm_args = get_rtl_fm_raw_args(frequency, device)
+
+    print(f"Writing log to {log_path}")
+    with open(log_path, "w") as logfile:
+        logfile.write(f"meteor-qpsk-stream recipe, writing to {working_dir}, capturing freq {frequency}, "
+                      f"duration {duration}\n")
+        logfile.flush()
+        # Left by the interrupted capture
+        with suppress(FileNotFoundError):
+            os.remove(fifo_path)
+        os.mkfifo(fifo_path)
+        try:
+            _capture(sh, logfile, rtl_fm_args, duration, qpsk_path, fifo_path)
+        finally:
+            os.remove(fifo_path)
+
+    return [
+        ("LOG", log_path),
+        ("SIGNAL", qpsk_path)
+    ]
+
+
+def _capture(sh, logfile, rtl_fm_args, duration, qpsk_path, fifo_path):
+    """Demodulate the samples streamed into the FIFO"""
+    with _stage(logfile, "rtl_fm | sox | gain | meteor_demod"):
+        # The demodulator waits for the samples on the FIFO
+        demod = sh.meteor_demod(
+            "-o", qpsk_path,
+            "-B", fifo_path,
+            _out=logfile,
+            _err=logfile,
+            _bg=True,
+            _bg_exc=False
+        )
+        fifo = _open_fifo(fifo_path, demod)
+        if fifo is None:
+            logfile.write("ERROR: meteor_demod didn't open the input\n")
+            if demod.is_alive():
+                demod.kill()
+        else:
+            try:
+                _receive(sh, logfile, rtl_fm_args, duration, fifo)
+            finally:
+                # EOF for the demodulator
+                with suppress(BrokenPipeError):
+                    fifo.close()
+        try:
+            demod.wait()
+        except sh.ErrorReturnCode as e:
+            logfile.write(f"ERROR: meteor_demod failed with exit code {e.exit_code}\n")
+
+
+def _receive(sh, logfile, rtl_fm_args, duration, fifo):
+    """Stream the samples: rtl_fm | sox | running gain into the FIFO, until LOS"""
+    writer = _NormalizingWriter(fifo)
+    start = time.monotonic()
+    with suppress(sh.TimeoutException):
+        try:
+            samples = sh.rtl_fm(
+                *rtl_fm_args,
+                # Output to stdout
+                "-",
+                _timeout=duration.total_seconds(),
+                # rtl_fm flushes the buffers and exits on SIGHUP, so sox gets EOF
+                _timeout_signal=signal.SIGHUP,
+                _err=logfile,
+                _piped=True,
+                # The timeout is reported by the last command of the pipeline
+                _bg_exc=False
+            )
+            sh.sox(
+                *get_sox_raw_args(CHANNELS),
+                # Read from stdin (from pipe)
+                "-",
+                # Type of output - the same raw samples, to stdout
+                "-t", "raw", "-b", 16, "-e", "s", "-c", CHANNELS,
+                "-",
+                # Resampling rate
+                "rate", SAMPLE_RATE,
+                _in=samples,
+                _out=writer,
+                _out_bufsize=CHUNK_SIZE,
+                _err=logfile
+            )
+        except sh.ErrorReturnCode_1 as e:
+            # The rtl_fm command is undocumented wrt to exit codes. It could return 1
+            # in multiple cases in rtlsdr_open().
+            logfile.write(f"ERROR: rtl_fm | sox failed with exit code 1, details: {e}\n")
+    seconds = writer.agc.count / SAMPLE_RATE
+    logfile.write(f"{datetime.now()} received {seconds:.1f} s of signal in {time.monotonic() - start:.1f} s, "
+                  f"final gain {writer.agc.gain or 0.0:.1f}\n")
+    logfile.flush()
+
+
+@set_sh_defaults
+def process(working_dir: str, sh=sh):
+    """Decode the demodulated Meteor QPSK signal into PNG image."""
+    qpsk_path = os.path.join(working_dir, "qpsk")
+    product_path = os.path.join(working_dir, "product.png")
+    log_path = os.path.join(working_dir, "session.log")
+    product_raw_prefix_path = os.path.join(working_dir, "product_raw")
+    product_raw_path = product_raw_prefix_path + ".bmp"
+
+    with open(log_path, "a") as logfile:
+
+        # Decode QPSK into images in one pass (without the intermediate dump)
+        with _stage(logfile, "medet (decode QPSK, generate images)"):
+            sh.medet(qpsk_path, product_raw_prefix_path,
+                     # APID for red
+                     "-r", 66,
+                     # APID for green
+                     "-g", 65,
+                     # APID for blue
+                     "-b", 64,
+                     _out=logfile
+                     )
+
+        # Convert to PNG
+        with _stage(logfile, "convert product"):
+            sh.convert(product_raw_path, product_path, _out=logfile)
+        os.remove(product_raw_path)
+
+        logfile.write(f"{str(datetime.now())} meteor-qpsk-stream recipe complete.\n")
+
+    return [
+        ("PRODUCT", product_path)
+    ]
+
+
+__all__ = ["execute", "capture", "process"]
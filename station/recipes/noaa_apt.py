@@ -1,26 +1,155 @@
 from contextlib import suppress
 from datetime import timedelta
 import os.path
+from typing import Optional
 import signal
 
 import sh
 
-from recipes.helpers import set_sh_defaults
+from recipes.helpers import get_rtl_fm_device_args, set_sh_defaults
+
+RECIPE = {
+    "name": "noaa-apt",
+    "modulations": ["APT"],
+    "binaries": ["rtl_fm", "sox", "noaa-apt"],
+    "cpu": 1.0,
+    # 11025 Hz WAV (the raw samples, if kept, need another 5.8 MB/min)
+    "disk_mb_per_minute": 1.4,
+    "streaming": True,
+    "satellites": ["NOAA"]
+}
+
+
+# Arguments of rtl_fm, the output file (or "-" for stdout) is added at the end
+RTL_FM_ARGS = (
+    # Maximal possible value. Probably is wrong for other SDR then rtl-sdr
+    "-g", 49.6,
+    # Copy-paste from suspects www
+    "-p", 1,
+    # Higher quality downsampling - possible value 0 or 9. 9 is experimental.
+    "-F", 9,
+    # Enable bias-T (disabled)
+    # "-T",
+    # How arctan is computed. We don't test other options.
+    "-A", "fast",
+    # dc blocking filter (?)
+    "-E", "DC"
+)
+
+
+def get_sox_args(sample_rate: int, input_path: str, signal_path: str):
+    """Returns arguments of sox that converts raw samples into audible WAV"""
+    return (
+        # Type of input
+        "-t", "raw",
+        # Sample size in bits
+        "-b16",
+        # Signed integer encoding
+        "-es",
+        "-r", sample_rate,
+        # Number of channels of audio data - 1 - mono
+        "-c1",
+        # Verbosity level (0 - silence, 1 - failure messages, 2 - warnings, 3 - processing phases, 4 - debug)
+        "-V3",
+        # Input path or "-" for stdin (pipe)
+        input_path,
+        # Output path
+        signal_path,
+        # Resampling rate
+        "rate", "11025"
+    )
 
 
 @set_sh_defaults
-def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
+def execute(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh,
+            pipeline: bool = True, keep_raw: bool = False):
+    """Receive and decode NOAA APT signal (capture and process)."""
+    results = capture(working_dir, frequency, duration, device, pipeline=pipeline, keep_raw=keep_raw)
+    return results + process(working_dir)
+
+
+@set_sh_defaults
+def capture(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh,
+            pipeline: bool = True, keep_raw: bool = False):
+    """
+    Receive NOAA APT signal into the WAV file.
+
+    In the pipeline mode (default) the rtl_fm output is streamed through sox
+    (resampling) into the WAV file while the samples arrive, so the signal
+    isn't written to and read from the SD card several times and the product
+    is decoded right after LOS. The raw samples are saved only if keep_raw
+    is set. Otherwise, the raw file is recorded first and converted after LOS.
+    The options are configured in the "recipes" section of the config (see
+    recipes.factory.get_recipe_options).
+    """
     raw_path = os.path.join(working_dir, "signal.raw")
     signal_path = os.path.join(working_dir, "signal.wav")
-    product_path = os.path.join(working_dir, "product.png")
     log_path = os.path.join(working_dir, "session.log")
 
     sample_rate = 48000
+    keep_raw = keep_raw or not pipeline
 
     # Let's log the operations done by the tools to a log file. We need to flush it
     # frequently, because this file stream is also used capture tools output. Without
     # flush, the logging order gets completely messed up.
     logfile = open(log_path, "w")
+
+    # Select the device (index, serial or SoapySDR string) if the station has many receivers
+    device_args = get_rtl_fm_device_args(device)
+
+    if pipeline:
+        receive_pipeline(sh, logfile, frequency, duration, device_args, sample_rate,
+                         raw_path if keep_raw else None, signal_path)
+    else:
+        _receive(sh, logfile, frequency, duration, device_args, sample_rate, raw_path, signal_path)
+    logfile.close()
+
+    return [
+        ("SIGNAL", signal_path),
+        ("LOG", log_path)
+    ] + _raw_result(raw_path, keep_raw)
+
+
+@set_sh_defaults
+def process(working_dir: str, sh=sh):
+    """Decode the captured NOAA APT signal into PNG image."""
+    signal_path = os.path.join(working_dir, "signal.wav")
+    product_path = os.path.join(working_dir, "product.png")
+    log_path = os.path.join(working_dir, "session.log")
+
+    logfile = open(log_path, "a")
+    logfile.write("---noaa-apt log-------\n")
+    logfile.flush()
+
+    # Run noaa_apt - this decodes APT from the audio file into PNG image.
+    try:
+        sh.noaa_apt(
+            "-o", product_path,
+            "--false-color", "--contrast", "telemetry",
+            signal_path,
+            _out=logfile
+        )
+    except sh.ErrorReturnCode_1:
+        # noaa_apt returns 1 when it fails to decode the image. We don't want to fail the whole
+        # observation because of this, so we just log the error and continue.
+        logfile.write("ERROR: noaa_apt failed with exit code 1 (likely failed to decode image).\n")
+        logfile.close()
+        return []
+
+    logfile.flush()
+    logfile.close()
+
+    return [
+        ("PRODUCT", product_path)
+    ]
+
+
+def _raw_result(raw_path: str, keep_raw: bool):
+    return [("RAW", raw_path)] if keep_raw else []
+
+
+def _receive(sh, logfile, frequency, duration, device_args, sample_rate, raw_path, signal_path):
+    """Record raw samples into the file, then convert them into WAV after LOS"""
     logfile.write("---rtl_fm log-------\n")
     logfile.flush()
 
@@ -28,22 +157,12 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
     with suppress(sh.TimeoutException):
         try:
             rtl_proc = sh.rtl_fm(
+                *device_args,
                 # Specify frequency (in Hz, e.g. 137MHz)
                 "-f", frequency,
                 # Specify sampling rate (e.g. 48000 Hz)
                 "-s", sample_rate,
-                # Maximal possible value. Probably is wrong for other SDR then rtl-sdr
-                "-g", 49.6,
-                # Copy-paste from suspects www
-                "-p", 1,
-                # Higher quality downsampling - possible value 0 or 9. 9 is experimental.
-                "-F", 9,
-                # Enable bias-T (disabled)
-                # "-T",
-                # How arctan is computed. We don't test other options.
-                "-A", "fast",
-                # dc blocking filter (?)
-                "-E", "DC",
+                *RTL_FM_ARGS,
                 # Output to pipe, optional in this command
                 raw_path,
                 _timeout=duration.total_seconds(),
@@ -63,54 +182,46 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
     logfile.flush()
 
     # Run sox - this convert raw samples into audible WAV
-    sh.sox(  # Type of input
-        "-t", "raw",
-        # Sample size in bits
-        "-b16",
-        # Signed integer encoding
-        "-es",
-        "-r", sample_rate,
-        # Number of channels of audio data - 1 - mono
-        "-c1",
-        # Verbosity level (0 - silence, 1 - failure messages, 2 - warnings, 3 - processing phases, 4 - debug)
-        "-V3",
-        # Read from the raw file (instead of stdin via pipe)
-        raw_path,
-        # Output path
-        signal_path,
-        # Resampling rate
-        "rate", "11025",
-        _out=logfile
-    )
+    sh.sox(*get_sox_args(sample_rate, raw_path, signal_path), _out=logfile)
     logfile.flush()
 
-    logfile.write("---noaa-apt log-------\n")
+
+def receive_pipeline(sh, logfile, frequency, duration, device_args, sample_rate, raw_path, signal_path):
+    """
+    Stream the samples: rtl_fm | [tee signal.raw |] sox. The WAV file is
+    complete when rtl_fm is stopped at LOS.
+    """
+    logfile.write("---rtl_fm | sox pipeline log-------\n")
     logfile.flush()
 
-    # Run noaa_apt - this decodes APT from the audio file into PNG image.
-    try:
-        sh.noaa_apt(
-            "-o", product_path,
-            "--false-color", "--contrast", "telemetry",
-            signal_path,
-            _out=logfile
-        )
-    except sh.ErrorReturnCode_1:
-        # noaa_apt returns 1 when it fails to decode the image. We don't want to fail the whole
-        # observation because of this, so we just log the error and continue.
-        logfile.write("ERROR: noaa_apt failed with exit code 1 (likely failed to decode image).\n")
-        return [
-            ("PRODUCT", product_path),
-            ("LOG", log_path),
-            ("RAW", raw_path)
-        ]
+    with suppress(sh.TimeoutException):
+        try:
+            samples = sh.rtl_fm(
+                *device_args,
+                # Specify frequency (in Hz, e.g. 137MHz)
+                "-f", frequency,
+                # Specify sampling rate (e.g. 48000 Hz)
+                "-s", sample_rate,
+                *RTL_FM_ARGS,
+                # Output to stdout
+                "-",
+                _timeout=duration.total_seconds(),
+                # rtl_fm flushes the buffers and exits on SIGHUP, so sox gets EOF
+                _timeout_signal=signal.SIGHUP,
+                # rtl_fm and rx_fm both print messages on stderr
+                _err=logfile,
+                _piped=True,
+                # The timeout is reported by the last command of the pipeline
+                _bg_exc=False
+            )
+            if raw_path is not None:
+                # Save the raw samples on the way
+                samples = sh.tee(raw_path, _in=samples, _piped=True, _bg_exc=False)
 
-    logfile.flush()
-    logfile.close()
+            # Run sox - this converts raw samples from stdin into audible WAV as they arrive
+            sh.sox(*get_sox_args(sample_rate, "-", signal_path), _in=samples, _out=logfile, _err=logfile)
 
-    return [
-        ("SIGNAL", signal_path),
-        ("PRODUCT", product_path),
-        ("LOG", log_path),
-        ("RAW", raw_path)
-    ]
+        except sh.ErrorReturnCode_1 as e:
+            # See _receive, rtl_fm may return 1 in multiple cases in rtlsdr_open().
+            logfile.write(f"ERROR: rtl_fm | sox failed with exit code 1, details: {e}\n")
+    logfile.flush()
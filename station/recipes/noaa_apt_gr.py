@@ -3,15 +3,27 @@
 from contextlib import suppress
 from datetime import timedelta
 import os.path
+from typing import Optional
 import signal
 import waterfall
 import sh
 
-from recipes.helpers import set_sh_defaults
+from recipes.helpers import get_soapy_device, set_sh_defaults
+
+RECIPE = {
+    "name": "noaa-apt-gr",
+    "modulations": ["APT"],
+    "binaries": ["satnogs_noaa_apt_decoder"],
+    # GNU Radio flowgraph at 3 MS/s
+    "cpu": 2.0,
+    # WAV and waterfall data
+    "disk_mb_per_minute": 5.0,
+    "streaming": True
+}
 
 
 @set_sh_defaults
-def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
+def execute(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh):
 
     signal_path = os.path.join(working_dir, "signal.wav")
     product_path = os.path.join(working_dir, "product.png")
@@ -26,7 +38,9 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
     #  --samp-rate-rx=3000000 --antenna RX --gain 45 --bw 41000
 
     # TODO: Some of those parameters should be configurable.
-    soapy_rx_device = "driver=airspy,bias=1"
+    # The station may have many receivers, the device is rtl-sdr index or serial or SoapySDR
+    # device string (e.g. "driver=rtlsdr,serial=00000002")
+    soapy_rx_device = get_soapy_device(device, "driver=airspy,bias=1")
     sample_rate_rx = 3000000  # number of samples per second
     gain = 45  # 45 is max for airspy, rtlsdr can go up to 49.6
     bandwidth = 36000  # specify the received bandwidth in Hz
@@ -44,39 +58,51 @@ def execute(working_dir: str, frequency: str, duration: timedelta, sh=sh):
 
     waterfall_dat = waterfall_path + ".dat"
 
-    # Run rtl_fm/rx_fm - this records the actual samples from the RTL device
+    # Run the flowgraph in the background - this records the actual samples from the device
+    # and writes the waterfall data while the pass is in progress.
+    process = sh.satnogs_noaa_apt_decoder(
+        # specify the device used for reception (driver=rtlsdr or driver=airspy works)
+        "--soapy-rx-device", soapy_rx_device,
+        # the receiving frequency
+        "--rx-freq", frequency,
+        # specify the gain
+        "--gain", gain,
+        # number of samples/s
+        "--samp-rate-rx", sample_rate_rx,
+        # How arctan is computed. We don't test other options.
+        "--bw", bandwidth,
+        # now set up the files
+        "--decoded-data-file-path", product_path,
+        "--waterfall-file-path", waterfall_dat,
+        "--file-path", signal_path,
+        _timeout=duration.total_seconds(),
+        _timeout_signal=signal.SIGTERM,
+
+        # rtl_fm and rx_fm both print messages on stderr
+        _err=logfile,
+        _bg=True,
+        # The exit code (and the timeout) is checked by wait()
+        _bg_exc=False
+    )
+
+    # The raw waterfall data is reasonably big (30M or so). It is read and
+    # downsampled during the reception and the partial PNG is updated
+    # periodically, so the operator can check the signal mid-pass and the
+    # final image is ready at LOS.
+    logfile.write("Following waterfall data: %s, writing %s\n" % (waterfall_dat, waterfall_path))
+    logfile.flush()
+    live = waterfall.LiveWaterfall()
+    live.follow(waterfall_dat, process.is_alive, waterfall_path)
     with suppress(sh.TimeoutException):
-        sh.satnogs_noaa_apt_decoder(
-            # specify the device used for reception (driver=rtlsdr or driver=airspy works)
-            "--soapy-rx-device", soapy_rx_device,
-            # the receiving frequency
-            "--rx-freq", frequency,
-            # specify the gain
-            "--gain", gain,
-            # number of samples/s
-            "--samp-rate-rx", sample_rate_rx,
-            # How arctan is computed. We don't test other options.
-            "--bw", bandwidth,
-            # now set up the files
-            "--decoded-data-file-path", product_path,
-            "--waterfall-file-path", waterfall_dat,
-            "--file-path", signal_path,
-            _timeout=duration.total_seconds(),
-            _timeout_signal=signal.SIGTERM,
-
-            # rtl_fm and rx_fm both print messages on stderr
-            _err=logfile
-        )
+        process.wait()
     logfile.flush()
 
-    # The GNU Radio pipeline generated raw waterfall data, which is reasonably big (30M or so).
-    # We want to convert it into easily browseable PNG file.
-    logfile.write("Converting waterfall data: %s to %s" % (waterfall_dat, waterfall_path))
-    w = waterfall.Waterfall(waterfall_dat)
-    w.plot(waterfall_path)
+    if live.nint != 0:
+        live.plot(waterfall_path)
 
     # Remove raw waterfall data, we don't need it.
-    os.remove(waterfall_dat)
+    with suppress(FileNotFoundError):
+        os.remove(waterfall_dat)
 
     logfile.close()
 
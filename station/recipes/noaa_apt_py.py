@@ -0,0 +1,60 @@
+# This is a recipe for NOAA APT signal decoding without external decoder.
+# The signal is captured the same way as in the noaa-apt recipe (rtl_fm | sox)
+# and decoded with the NumPy decoder (apt.py).
+
+from datetime import datetime, timedelta
+import os.path
+from typing import Optional
+
+import sh
+
+import apt
+from recipes.helpers import set_sh_defaults
+from recipes.noaa_apt import capture
+from utils.png import write_png
+
+RECIPE = {
+    "name": "noaa-apt-py",
+    "modulations": ["APT"],
+    "binaries": ["rtl_fm", "sox"],
+    "cpu": 1.0,
+    "disk_mb_per_minute": 1.4,
+    "streaming": True
+}
+
+
+@set_sh_defaults
+def execute(working_dir: str, frequency: str, duration: timedelta, device: Optional[str] = None, sh=sh,
+            **options):
+    """
+    Receive and decode NOAA APT signal (capture and process). The options
+    (e.g. pipeline, keep_raw) are passed to the capture (see
+    recipes.noaa_apt.capture).
+    """
+    return capture(working_dir, frequency, duration, device, **options) + process(working_dir)
+
+
+@set_sh_defaults
+def process(working_dir: str, sh=sh):
+    """Decode the captured NOAA APT signal into PNG image."""
+    signal_path = os.path.join(working_dir, "signal.wav")
+    product_path = os.path.join(working_dir, "product.png")
+    log_path = os.path.join(working_dir, "session.log")
+
+    with open(log_path, "a") as logfile:
+        logfile.write(f"---apt.py decoder log-------\n{datetime.now()} decoding {signal_path}\n")
+        logfile.flush()
+        image = apt.decode_wav(signal_path)
+        logfile.write(f"{datetime.now()} decoded {image.shape[0]} lines\n")
+        if image.shape[0] == 0:
+            logfile.write("ERROR: the signal is too short to decode any line.\n")
+            return []
+
+        write_png(product_path, image)
+
+    return [
+        ("PRODUCT", product_path)
+    ]
+
+
+__all__ = ["execute", "capture", "process"]
@@ -1,16 +1,21 @@
+from bisect import bisect_left, bisect_right
 from collections import namedtuple
-from typing import Any, Iterable, List, Optional, Sequence, Tuple, TypeVar, Callable, Hashable
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar, Callable, Hashable
 
 from datetimerange import DateTimeRange
-from orbit_predictor.predictors import PredictedPass
+
+if TYPE_CHECKING:
+    # Only for annotations, orbit_predictor (with numpy) is slow to import
+    from orbit_predictor.predictors import PredictedPass
 
 T = TypeVar('T')
-Observation = namedtuple("Entry", ("data", "pass_", "range"))
-Strategy = Callable[[Sequence[Tuple[T, PredictedPass]]], Sequence[Observation]]
-Selector = Callable[[T, PredictedPass, Optional[DateTimeRange], Optional[DateTimeRange]], Optional[DateTimeRange]]
+Observation = namedtuple("Entry", ("data", "pass_", "range", "device"), defaults=(None,))
+Strategy = Callable[[Sequence[Tuple[T, "PredictedPass"]]], Sequence[Observation]]
+Selector = Callable[[T, "PredictedPass", Optional[DateTimeRange], Optional[DateTimeRange]], Optional[DateTimeRange]]
+Weight = Callable[[T, "PredictedPass", DateTimeRange], float]
 
 
-def _to_observations(data: Iterable[Tuple[T, PredictedPass]]) -> List[Observation]:
+def _to_observations(data: Iterable[Tuple[T, "PredictedPass"]]) -> List[Observation]:
     entries: List[Observation] = []
     for obj, pass_ in data:
         range_ = DateTimeRange(pass_.aos, pass_.los)
@@ -22,7 +27,7 @@ def _to_observations(data: Iterable[Tuple[T, PredictedPass]]) -> List[Observatio
 def create_strategy(sort_key: Callable[[Observation], Hashable],
                     selector: Selector,
                     min_seconds=1) -> Strategy:
-    def strategy(data: Iterable[Tuple[T, PredictedPass]]) -> Sequence[Observation]:
+    def strategy(data: Iterable[Tuple[T, "PredictedPass"]]) -> Sequence[Observation]:
         entries = _to_observations(data)
 
         entries.sort(key=sort_key)  # type: ignore
@@ -59,10 +64,124 @@ def create_strategy(sort_key: Callable[[Observation], Hashable],
     return strategy
 
 
-aos_priority_strategy = create_strategy(lambda o: o.pass_.aos, lambda _d, _p, _lr, rr: rr)
+class _Timeline:
+    """
+    Observations selected for single receiver. They never overlap (they
+    may only touch each other), so the arrays of start and end offsets
+    (in seconds) are both sorted.
+    """
+
+    def __init__(self):
+        self.starts: List[float] = []
+        self.ends: List[float] = []
+        # Position of the observation in the result (selection order)
+        self.orders: List[int] = []
+
+    def intersecting(self, start: float, end: float) -> List[int]:
+        """Returns positions (in selection order) of the observations which may intersect the range."""
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end)
+        return sorted(self.orders[first:last])
+
+    def insert(self, start: float, end: float, order: int):
+        position = bisect_right(self.starts, start)
+        while position > 0 and self.starts[position - 1] == start and self.ends[position - 1] > end:
+            position -= 1
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.orders.insert(position, order)
+
+
+def create_interval_strategy(sort_key: Callable[[Observation], Hashable],
+                             selector: Selector,
+                             min_seconds=1,
+                             devices: Sequence[Optional[str]] = (None,)) -> Strategy:
+    """
+    Creates the strategy with the same results as create_strategy, but the
+    entries are processed only once, in the sort_key order. The selected
+    observations are kept in sorted arrays of float timestamps, so the ones
+    intersecting the entry are found by binary search. The total cost is
+    O(n log n) instead of O(n^2) for typical pass sets.
+
+    The selector must return one of the passed ranges (or None). Then the
+    selected observations never overlap (they may only touch each other)
+    and the sorted arrays stay sorted by start and by end.
+
+    The observations are scheduled onto parallel receivers (devices). The
+    entry is assigned to the receiver on which it stays untrimmed, or
+    else to the one on which it keeps the longest range. With a single
+    receiver the result is the same as of create_strategy.
+    """
+    def strategy(data: Iterable[Tuple[T, "PredictedPass"]]) -> Sequence[Observation]:
+        entries = _to_observations(data)
+
+        entries.sort(key=sort_key)  # type: ignore
+        if len(entries) == 0:
+            return []
+
+        reference = entries[0].range.start_datetime
+
+        def seconds(date):
+            return (date - reference).total_seconds()
+
+        timelines = [_Timeline() for _ in devices]
+        result: List[Observation] = []
+
+        def trim(entry: Observation, timeline: _Timeline):
+            """Returns the range of entry trimmed by the observations from timeline or None if it is dropped."""
+            start, end = entry.range.start_datetime, entry.range.end_datetime
+            # Trimming only shrinks the range, so only the observations
+            # which intersect the initial range may affect the entry.
+            for top in timeline.intersecting(seconds(start), seconds(end)):
+                top_start, top_end = result[top].range.start_datetime, result[top].range.end_datetime
+                if top_start > end or start > top_end:
+                    continue
+                left_range = DateTimeRange(start, top_start) if start <= top_start else None
+                right_range = DateTimeRange(top_end, end) if top_end <= end else None
+                selected_range = None
+                if left_range is not None or right_range is not None:
+                    selected_range = selector(entry.data, entry.pass_, left_range, right_range)
+                if selected_range is None:
+                    return None
+                start, end = selected_range.start_datetime, selected_range.end_datetime
+                if start > end:
+                    raise ValueError("Daterange is invalid")
+            return start, end
+
+        for entry in entries:
+            # The device with the longest trimmed range
+            best_device: Optional[int] = None
+            best_start = best_end = entry.range.start_datetime
+            for device, timeline in enumerate(timelines):
+                trimmed = trim(entry, timeline)
+                if trimmed is None:
+                    continue
+                start, end = trimmed
+                if best_device is None or end - start > best_end - best_start:
+                    best_device, best_start, best_end = device, start, end
+                if trimmed == (entry.range.start_datetime, entry.range.end_datetime):
+                    break
+
+            if best_device is None:
+                continue
+            device, start, end = best_device, best_start, best_end
+            # The first entry is always selected, as in create_strategy
+            if len(result) != 0 and (end - start).total_seconds() < min_seconds:
+                continue
+
+            entry.range.set_start_datetime(start)
+            entry.range.set_end_datetime(end)
+            timelines[device].insert(seconds(start), seconds(end), len(result))
+            result.append(entry._replace(device=devices[device]))
+        return result
+    return strategy
+
+
+aos_priority_strategy = create_interval_strategy(lambda o: o.pass_.aos, lambda _d, _p, _lr, rr: rr)
 
 
-def max_elevation_selector(_: Any, pass_: PredictedPass, left_range: Optional[DateTimeRange], right_range: Optional[DateTimeRange]) -> Optional[DateTimeRange]:
+def max_elevation_selector(_: Any, pass_: "PredictedPass",
+                           left_range: Optional[DateTimeRange], right_range: Optional[DateTimeRange]) -> Optional[DateTimeRange]:
     """
     This selection strategy selects the passes that have highest elevation during TCA.
     """
@@ -73,12 +192,139 @@ def max_elevation_selector(_: Any, pass_: PredictedPass, left_range: Optional[Da
     return None
 
 
-max_elevation_strategy = create_strategy(lambda o: -o.pass_.max_elevation_deg, max_elevation_selector)
+max_elevation_strategy = create_interval_strategy(lambda o: -o.pass_.max_elevation_deg, max_elevation_selector)
 
 
-def strategy_factory(name: str):
+def elevation_weight(_: Any, pass_: "PredictedPass", range_: DateTimeRange) -> float:
+    """
+    Weight of the observation is the max elevation of the pass. The observation
+    trimmed so that it doesn't contain the TCA is worthless.
+    """
+    if pass_.max_elevation_date in range_:
+        return pass_.max_elevation_deg
+    return 0.0
+
+
+def duration_weight(_: Any, __: "PredictedPass", range_: DateTimeRange) -> float:
+    """Weight of the observation is its duration in seconds."""
+    return range_.get_timedelta_second()
+
+
+def create_optimal_strategy(weight: Weight, min_seconds=1, devices: Sequence[Optional[str]] = (None,)) -> Strategy:
+    """
+    Creates the strategy which selects the observations with the maximal
+    total weight (weighted interval scheduling). The passes are sorted by LOS
+    and the best total weight of the first i passes is computed by dynamic
+    programming. Each pass is taken in full (after the last pass ending
+    before its AOS) or trimmed to start at the LOS of one of the passes
+    ending during it.
+
+    The predecessors are found by binary search. The number of trimmed
+    variants of the pass is limited by the number of passes in progress at
+    the same time, so the total cost is O(n log n) for any realistic
+    set of satellites.
+
+    For multiple receivers (devices) the schedule is computed for each one
+    in turn, from the passes not used by the previous receivers.
+    """
+    def select(entries: List[Observation]) -> List[Observation]:
+        if len(entries) == 0:
+            return []
+
+        entries = sorted(entries, key=lambda o: o.range.end_datetime)
+        reference = entries[0].range.start_datetime
+
+        def seconds(date):
+            return (date - reference).total_seconds()
+
+        starts = [seconds(e.range.start_datetime) for e in entries]
+        ends = [seconds(e.range.end_datetime) for e in entries]
+
+        # best[i] - the max total weight of the first i entries
+        best = [0.0] * (len(entries) + 1)
+        # choices[i] - (start, count of preceding entries) if the entry i-1 is taken
+        choices: List[Optional[Tuple[Any, int]]] = [None] * (len(entries) + 1)
+        for idx, entry in enumerate(entries, start=1):
+            best[idx] = best[idx - 1]
+            start, end = starts[idx - 1], ends[idx - 1]
+
+            # Full pass. Observations may touch each other.
+            predecessors = bisect_right(ends, start, 0, idx - 1)
+            candidates = [(entry.range.start_datetime, predecessors)]
+            # Trimmed pass, starts when one of the passes in progress ends.
+            for other in range(predecessors, idx - 1):
+                if end - ends[other] < min_seconds:
+                    break
+                if other + 1 < idx - 1 and ends[other + 1] == ends[other]:
+                    continue
+                candidates.append((entries[other].range.end_datetime, other + 1))
+
+            for candidate_start, predecessors in candidates:
+                value = weight(entry.data, entry.pass_, DateTimeRange(candidate_start, entry.range.end_datetime))
+                value += best[predecessors]
+                if value > best[idx]:
+                    best[idx] = value
+                    choices[idx] = (candidate_start, predecessors)
+
+        result: List[Observation] = []
+        idx = len(entries)
+        while idx > 0:
+            choice = choices[idx]
+            if choice is None:
+                idx -= 1
+                continue
+            entry = entries[idx - 1]
+            start, idx = choice
+            entry.range.set_start_datetime(start)
+            result.append(entry)
+        result.reverse()
+        return result
+
+    def strategy(data: Iterable[Tuple[T, "PredictedPass"]]) -> Sequence[Observation]:
+        entries = [e for e in _to_observations(data) if e.range.get_timedelta_second() >= min_seconds]
+        result: List[Observation] = []
+        for device in devices:
+            selected = select(entries)
+            result += [e._replace(device=device) for e in selected]
+            used = set(id(e) for e in selected)
+            entries = [e for e in entries if id(e) not in used]
+        result.sort(key=lambda o: o.range.start_datetime)
+        return result
+    return strategy
+
+
+def with_priorities(weight: Weight, priorities: Dict[Any, float]) -> Weight:
+    """Multiplies the weight by the priority of the observation data (satellite name). Default priority is 1."""
+    def prioritized_weight(data: Any, pass_: "PredictedPass", range_: DateTimeRange) -> float:
+        return priorities.get(data, 1.0) * weight(data, pass_, range_)
+    return prioritized_weight
+
+
+def weight_factory(name: str) -> Weight:
+    if name == "elevation":
+        return elevation_weight
+    if name == "duration":
+        return duration_weight
+    raise LookupError("Unknown weight")
+
+
+def strategy_factory(name: str, weight: str = "elevation", priorities: Optional[Dict[Any, float]] = None,
+                     devices: Sequence[Optional[str]] = (None,)):
+    """
+    Returns the strategy by name. The observations are scheduled onto the
+    devices (receivers working in parallel), by default onto a single one.
+    """
     if name == "aos":
-        return aos_priority_strategy
+        if len(devices) == 1:
+            return aos_priority_strategy
+        return create_interval_strategy(lambda o: o.pass_.aos, lambda _d, _p, _lr, rr: rr, devices=devices)
     if name == "max-elevation":
-        return max_elevation_strategy
+        if len(devices) == 1:
+            return max_elevation_strategy
+        return create_interval_strategy(lambda o: -o.pass_.max_elevation_deg, max_elevation_selector, devices=devices)
+    if name == "optimal":
+        weight_func = weight_factory(weight)
+        if priorities:
+            weight_func = with_priorities(weight_func, priorities)
+        return create_optimal_strategy(weight_func, devices=devices)
     raise LookupError("Unknown strategy")
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import datetime
 import os
-import requests
+import uuid
 import sys
 import logging
 import json
@@ -10,19 +10,22 @@ import json
 if __name__ == '__main__':
     logging.basicConfig(stream=sys.stdout, format="%(levelname)s %(asctime)s - %(message)s", level=logging.DEBUG)
 
-from typing import Any, Dict, List, Optional
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 
 from utils.configuration import open_config
 from utils.dates import from_iso_format
 from hmac_token import get_authorization_header_value
-from orbitdb import OrbitDatabase
 
-config = open_config()
-section = config["server"]
-station_id = str(section["id"])
-secret = bytearray.fromhex(section["secret"])
-url = section["url"]
+# Size of the chunks of the uploaded files
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def get_server() -> Tuple[str, bytearray, str]:
+    """Returns station id, secret and URL of the content server from the config."""
+    section = open_config()["server"]
+    return str(section["id"]), bytearray.fromhex(section["secret"]), section["url"]
 
 
 @dataclass
@@ -57,6 +60,8 @@ class SubmitRequestData:
 
 
 def get_tle(sat_name: str, date: datetime.datetime) -> Optional[List[str]]:
+    # Loaded on demand, it depends on the heavy orbit_predictor
+    from orbitdb import OrbitDatabase
     try:
         db = OrbitDatabase()
         return db.get_tle(sat_name, date)
@@ -97,6 +102,80 @@ def get_mime_type(filename: str) -> str:
     return known_types.get(ext, "application/octet-stream")
 
 
+def _quote(value: str) -> str:
+    '''Escape the parameter of Content-Disposition header (as browsers do)'''
+    return value.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+class MultipartBody:
+    '''
+    multipart/form-data body of the request, streamed from the files.
+
+    The body is generated in chunks when iterated, so the memory usage
+    doesn't depend on the size of the files. The length is known in advance
+    (from the sizes of the files), so the request is sent with the
+    Content-Length header instead of the chunked transfer encoding, which
+    some WSGI servers don't support. The body can be iterated many times
+    (e.g. on redirect).
+
+    Parameters
+    ==========
+    fields: iterable of (str, value)
+        Form fields. The value is converted to string, lists are sent as
+        repeated fields and None values are skipped (as in requests).
+    files: iterable of (str, str)
+        Form keys and paths of the files
+    '''
+
+    def __init__(self, fields: Iterable[Tuple[str, Any]], files: Iterable[Tuple[str, str]],
+                 chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self._fields: List[bytes] = []
+        for key, value in fields:
+            for v in (value if isinstance(value, (list, tuple)) else [value]):
+                if v is None:
+                    continue
+                if not isinstance(v, bytes):
+                    v = str(v).encode()
+                self._fields.append(self._get_part_header(key) + v + b"\r\n")
+        self._files: List[Tuple[bytes, str, int]] = []
+        for key, path in files:
+            filename = os.path.basename(path)
+            header = self._get_part_header(key, filename, get_mime_type(filename))
+            self._files.append((header, path, os.path.getsize(path)))
+        self._end = ("--%s--\r\n" % (self.boundary,)).encode()
+
+    def _get_part_header(self, key: str, filename: Optional[str] = None,
+                         content_type: Optional[str] = None) -> bytes:
+        disposition = 'form-data; name="%s"' % (_quote(key),)
+        lines = ["--" + self.boundary]
+        if filename is None:
+            lines.append("Content-Disposition: " + disposition)
+        else:
+            lines.append('Content-Disposition: %s; filename="%s"' % (disposition, _quote(filename)))
+            lines.append("Content-Type: " + content_type)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+    @property
+    def content_type(self) -> str:
+        return "multipart/form-data; boundary=" + self.boundary
+
+    def __len__(self) -> int:
+        return sum(len(f) for f in self._fields) \
+            + sum(len(header) + size + 2 for header, _, size in self._files) \
+            + len(self._end)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._fields
+        for header, path, _ in self._files:
+            yield header
+            with open(path, "rb") as f:
+                yield from iter(lambda: f.read(self.chunk_size), b"")
+            yield b"\r\n"
+        yield self._end
+
+
 def submit_observation(data: SubmitRequestData):
     '''
     Attempts to submit the observation to the content server.
@@ -108,6 +187,10 @@ def submit_observation(data: SubmitRequestData):
     return:
         dict with an extended status (successful, observation id, extra details etc.)
     '''
+    # Loaded on demand, importing requests takes noticeable time on slow devices
+    import requests
+    station_id, secret, url = get_server()
+
     form_data = {
         "aos": data.aos.isoformat(),
         "tca": data.tca.isoformat(),
@@ -121,31 +204,21 @@ def submit_observation(data: SubmitRequestData):
     if tle is not None:
         form_data["tle"] = tle
 
-    # Now process the files
-    files = {}
-    cnt = 0
-    body: Dict[str, Any] = {
-    }
-    for path in data.image_path:
-        _, filename = os.path.split(path)
-
-        # If there's only one file, it will use "file" key. The second file will be "file1",
-        # third "file2" etc.
-        file_key = "file" if cnt == 0 else f"file{cnt}"
-
-        file_obj = open(path, 'rb')
-        body[file_key] = file_obj
-
-        files[file_key] = (filename, file_obj, get_mime_type(filename), {})
-        cnt = cnt + 1
-
-    body.update(form_data)
+    # If there's only one file, it will use "file" key. The second file will be "file1",
+    # third "file2" etc.
+    files = [("file" if cnt == 0 else f"file{cnt}", path) for cnt, path in enumerate(data.image_path)]
 
-    header_value = get_authorization_header_value(station_id,
-                                                  secret, body, datetime.datetime.utcnow())
+    # The files are hashed in chunks, they aren't loaded into memory
+    with ExitStack() as stack:
+        body: Dict[str, Any] = {key: stack.enter_context(open(path, "rb")) for key, path in files}
+        body.update(form_data)
+        header_value = get_authorization_header_value(station_id,
+                                                      secret, body, datetime.datetime.utcnow())
 
+    multipart = MultipartBody(form_data.items(), files)
     headers = {
-        "Authorization": header_value
+        "Authorization": header_value,
+        "Content-Type": multipart.content_type
     }
 
     # Check if notes are a valid JSON
@@ -154,7 +227,7 @@ def submit_observation(data: SubmitRequestData):
     logging.info(f"Submitting observation, url={url}, file(s)={data.image_path}")
 
     try:
-        resp = requests.post(url, form_data, headers=headers, files=files)
+        resp = requests.post(url, data=multipart, headers=headers)
     except requests.exceptions.ConnectionError:
         return {
             "status-code": 0,
@@ -0,0 +1,186 @@
+import os.path
+import tempfile
+from shutil import rmtree
+import unittest
+import wave
+
+import numpy as np
+
+import apt
+from quality_ratings.apt_signal import SignalRating, is_empty, rate_signal
+
+SYNC_B = np.array([1, 1, 1, 0, 0] * 7 + [0] * 4, dtype=np.float64)
+
+
+def get_apt_words(image_a, image_b):
+    """Returns the APT lines (words 0-255) with the sync, space and telemetry around the images (909 words wide)"""
+    words = np.zeros((image_a.shape[0], apt.LINE_WORDS))
+    words[:, 0:39] = apt.SYNC_A * 255
+    words[:, 86:995] = image_a
+    words[:, 995:1040] = 128
+    words[:, 1040:1079] = SYNC_B * 255
+    words[:, 1079:1126] = 255
+    words[:, 1126:2035] = image_b
+    words[:, 2035:2080] = 64
+    return words
+
+
+def modulate(words, sample_rate=11025, lead_s=0.0, noise=0.0):
+    """AM modulated 2400 Hz subcarrier, preceded by lead_s seconds of noise"""
+    rng = np.random.default_rng(0)
+    flat = words.ravel()
+    t = np.arange(int(flat.size * sample_rate / apt.WORD_RATE)) / sample_rate
+    amplitude = 0.1 + 0.9 * flat[np.minimum((t * apt.WORD_RATE).astype(int), flat.size - 1)] / 255.0
+    signal = amplitude * np.sin(2 * np.pi * 2400 * t) + rng.normal(0, noise, size=t.size)
+    lead = rng.normal(0, 0.3, size=int(lead_s * sample_rate))
+    return np.concatenate([lead, signal])
+
+
+class TestAPT(unittest.TestCase):
+    def setUp(self):
+        lines = 40
+        self.image_a = np.tile(np.linspace(0, 255, 909), (lines, 1))
+        # Vertical stripes, wide enough to pass the filters
+        self.image_b = np.tile(np.repeat(np.arange(909) // 16 % 2 * 255.0, 1), (lines, 1))
+        self.signal = modulate(get_apt_words(self.image_a, self.image_b), lead_s=1.3, noise=0.05)
+
+    def decode(self, chunks):
+        decoder = apt.APTDecoder(11025)
+        for chunk in np.array_split(self.signal, chunks):
+            decoder.process(chunk)
+        return decoder.finish(), decoder.assembler.synchronized
+
+    def test_decode(self):
+        image, synchronized = self.decode(50)
+
+        self.assertEqual(image.dtype, np.uint8)
+        self.assertEqual(image.shape[1], apt.LINE_WORDS)
+        self.assertGreaterEqual(synchronized, 39)
+        # The lines with signal start with the sync A
+        lines = image[-40:-1]
+        sync = lines[:, 0:39].mean(axis=0)
+        self.assertGreater(np.corrcoef(sync, apt.SYNC_A)[0, 1], 0.9)
+        for decoded, expected in ((lines[:, 96:985], self.image_a[1:, 10:-10]), (lines[:, 1136:2025], self.image_b[1:, 10:-10])):
+            self.assertGreater(np.corrcoef(decoded.ravel(), expected.ravel())[0, 1], 0.95)
+
+    def test_chunks(self):
+        whole, _ = self.decode(1)
+        chunked, _ = self.decode(333)
+        # The chunks differ only by the context of the Hilbert transform
+        self.assertEqual(whole.shape, chunked.shape)
+        self.assertLessEqual(np.max(np.abs(whole[-39:].astype(int) - chunked[-39:])), 1)
+
+    def test_resampler(self):
+        sample_rate = 11025
+        t = np.arange(2 * sample_rate) / sample_rate
+        resampler = apt.Resampler(sample_rate, apt.WORD_RATE)
+        output = np.concatenate([resampler.process(chunk) for chunk in np.array_split(np.sin(2 * np.pi * 500 * t), 37)])
+
+        self.assertEqual(output.size, 2 * apt.WORD_RATE)
+        # The filter delays the signal by half of its length
+        delay = (resampler.taps * resampler.up - 1) / 2.0 / resampler.up / sample_rate
+        expected = np.sin(2 * np.pi * 500 * (np.arange(output.size) / apt.WORD_RATE - delay))
+        np.testing.assert_allclose(output[100:], expected[100:], atol=1e-3)
+
+    def test_envelope(self):
+        t = np.arange(20000) / 11025
+        amplitude = 1.0 + 0.5 * np.sin(2 * np.pi * 3 * t)
+        detector = apt.EnvelopeDetector()
+        envelope = np.concatenate([detector.process(chunk) for chunk in np.array_split(amplitude * np.sin(2 * np.pi * 2400 * t), 7)] +
+                                  [detector.flush()])
+
+        self.assertEqual(envelope.size, t.size)
+        np.testing.assert_allclose(envelope[500:-500], amplitude[500:-500], atol=0.01)
+
+    def test_decode_wav(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "signal.wav")
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(11025)
+                f.writeframes((self.signal * 10000).astype('<i2').tobytes())
+
+            image = apt.decode_wav(path)
+            expected, _ = self.decode(1)
+            self.assertEqual(image.shape, expected.shape)
+            self.assertLessEqual(np.max(np.abs(image.astype(int) - expected)), 2)
+        finally:
+            rmtree(directory, ignore_errors=True)
+
+    def test_read_8bit_wav(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "signal.wav")
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(1)
+                f.setframerate(11025)
+                f.writeframes(bytes([0, 128, 255]))
+
+            sample_rate, chunks = apt.read_wav(path)
+            self.assertEqual(sample_rate, 11025)
+            # Signed as the 16-bit samples
+            np.testing.assert_array_equal(np.concatenate(list(chunks)), [-128, 0, 127])
+        finally:
+            rmtree(directory, ignore_errors=True)
+
+
+class TestSignalRating(unittest.TestCase):
+    def setUp(self):
+        lines = 30
+        image = np.tile(np.linspace(0, 255, 909), (lines, 1))
+        self.signal = modulate(get_apt_words(image, image[:, ::-1]), lead_s=2.0, noise=0.3)
+        self.noise = np.random.default_rng(1).normal(0, 0.3, self.signal.size)
+
+    def rate(self, signal, **kwargs):
+        rating = SignalRating(11025, **kwargs)
+        for chunk in np.array_split(signal, 17):
+            rating.process(chunk)
+        return rating.result()
+
+    def test_signal(self):
+        metrics = self.rate(self.signal)
+
+        self.assertAlmostEqual(metrics["duration_s"], self.signal.size / 11025)
+        self.assertGreater(metrics["carrier_snr_db"], 15)
+        self.assertGreater(metrics["active_ratio"], 0.8)
+        self.assertGreater(metrics["subcarrier_ratio"], 0.5)
+        self.assertGreater(metrics["sync_ratio"], 0.8)
+        self.assertFalse(is_empty(metrics))
+
+    def test_noise(self):
+        metrics = self.rate(self.noise)
+
+        self.assertLess(metrics["carrier_snr_db"], 5)
+        self.assertEqual(metrics["active_ratio"], 0)
+        self.assertLess(metrics["sync_ratio"], 0.05)
+        self.assertTrue(is_empty(metrics))
+
+    def test_without_sync(self):
+        metrics = self.rate(self.noise, sync=False)
+        self.assertIsNone(metrics["sync_ratio"])
+        self.assertTrue(is_empty(metrics))
+
+    def test_short_signal(self):
+        metrics = self.rate(self.noise[:5000])
+        self.assertIsNone(metrics["active_ratio"])
+        self.assertFalse(is_empty(metrics))
+
+    def test_low_sample_rate(self):
+        with self.assertRaises(ValueError):
+            SignalRating(8000)
+
+    def test_rate_wav(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "signal.wav")
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(11025)
+                f.writeframes((self.noise * 10000).astype('<i2').tobytes())
+            self.assertTrue(is_empty(rate_signal(path)))
+        finally:
+            rmtree(directory, ignore_errors=True)
@@ -0,0 +1,114 @@
+import asyncio
+import datetime
+from os import makedirs, environ
+import os.path
+from shutil import copy, rmtree
+import threading
+import time
+import unittest
+
+# It must be set before import "utils"
+environ["SVAROG_CONFIG_DIR"] = "tests/config"
+
+from datetimerange import DateTimeRange  # noqa: E402
+
+from utils.globalvars import CONFIG_DIRECTORY  # noqa: E402
+
+tle_filename = "https___celestrak.org_NORAD_elements_gp.php_GROUP_noaa_FORMAT_tle"
+# The TLEs in the test file are from the beginning of April 2020
+start = datetime.datetime(2020, 4, 3, 12, 0, 0)
+
+# The planner reads the config on import
+makedirs(CONFIG_DIRECTORY, exist_ok=True)
+copy("tests/config.yml", CONFIG_DIRECTORY)
+from daemon import StationDaemon, MAX_SLEEP_S  # noqa: E402
+from selectstrategy import Observation  # noqa: E402
+
+
+class TestStationDaemon(unittest.TestCase):
+    def setUp(self):
+        makedirs(CONFIG_DIRECTORY, exist_ok=True)
+        copy("tests/config.yml", CONFIG_DIRECTORY)
+        copy(os.path.join("tests", tle_filename), os.path.join(CONFIG_DIRECTORY, tle_filename))
+        self.received = []
+        self.drained = []
+        self.daemon = StationDaemon(interval_s=6 * 60 * 60, horizon_s=12 * 60 * 60,
+                                    receive=lambda *args: self.received.append(args),
+                                    drain=self.drained.append)
+
+    def tearDown(self):
+        rmtree(CONFIG_DIRECTORY, ignore_errors=True)
+
+    def test_replanning(self):
+        first = self.daemon.plan(start)
+        self.assertGreater(len(first), 0)
+        self.assertEqual(self.daemon.next_planning, start + datetime.timedelta(hours=6))
+        last_los = max(o.range.end_datetime for o in first)
+
+        second = self.daemon.plan(start + datetime.timedelta(hours=6))
+        self.assertGreater(len(second), 0)
+        for observation in second:
+            self.assertGreaterEqual(observation.range.start_datetime, last_los)
+            self.assertGreaterEqual(observation.range.start_datetime, start + datetime.timedelta(hours=12))
+
+        pending = self.daemon.pending()
+        self.assertEqual(len(pending), len(first) + len(second))
+        starts = [o.range.start_datetime for o in pending]
+        self.assertEqual(starts, sorted(starts))
+
+    def test_pop_due(self):
+        observations = self.daemon.plan(start)
+        observations = sorted(observations, key=lambda o: o.range.start_datetime)
+        now = observations[2].range.start_datetime
+
+        due = self.daemon.pop_due(now)
+        # The finished passes are dropped
+        self.assertEqual(due, [o for o in observations[:3] if o.range.end_datetime > now])
+        self.assertEqual(self.daemon.pending(), observations[3:])
+        self.assertEqual(self.daemon.get_sleep_time(now), min(MAX_SLEEP_S, (observations[3].range.start_datetime - now).total_seconds()))
+
+    def test_launch_at_aos(self):
+        now = datetime.datetime.utcnow()
+        los = now + datetime.timedelta(seconds=1)
+        self.daemon.push(Observation("NOAA 15", None, DateTimeRange(now, los), "1"))
+        self.daemon.push(Observation("NOAA 18", None, DateTimeRange(now + datetime.timedelta(hours=1), los)))
+        # Don't plan during the test
+        self.daemon.next_planning = now + datetime.timedelta(hours=1)
+
+        asyncio.run(self.daemon.run(until=now + datetime.timedelta(seconds=0.5)))
+
+        self.assertEqual(self.received, [("NOAA 15", los, "1", self.daemon.config)])
+        self.assertEqual(len(self.daemon.pending()), 1)
+        # On start and after the reception
+        self.assertEqual(self.drained, [self.daemon.config] * 2)
+
+    def test_processing_doesnt_delay_reception(self):
+        processing = threading.Event()
+        finish_processing = threading.Event()
+        received = {}
+
+        def receive(name, *_):
+            received[name] = time.monotonic()
+            if name == "NOAA 18":
+                finish_processing.set()
+
+        def drain(config):
+            # The first drain processes the jobs left by the previous run
+            processing.set()
+            finish_processing.wait(5)
+
+        self.daemon.receive = receive
+        self.daemon.drain = drain
+        now = datetime.datetime.utcnow()
+        second_aos = now + datetime.timedelta(seconds=0.3)
+        self.daemon.push(Observation("NOAA 15", None, DateTimeRange(now, now + datetime.timedelta(seconds=1)), "1"))
+        self.daemon.push(Observation("NOAA 18", None, DateTimeRange(second_aos, second_aos + datetime.timedelta(seconds=1)), "1"))
+        self.daemon.next_planning = now + datetime.timedelta(hours=1)
+        start = time.monotonic()
+
+        asyncio.run(self.daemon.run(until=now + datetime.timedelta(seconds=0.5)))
+
+        self.assertTrue(processing.is_set())
+        self.assertEqual(sorted(received), ["NOAA 15", "NOAA 18"])
+        # Launched at AOS, while the queue was being drained
+        self.assertLess(received["NOAA 18"] - start, 0.45)
@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from shutil import copy, rmtree
+import unittest
+
+# Import time budget (in seconds) of each entry point. The default fits
+# the development machines, use the environment variable on the slow ones.
+IMPORT_BUDGET_S = float(os.environ.get("SVAROG_IMPORT_BUDGET", "1.0"))
+
+# The modules that must be loaded only when they are used
+HEAVY_MODULES = ("matplotlib", "numpy", "scipy", "requests", "orbit_predictor", "sgp4", "waterfall")
+
+MEASURE_CODE = """
+import json, sys, time
+sys.argv = %r
+start = time.perf_counter()
+try:
+    import %s
+    %s
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+class TestImportTime(unittest.TestCase):
+    def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        copy("tests/config.yml", self.config_dir)
+
+    def tearDown(self):
+        rmtree(self.config_dir, ignore_errors=True)
+
+    def measure(self, module, argv=("x",), statement="pass"):
+        env = dict(os.environ, SVAROG_CONFIG_DIR=self.config_dir)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (os.getcwd(), env.get("PYTHONPATH")) if p)
+        output = subprocess.check_output([sys.executable, "-c", MEASURE_CODE % (list(argv), module, statement)],
+                                         env=env, stderr=subprocess.DEVNULL)
+        result = json.loads(output.decode().splitlines()[-1])
+        return result["elapsed"], result["modules"]
+
+    def assertNotLoaded(self, loaded, heavy):
+        loaded_heavy = [m for m in loaded if any(m == h or m.startswith(h + ".") for h in heavy)]
+        self.assertEqual(loaded_heavy, [])
+
+    def test_receiver(self):
+        elapsed, modules = self.measure("receiver")
+        self.assertNotLoaded(modules, HEAVY_MODULES)
+        self.assertLess(elapsed, IMPORT_BUDGET_S)
+
+    def test_submitobs(self):
+        elapsed, modules = self.measure("submitobs")
+        self.assertNotLoaded(modules, HEAVY_MODULES)
+        self.assertLess(elapsed, IMPORT_BUDGET_S)
+
+    def test_planner(self):
+        elapsed, modules = self.measure("planner")
+        self.assertNotLoaded(modules, HEAVY_MODULES)
+        self.assertLess(elapsed, IMPORT_BUDGET_S)
+
+    def test_cli(self):
+        elapsed, modules = self.measure("cli", ("cli.py", "--help"))
+        self.assertNotLoaded(modules, HEAVY_MODULES)
+        self.assertLess(elapsed, IMPORT_BUDGET_S)
+
+    def test_rate_names_without_import(self):
+        _, modules = self.measure("quality_ratings", statement="quality_ratings.get_rate_names()")
+        self.assertNotLoaded(modules, HEAVY_MODULES + ("quality_ratings.analog", "quality_ratings.digital"))
+
+    def test_recipes_are_lazy(self):
+        _, modules = self.measure("recipes.factory")
+        self.assertNotLoaded(modules, ("recipes.noaa_apt", "recipes.noaa_apt_gr", "recipes.noaa_apt_py", "recipes.meteor_qpsk"))
+
+    def test_recipe_metadata_without_import(self):
+        statement = "recipes.factory.get_recipe_names(); recipes.factory.recipes.info('noaa-apt-gr')"
+        _, modules = self.measure("recipes.factory", statement=statement)
+        self.assertNotLoaded(modules, ("recipes.noaa_apt", "recipes.noaa_apt_gr", "recipes.noaa_apt_py", "recipes.meteor_qpsk"))
@@ -1,8 +1,10 @@
-from orbitdb import OrbitDatabase
+from orbitdb import OrbitDatabase, TLECatalog, MappedTLECatalog, get_catalog, get_index_path, write_index
 from utils.globalvars import CONFIG_DIRECTORY
 import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from os import makedirs, environ
 import os.path
+import threading
 import unittest
 from shutil import copy, rmtree
 
@@ -33,3 +35,128 @@ class TestOrbitDb(unittest.TestCase):
         tle_org = ("1 25338U 98030A   20093.30220133  .00000034  00000-0  32765-4 0  9993",
                    "2 25338  98.7251 118.7119 0011447 121.8181 238.4115 14.25957034138389")
         self.assertEqual(tle, tle_org)
+
+    def test_get_tle_by_norad(self):
+        now = datetime.datetime.utcnow()
+        self.assertEqual(self.db.get_norad("NOAA 15"), 25338)
+        self.assertEqual(self.db.get_tle(25338, now), self.db.get_tle("NOAA 15", now))
+
+    def test_get_tle_by_name_prefix(self):
+        now = datetime.datetime.utcnow()
+        tle = self.db.get_tle("NOAA 2 (ITOS", now)
+        self.assertEqual(tle[0][2:7], "06235")
+
+    def test_missing_satellite(self):
+        self.assertRaises(LookupError, self.db.get_predictor, "NOT EXISTS")
+
+    def test_catalog_is_parsed_once(self):
+        path = os.path.join(CONFIG_DIRECTORY, tle_filename)
+        catalog = get_catalog(path)
+        self.db.get_predictor("NOAA 18")
+        self.assertIs(get_catalog(path), catalog)
+
+    def test_catalog_is_reloaded_after_modification(self):
+        path = os.path.join(CONFIG_DIRECTORY, tle_filename)
+        catalog = get_catalog(path)
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertIsNot(get_catalog(path), catalog)
+
+    def test_index_is_created_alongside_tle_file(self):
+        self.db.get_predictor("NOAA 18")
+        path = os.path.join(CONFIG_DIRECTORY, tle_filename)
+        self.assertTrue(os.path.exists(get_index_path(path)))
+
+    def test_mapped_catalog_lookups(self):
+        path = os.path.join(CONFIG_DIRECTORY, tle_filename)
+        index_path = get_index_path(path)
+        url = "https://example.com/noaa.txt"
+        catalog = TLECatalog.from_file(path)
+        write_index(index_path, catalog, url, (1, 2))
+
+        mapped = MappedTLECatalog.open(index_path, url, (1, 2))
+        self.assertIsNotNone(mapped)
+        self.assertEqual(len(mapped), len(catalog))
+        self.assertEqual(list(mapped.entries()), list(catalog.entries()))
+        for sat_id in ("NOAA 15", "NOAA 19", "NOAA 1", "NOAA 2 (ITOS", 25338, 4793, "NOT EXISTS", 99999):
+            self.assertEqual(mapped.find(sat_id), catalog.find(sat_id))
+
+    def test_mapped_catalog_is_invalidated(self):
+        path = os.path.join(CONFIG_DIRECTORY, tle_filename)
+        index_path = get_index_path(path)
+        url = "https://example.com/noaa.txt"
+        write_index(index_path, TLECatalog.from_file(path), url, (1, 2))
+
+        self.assertIsNone(MappedTLECatalog.open(index_path, url, (1, 3)))
+        self.assertIsNone(MappedTLECatalog.open(index_path, url, (3, 2)))
+        self.assertIsNone(MappedTLECatalog.open(index_path, "https://example.com/other.txt", (1, 2)))
+        self.assertIsNone(MappedTLECatalog.open(index_path + ".missing", url, (1, 2)))
+
+
+class TLEHandler(BaseHTTPRequestHandler):
+    """Serves the test TLE file. Supports ETag based conditional requests."""
+    etag = '"noaa-1"'
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        if self.path == "/missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        with open(os.path.join("tests", tle_filename), "rb") as f:
+            content = f.read()
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOrbitDbRefresh(unittest.TestCase):
+    def setUp(self):
+        makedirs(CONFIG_DIRECTORY, exist_ok=True)
+        TLEHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), TLEHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = "http://127.0.0.1:%d" % (self.server.server_port,)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        rmtree(CONFIG_DIRECTORY, ignore_errors=True)
+
+    def test_refresh_all_urls(self):
+        urls = [self.base_url + "/a", self.base_url + "/b", self.base_url + "/c"]
+        db = OrbitDatabase(urls)
+        db.refresh_urls()
+        self.assertEqual(sorted(p for p, _ in TLEHandler.requests), ["/a", "/b", "/c"])
+        for url in urls:
+            self.assertTrue(os.path.exists(db._get_tle_path_from_url(url)))
+
+    def test_conditional_refresh(self):
+        url = self.base_url + "/noaa"
+        db = OrbitDatabase([url])
+        db.refresh_satellites(["NOAA 15"])
+        path = db._get_tle_path_from_url(url)
+        mtime = os.stat(path).st_mtime_ns
+        fetched = db._get_create_time(path)
+
+        db.refresh_satellites(["NOAA 15", "NOAA 19"])
+        self.assertEqual(TLEHandler.requests, [("/noaa", None), ("/noaa", TLEHandler.etag)])
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+        self.assertGreaterEqual(db._get_create_time(path), fetched)
+        self.assertEqual(db.get_norad("NOAA 19"), 33591)
+
+    def test_failed_refresh(self):
+        db = OrbitDatabase([self.base_url + "/missing"])
+        self.assertRaises(Exception, db.refresh_urls)
+        self.assertFalse(os.path.exists(db._get_tle_path_from_url(self.base_url + "/missing")))
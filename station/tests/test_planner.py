@@ -0,0 +1,125 @@
+import datetime
+from os import makedirs, environ
+import os.path
+from shutil import copy, rmtree
+import unittest
+
+# It must be set before import "utils"
+environ["SVAROG_CONFIG_DIR"] = "tests/config"
+
+from crontab import CronTab  # noqa: E402
+
+from utils.globalvars import CONFIG_DIRECTORY, COMMENT_PASS_TAG  # noqa: E402
+
+tle_filename = "https___celestrak.org_NORAD_elements_gp.php_GROUP_noaa_FORMAT_tle"
+# The TLEs in the test file are from the beginning of April 2020
+start = datetime.datetime(2020, 4, 3, 12, 0, 0)
+
+# The planner reads the config on import
+makedirs(CONFIG_DIRECTORY, exist_ok=True)
+copy("tests/config.yml", CONFIG_DIRECTORY)
+import planner  # noqa: E402
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        makedirs(CONFIG_DIRECTORY, exist_ok=True)
+        copy("tests/config.yml", CONFIG_DIRECTORY)
+        copy(os.path.join("tests", tle_filename), os.path.join(CONFIG_DIRECTORY, tle_filename))
+        self.config = dict(planner.prediction_config)
+        crontab_path = os.path.join(CONFIG_DIRECTORY, "crontab")
+        open(crontab_path, "w").close()
+        self.cron = CronTab(tabfile=crontab_path)
+
+    def tearDown(self):
+        rmtree(CONFIG_DIRECTORY, ignore_errors=True)
+
+    def get_scheduled(self):
+        return [planner.parse_command(j.command)[:2] for j in self.cron.find_comment(COMMENT_PASS_TAG)]
+
+    def test_no_duplicated_passes(self):
+        for prediction in ("batch", "iterative"):
+            self.config["prediction"] = prediction
+            self.config["strategy"] = "aos"
+            observations = planner.get_passes(self.config, start, start + datetime.timedelta(days=1))
+            self.assertGreater(len(observations), 0)
+            keys = [(o.data, o.pass_.aos) for o in observations]
+            self.assertEqual(len(keys), len(set(keys)))
+
+    def test_parse_command(self):
+        range_ = planner.DateTimeRange(start, start + datetime.timedelta(minutes=12))
+        name, los, device = planner.parse_command(planner.get_command("NOAA 15", range_))
+        self.assertEqual(name, "NOAA 15")
+        self.assertEqual(los, start + datetime.timedelta(minutes=12))
+        self.assertIsNone(device)
+
+        name, los, device = planner.parse_command(planner.get_command("METEOR-M 2", range_, "serial=00000002"))
+        self.assertEqual(name, "METEOR-M 2")
+        self.assertEqual(los, start + datetime.timedelta(minutes=12))
+        self.assertEqual(device, "serial=00000002")
+
+    def test_multiple_receivers(self):
+        single = planner.get_passes(self.config, start, start + datetime.timedelta(days=1))
+        self.config["receivers"] = ["0", "1"]
+        observations = planner.get_passes(self.config, start, start + datetime.timedelta(days=1))
+
+        total = sum(o.range.get_timedelta_second() for o in observations)
+        self.assertGreaterEqual(total, sum(o.range.get_timedelta_second() for o in single))
+        self.assertEqual(set(o.device for o in observations), {"0", "1"})
+        for device in ("0", "1"):
+            ranges = sorted((o.range for o in observations if o.device == device), key=lambda r: r.start_datetime)
+            for a, b in zip(ranges, ranges[1:]):
+                self.assertLessEqual(a.end_datetime, b.start_datetime)
+
+        planner.plan_passes(observations, self.cron)
+        devices = [planner.parse_command(j.command)[2] for j in self.cron.find_comment(COMMENT_PASS_TAG)]
+        self.assertEqual(sorted(devices), sorted(o.device for o in observations))
+
+    def test_check_resources(self):
+        self.config["receivers"] = ["0", "1"]
+        observations = planner.get_passes(self.config, start, start + datetime.timedelta(days=1))
+        observations = sorted(observations, key=lambda o: o.range.start_datetime)
+        overlapping = any(a.range.end_datetime > b.range.start_datetime for a, b in zip(observations, observations[1:]))
+        self.assertTrue(overlapping)
+
+        warnings = planner.check_resources(self.config, observations, cpu_count=64, free_disk_mb=1e6)
+        self.assertFalse(any("CPU" in w or "disk" in w for w in warnings))
+
+        warnings = planner.check_resources(self.config, observations, cpu_count=1, free_disk_mb=1.0)
+        self.assertTrue(any("disk space" in w for w in warnings))
+        self.assertTrue(any("CPU cores" in w for w in warnings))
+
+        self.config["satellites"] = [dict(s, recipe="foo") for s in self.config["satellites"]]
+        warnings = planner.check_resources(self.config, observations[:1], cpu_count=64, free_disk_mb=1e6)
+        self.assertEqual(warnings, ["No recipe for %s" % (observations[0].data,)])
+
+    def test_incremental_planning(self):
+        first = planner.plan_incremental(self.config, self.cron, start, start + datetime.timedelta(hours=12))
+        self.assertGreater(len(first), 0)
+        self.assertEqual(planner.get_planned_until(), start + datetime.timedelta(hours=12))
+
+        first = sorted(first, key=lambda o: o.range.start_datetime)
+        now = first[len(first) // 2].range.start_datetime - datetime.timedelta(minutes=1)
+        expected_kept = [(o.data, o.range.end_datetime) for o in first if o.range.end_datetime > now]
+        self.assertGreater(len(expected_kept), 0)
+        second = planner.plan_incremental(self.config, self.cron, now, now + datetime.timedelta(hours=12))
+
+        scheduled = self.get_scheduled()
+        self.assertEqual(scheduled[:len(expected_kept)], expected_kept)
+        self.assertEqual(len(scheduled), len(expected_kept) + len(second))
+        last_kept_los = max(los for _, los in expected_kept)
+        for observation in second:
+            self.assertGreaterEqual(observation.range.start_datetime, start + datetime.timedelta(hours=12))
+            self.assertGreaterEqual(observation.range.start_datetime, last_kept_los)
+        self.assertEqual(planner.get_planned_until(), now + datetime.timedelta(hours=12))
+
+    def test_incremental_planning_without_scheduled_jobs(self):
+        planner.set_planned_until(start + datetime.timedelta(hours=12))
+        observations = planner.plan_incremental(self.config, self.cron, start, start + datetime.timedelta(hours=12))
+        self.assertGreater(len(observations), 0)
+
+    def test_clear(self):
+        planner.plan_incremental(self.config, self.cron, start, start + datetime.timedelta(hours=12))
+        planner.clear(self.cron)
+        self.assertEqual(self.get_scheduled(), [])
+        self.assertIsNone(planner.get_planned_until())
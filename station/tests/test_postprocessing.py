@@ -0,0 +1,182 @@
+import json
+import os
+import signal
+import tempfile
+from shutil import copyfile, rmtree
+import threading
+import unittest
+
+from utils.jobqueue import JobQueue, FAILED, RUNNING
+import postprocessing
+
+
+def record_job(job):
+    """Writes the marker file of the job (executed in the worker process)."""
+    if job.get("fail"):
+        raise ValueError("Decoding failed")
+    with open(os.path.join(job["dir"], job["satellite"]), "w") as f:
+        json.dump({"nice": os.nice(0), "cpus": sorted(os.sched_getaffinity(0))}, f)
+    return 0.0
+
+
+def kill_worker(job):
+    """Kills the worker process once (or always), then records the job."""
+    killed_path = os.path.join(job["dir"], "killed " + job["satellite"])
+    if job.get("kill") == "always" or (job.get("kill") == "once" and not os.path.exists(killed_path)):
+        open(killed_path, "w").close()
+        os.kill(os.getpid(), signal.SIGKILL)
+    return record_job(job)
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.directory, "queue"))
+
+    def tearDown(self):
+        rmtree(self.directory, ignore_errors=True)
+
+    def test_fifo(self):
+        first = self.queue.put({"satellite": "NOAA 15"})
+        second = self.queue.put({"satellite": "NOAA 18"})
+        self.assertLess(first, second)
+        self.assertEqual(self.queue.depth(), 2)
+
+        job_id, job = self.queue.claim()
+        self.assertEqual(job_id, first)
+        self.assertEqual(job["satellite"], "NOAA 15")
+        self.assertIn("enqueued", job)
+        self.assertEqual((self.queue.depth(), self.queue.running()), (1, 1))
+
+        self.queue.done(job_id)
+        self.assertEqual(self.queue.claim()[0], second)
+        self.assertEqual(self.queue.running(), 1)
+        self.assertIsNone(self.queue.claim())
+
+    def test_persistent(self):
+        job_id = self.queue.put({"satellite": "NOAA 15"})
+        self.queue.claim()
+        # The process crashed, the job is returned to the queue by the next one
+        queue = JobQueue(self.queue.directory)
+        with queue.lock() as acquired:
+            self.assertTrue(acquired)
+            self.assertEqual(queue.recover(), (1, 0))
+        self.assertEqual(queue.claim()[0], job_id)
+
+    def test_fail(self):
+        job_id = self.queue.put({"satellite": "NOAA 15"})
+        self.queue.claim()
+        self.queue.fail(job_id, "error")
+        self.assertEqual((self.queue.depth(), self.queue.running()), (0, 0))
+        with open(os.path.join(self.queue.directory, FAILED, job_id + ".json")) as f:
+            self.assertEqual(json.load(f)["error"], "error")
+
+    def test_retry(self):
+        job_id = self.queue.put({"satellite": "NOAA 15"})
+        for _ in range(2):
+            self.queue.claim()
+            self.assertTrue(self.queue.retry(job_id, "error", max_attempts=3))
+        self.queue.claim()
+        self.assertFalse(self.queue.retry(job_id, "error", max_attempts=3))
+        self.assertEqual((self.queue.depth(), self.queue.running()), (0, 0))
+        with open(os.path.join(self.queue.directory, FAILED, job_id + ".json")) as f:
+            self.assertEqual(json.load(f)["attempts"], 3)
+
+    def test_failed_retention(self):
+        queue = JobQueue(self.queue.directory, max_failed=2)
+        job_ids = [queue.put({"satellite": "NOAA %d" % (i,)}) for i in range(3)]
+        for job_id in job_ids:
+            queue.claim()
+            queue.fail(job_id, "error")
+        failed = sorted(os.listdir(os.path.join(queue.directory, FAILED)))
+        self.assertEqual(failed, [job_id + ".json" for job_id in job_ids[1:]])
+
+    def test_recover_moved_job(self):
+        job_id = self.queue.put({"satellite": "NOAA 15"})
+        self.queue.claim()
+        # The process crashed after the job was written to "failed"
+        running_path = os.path.join(self.queue.directory, RUNNING, job_id + ".json")
+        copyfile(running_path, os.path.join(self.queue.directory, FAILED, job_id + ".json"))
+        self.assertEqual(self.queue.recover(), (0, 0))
+        self.assertEqual((self.queue.depth(), self.queue.running()), (0, 0))
+
+    def test_lock(self):
+        with self.queue.lock() as acquired:
+            self.assertTrue(acquired)
+            with JobQueue(self.queue.directory).lock() as acquired_again:
+                self.assertFalse(acquired_again)
+        with self.queue.lock() as acquired:
+            self.assertTrue(acquired)
+
+
+class TestDrain(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.queue = JobQueue(os.path.join(self.directory, "queue"))
+        for name in ("NOAA 15", "NOAA 18", "NOAA 19"):
+            self.queue.put({"satellite": name, "dir": self.directory})
+
+    def tearDown(self):
+        rmtree(self.directory, ignore_errors=True)
+
+    def read_marker(self, name):
+        with open(os.path.join(self.directory, name)) as f:
+            return json.load(f)
+
+    def test_pool(self):
+        cpus = sorted(os.sched_getaffinity(0))[:1]
+        config = {"processing": {"workers": 2, "nice": 5, "cpus": cpus}}
+        self.queue.put({"satellite": "METEOR-M2 3", "dir": self.directory, "fail": True})
+
+        processed = postprocessing.drain(config, self.queue, run=record_job)
+
+        self.assertEqual(processed, 4)
+        self.assertEqual((self.queue.depth(), self.queue.running()), (0, 0))
+        self.assertEqual(len(os.listdir(os.path.join(self.queue.directory, FAILED))), 1)
+        for name in ("NOAA 15", "NOAA 18", "NOAA 19"):
+            marker = self.read_marker(name)
+            self.assertEqual(marker["nice"], os.nice(0) + 5)
+            self.assertEqual(marker["cpus"], cpus)
+
+    def test_inline(self):
+        processed = postprocessing.drain({"processing": {"workers": 0}}, self.queue, run=record_job)
+        self.assertEqual(processed, 3)
+        self.assertEqual(self.read_marker("NOAA 15")["nice"], os.nice(0))
+
+    def test_drained_by_another_process(self):
+        with JobQueue(self.queue.directory).lock():
+            processed = postprocessing.drain({"processing": {"workers": 0}}, self.queue, run=record_job)
+        self.assertEqual(processed, 0)
+        self.assertEqual(self.queue.depth(), 3)
+
+    def test_killed_worker(self):
+        self.queue.put({"satellite": "METEOR-M2 3", "dir": self.directory, "kill": "always"})
+        self.queue.put({"satellite": "METEOR-M2 4", "dir": self.directory, "kill": "once"})
+
+        processed = postprocessing.drain({"processing": {"workers": 1}}, self.queue, run=kill_worker)
+
+        self.assertEqual(processed, 5)
+        self.assertEqual((self.queue.depth(), self.queue.running()), (0, 0))
+        failed = os.listdir(os.path.join(self.queue.directory, FAILED))
+        self.assertEqual(len(failed), 1)
+        with open(os.path.join(self.queue.directory, FAILED, failed[0])) as f:
+            job = json.load(f)
+        self.assertEqual((job["satellite"], job["attempts"]), ("METEOR-M2 3", 3))
+        for name in ("NOAA 15", "NOAA 18", "NOAA 19", "METEOR-M2 4"):
+            self.read_marker(name)
+
+    def test_pool_in_threaded_process(self):
+        result = {}
+
+        def drain():
+            # The worker processes aren't forked from the process with many threads
+            result["context"] = postprocessing._get_context().get_start_method()
+            result["processed"] = postprocessing.drain({"processing": {"workers": 2}}, self.queue, run=record_job)
+
+        thread = threading.Thread(target=drain)
+        thread.start()
+        thread.join()
+
+        self.assertIn(result["context"], ("forkserver", "spawn"))
+        self.assertEqual(result["processed"], 3)
+        self.read_marker("NOAA 19")
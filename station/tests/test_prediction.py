@@ -0,0 +1,59 @@
+import datetime
+import os.path
+import unittest
+
+from orbit_predictor.locations import Location
+
+from orbitdb import TLECatalog
+from prediction import BatchPredictor, predict_passes
+
+tle_path = os.path.join("tests", "https___celestrak.org_NORAD_elements_gp.php_GROUP_noaa_FORMAT_tle")
+location = Location("TEST_LOC", 54.35, 18.65, 10)
+# The TLEs in the test file are from the beginning of April 2020
+start = datetime.datetime(2020, 4, 3, 12, 0, 7)
+
+
+class TestPrediction(unittest.TestCase):
+    def setUp(self):
+        catalog = TLECatalog.from_file(tle_path)
+        self.names = ["NOAA 15", "NOAA 18", "NOAA 19"]
+        self.predictors = [catalog.get_predictor(n) for n in self.names]
+
+    def assertSamePasses(self, passes, expected_passes):
+        self.assertEqual(len(passes), len(expected_passes))
+        for pass_, expected in zip(passes, expected_passes):
+            self.assertEqual(pass_.sate_id, expected.sate_id)
+            self.assertLess(abs((pass_.aos - expected.aos).total_seconds()), 2)
+            self.assertLess(abs((pass_.los - expected.los).total_seconds()), 2)
+            self.assertLess(abs((pass_.max_elevation_date - expected.max_elevation_date).total_seconds()), 2)
+            # Both TCAs have 1 second tolerance, it matters for passes near zenith
+            self.assertLess(abs(pass_.max_elevation_deg - expected.max_elevation_deg), 0.25)
+            self.assertAlmostEqual(pass_.duration_s, (pass_.los - pass_.aos).total_seconds())
+            self.assertIsNotNone(pass_.max_elevation_position)
+
+    def test_same_passes_as_orbit_predictor(self):
+        end = start + datetime.timedelta(days=2)
+        batch = predict_passes(self.predictors, location, start, end, [10, 20, 0], [5, 0, 0])
+        self.assertEqual(len(batch), len(self.predictors))
+        for passes, predictor, max_elevation, aos_at in zip(batch, self.predictors, [10, 20, 0], [5, 0, 0]):
+            expected = list(predictor.passes_over(location, start, end, max_elevation, aos_at_dg=aos_at))
+            self.assertGreater(len(expected), 0)
+            self.assertSamePasses(passes, expected)
+
+    def test_pass_in_progress(self):
+        # Start the window during the pass, a few seconds after AOS.
+        first = next(iter(self.predictors[0].passes_over(location, start, start + datetime.timedelta(days=1))))
+        from_ = first.aos + datetime.timedelta(seconds=30)
+        end = from_ + datetime.timedelta(hours=6)
+
+        passes, = BatchPredictor(self.predictors[:1], location).passes_over(from_, end, [0], [0])
+        # orbit_predictor isn't exhaustive and it skips the pass in progress,
+        # the batch predictor returns it.
+        self.assertLess(abs((passes[0].aos - first.aos).total_seconds()), 2)
+        self.assertLess(passes[0].aos, from_)
+        self.assertGreater(passes[0].max_elevation_date, from_)
+        expected = list(self.predictors[0].passes_over(location, from_, end))
+        self.assertSamePasses(passes[1:], expected)
+
+    def test_no_predictors(self):
+        self.assertEqual(predict_passes([], location, start, start + datetime.timedelta(days=1), [], []), [])
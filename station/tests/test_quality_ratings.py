@@ -1,8 +1,11 @@
+import os.path
 import unittest
 
 import numpy as np
 
+import apt
 import quality_ratings
+from quality_ratings.engine import RatingEngine, Reducer, read_image, sample_rows, to_grayscale
 
 
 class TestQualityRatings(unittest.TestCase):
@@ -15,6 +18,22 @@ class TestQualityRatings(unittest.TestCase):
         self.assertIsNotNone(quality_ratings.get_rate_by_name("analog"))
         self.assertIsNotNone(quality_ratings.get_rate_by_name("digital"))
 
+    def test_get_rate_by_name_is_cached(self):
+        self.assertIs(quality_ratings.get_rate_by_name("digital"), quality_ratings.get_rate_by_name("digital"))
+
+    def test_get_rate_by_unknown_name(self):
+        with self.assertRaises(LookupError):
+            quality_ratings.get_rate_by_name("engine")
+        with self.assertRaises(LookupError):
+            quality_ratings.get_reducer_by_name("apt_signal")
+
+    def test_rating_info(self):
+        info = quality_ratings.get_rating_info("histogram")
+        self.assertEqual(info.module, "quality_ratings.histogram")
+        self.assertFalse(info.rate)
+        self.assertTrue(info.reducer)
+        self.assertNotIn("histogram", quality_ratings.get_rate_names())
+
     def test_analog_rating_on_gaussian_noise_small_sigma(self):
         img = np.random.normal(scale=1, size=(1000, 1000))
         rate = quality_ratings.get_rate_by_name("analog")
@@ -110,3 +129,114 @@ class TestQualityRatings(unittest.TestCase):
         rate = quality_ratings.get_rate_by_name("digital")
         rating = rate(img)
         self.assertAlmostEqual(0.75, rating, 3)
+
+
+class TestRatingEngine(unittest.TestCase):
+    def setUp(self):
+        data_directory = os.path.join(os.path.dirname(__file__), "data")
+        self.rgb_path = os.path.join(data_directory, "rgb-image.png")
+        self.gray_path = os.path.join(data_directory, "gray-image.png")
+
+    def test_read_image(self):
+        from matplotlib.pyplot import imread
+        for path in (self.rgb_path, self.gray_path):
+            pixels = read_image(path)
+            self.assertEqual(pixels.dtype, np.uint8)
+            expected = np.round(imread(path) * 255).astype(np.uint8)
+            if expected.ndim == 3:
+                # Without alpha channel
+                expected = expected[..., :3]
+            np.testing.assert_array_equal(pixels, expected)
+
+    def test_to_grayscale(self):
+        pixels = np.array([[[0, 0, 0], [1, 0, 0], [1, 1, 0], [255, 255, 254]]], dtype=np.uint8)
+        np.testing.assert_array_equal(to_grayscale(pixels), [[0, 0, 1, 255]])
+        gray = pixels[..., 0]
+        self.assertIs(to_grayscale(gray), gray)
+
+    def test_sample_rows(self):
+        pixels = np.repeat(np.arange(1000)[:, None], 100, axis=1)
+        self.assertIs(sample_rows(pixels, 10 ** 5), pixels)
+
+        sample = sample_rows(pixels, 16000, band_rows=16)
+        self.assertEqual(sample.shape, (160, 100))
+        # Full-resolution bands, the first one at the top and the last one at the bottom
+        np.testing.assert_array_equal(sample[:16, 0], np.arange(16))
+        np.testing.assert_array_equal(sample[-16:, 0], np.arange(984, 1000))
+
+    def test_sampled_digital_rating_error(self):
+        # Signal lost at the beginning and the end of the pass
+        pixels = np.full((2000, 500), 128, dtype=np.uint8)
+        pixels[:130] = 0
+        pixels[1777:] = 0
+        full = RatingEngine(pixels=pixels).rate("digital")
+        engine = RatingEngine(pixels=pixels, max_pixels=100000)
+        sampled = engine.rate("digital")
+
+        self.assertLessEqual(engine.pixels.size, 100000)
+        period = 2000 / (100000 // (16 * 500))
+        self.assertLessEqual(abs(sampled - full), 2 * period / 2000)
+
+    def test_shared_buffer(self):
+        engine = RatingEngine(self.rgb_path)
+        ratings = engine.rate_all(["digital", "digital", "<>//\\"])
+        self.assertIsInstance(ratings["digital"], float)
+        self.assertIsNone(ratings["<>//\\"])
+        self.assertEqual(engine.pixels.dtype, np.uint8)
+        self.assertEqual(engine.pixels.ndim, 3)
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        image = np.full((300, apt.LINE_WORDS), 100.0)
+        image[:, :apt.SYNC_A.size] += 100 * apt.SYNC_A
+        image[:100] = 0
+        image[100:] += rng.normal(0, 20, (200, apt.LINE_WORDS))
+        self.apt_image = np.clip(image, 0, 255).astype(np.uint8)
+
+    def test_list_names(self):
+        names = quality_ratings.get_metric_names()
+        for name in ("digital", "histogram", "sync"):
+            self.assertIn(name, names)
+
+    def test_single_pass(self):
+        metrics = RatingEngine(pixels=self.apt_image).metrics(["digital", "histogram", "sync"], tile_rows=7)
+
+        self.assertAlmostEqual(metrics["digital"], quality_ratings.get_rate_by_name("digital")(self.apt_image))
+        histogram = metrics["histogram"]["gray"]
+        self.assertEqual(len(histogram), 32)
+        self.assertEqual(sum(histogram), self.apt_image.size)
+        self.assertGreaterEqual(histogram[0], 100 * apt.LINE_WORDS)
+        # The black lines have no sync
+        self.assertAlmostEqual(metrics["sync"]["ratio"], 2 / 3)
+        self.assertGreater(metrics["sync"]["snr_db"], 3)
+
+    def test_rgb_histogram(self):
+        pixels = np.zeros((10, 20, 3), dtype=np.uint8)
+        pixels[..., 1] = 255
+        histogram = RatingEngine(pixels=pixels).metrics(["histogram"])["histogram"]
+        self.assertEqual(histogram["red"][0], 200)
+        self.assertEqual(histogram["green"][-1], 200)
+        self.assertEqual(sorted(histogram), ["blue", "green", "red"])
+
+    def test_sync_of_other_image(self):
+        pixels = np.zeros((10, 1568), dtype=np.uint8)
+        self.assertIsNone(RatingEngine(pixels=pixels).metrics(["sync"])["sync"])
+        self.assertEqual(quality_ratings.get_rate_by_name("sync")(pixels), 0.0)
+
+    def test_sync_rate(self):
+        self.assertAlmostEqual(quality_ratings.get_rate_by_name("sync")(self.apt_image), 2 / 3)
+
+    def test_incomplete_reducer(self):
+        class Incomplete(Reducer):
+            def update(self, tile):
+                pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_failed_metric(self):
+        metrics = RatingEngine(pixels=self.apt_image).metrics(["<>//\\", "digital"])
+        self.assertIsNone(metrics["<>//\\"])
+        self.assertIsNotNone(metrics["digital"])
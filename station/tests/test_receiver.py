@@ -1,5 +1,9 @@
+import tempfile
 import unittest
 import os.path
+import wave
+
+import numpy as np
 
 import receiver
 
@@ -45,3 +49,41 @@ class TestReceiverRatings(unittest.TestCase):
         rating = receiver.get_rating_for_product(self.gray_path, "digital")
         self.assertIsNotNone(rating)
         self.assertIsInstance(rating, float)
+
+    def test_rate_product(self):
+        rating, metrics = receiver.rate_product(self.rgb_path, "digital")
+        self.assertIsInstance(rating, float)
+        self.assertEqual(metrics["digital"], rating)
+        self.assertIn("histogram", metrics)
+
+    def test_rate_non_exists_product(self):
+        rating, metrics = receiver.rate_product("<>?\\//", "digital")
+        self.assertIsNone(rating)
+        self.assertEqual(metrics, {})
+
+
+class TestReceiverSignalRating(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "signal.wav")
+        noise = np.random.default_rng(0).normal(0, 3000, 11025 * 5)
+        with wave.open(self.path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(11025)
+            f.writeframes(noise.astype("<i2").tobytes())
+        self.results = [("LOG", "session.log"), ("SIGNAL", self.path)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_empty_apt_signal(self):
+        empty, metrics = receiver._is_empty_signal("noaa-apt", self.results, True)
+        self.assertTrue(empty)
+        self.assertEqual(metrics["active_ratio"], 0)
+
+    def test_disabled(self):
+        self.assertEqual(receiver._is_empty_signal("noaa-apt", self.results, False), (False, None))
+
+    def test_other_modulation(self):
+        self.assertEqual(receiver._is_empty_signal("meteor-qpsk", self.results, True), (False, None))
@@ -0,0 +1,64 @@
+import datetime
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from recipes import meteor_qpsk_stream
+
+# Fake rtl_fm: writes the samples to stdout until SIGHUP
+FAKE_RTL_FM = """
+import signal, sys, time
+signal.signal(signal.SIGHUP, lambda *_: sys.exit(0))
+while True:
+    sys.stdout.buffer.write(bytes(4800))
+    sys.stdout.buffer.flush()
+    time.sleep(0.02)
+"""
+
+# Fake sox: copies stdin to stdout
+FAKE_SOX = """
+import shutil, sys
+shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)
+"""
+
+# Fake demodulator: copies the input ("-B path") to the output ("-o path")
+FAKE_METEOR_DEMOD = """
+import shutil, sys
+with open(sys.argv[sys.argv.index("-B") + 1], "rb") as source, open(sys.argv[sys.argv.index("-o") + 1], "wb") as f:
+    shutil.copyfileobj(source, f)
+"""
+
+
+class TestMeteorQpskStreamCapture(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.bin = os.path.join(self.directory.name, "bin")
+        self.dir = os.path.join(self.directory.name, "observation")
+        os.makedirs(self.bin)
+        os.makedirs(self.dir)
+        for name, code in (("rtl_fm", FAKE_RTL_FM), ("sox", FAKE_SOX), ("meteor_demod", FAKE_METEOR_DEMOD)):
+            path = os.path.join(self.bin, name)
+            with open(path, "w") as f:
+                f.write("#!%s\n%s" % (sys.executable, code))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        self.path = os.environ["PATH"]
+        os.environ["PATH"] = self.bin + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        self.directory.cleanup()
+
+    def test_stale_fifo(self):
+        fifo_path = os.path.join(self.dir, "signal.fifo")
+        # Left by the interrupted capture
+        os.mkfifo(fifo_path)
+
+        results = dict(meteor_qpsk_stream.capture(self.dir, "137.1e6", datetime.timedelta(seconds=0.5)))
+
+        self.assertFalse(os.path.exists(fifo_path))
+        with open(results["SIGNAL"], "rb") as f:
+            self.assertEqual(f.read(4), b"RIFF")
+        with open(results["LOG"]) as f:
+            self.assertNotIn("ERROR", f.read())
@@ -0,0 +1,133 @@
+import datetime
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from recipes import factory, noaa_apt, noaa_apt_gr, noaa_apt_py
+from recipes.helpers import get_rtl_fm_device_args, get_soapy_device
+
+# Fake rtl_fm: writes the samples to the output (the last argument) until SIGHUP
+FAKE_RTL_FM = """
+import signal, sys, time
+open("rtl_fm.args", "w").write(" ".join(sys.argv[1:]))
+signal.signal(signal.SIGHUP, lambda *_: sys.exit(0))
+out = sys.stdout.buffer if sys.argv[-1] == "-" else open(sys.argv[-1], "wb")
+while True:
+    out.write(bytes(4800))
+    out.flush()
+    time.sleep(0.02)
+"""
+
+# Fake sox: writes the input samples as WAV ("sox [options] input output rate 11025")
+FAKE_SOX = """
+import sys, wave
+source = sys.stdin.buffer if sys.argv[-4] == "-" else open(sys.argv[-4], "rb")
+with wave.open(sys.argv[-3], "wb") as f:
+    f.setnchannels(1)
+    f.setsampwidth(2)
+    f.setframerate(11025)
+    f.writeframes(source.read())
+"""
+
+# Fake GNU Radio flowgraph: records the arguments
+FAKE_SATNOGS_DECODER = """
+import sys
+open("satnogs_noaa_apt_decoder.args", "w").write(" ".join(sys.argv[1:]))
+"""
+
+
+class FakeBinariesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.bin = os.path.join(self.directory.name, "bin")
+        self.dir = os.path.join(self.directory.name, "observation")
+        os.makedirs(self.bin)
+        os.makedirs(self.dir)
+        for name, code in (("rtl_fm", FAKE_RTL_FM), ("sox", FAKE_SOX), ("satnogs_noaa_apt_decoder", FAKE_SATNOGS_DECODER)):
+            path = os.path.join(self.bin, name)
+            with open(path, "w") as f:
+                f.write("#!%s\n%s" % (sys.executable, code))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        self.path = os.environ["PATH"]
+        os.environ["PATH"] = self.bin + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ["PATH"] = self.path
+        self.directory.cleanup()
+
+    def read_args(self, name):
+        with open(os.path.join(self.dir, name + ".args")) as f:
+            return f.read().split()
+
+
+class TestNoaaAptCapture(FakeBinariesTestCase):
+    def capture(self, **options):
+        return dict(noaa_apt.capture(self.dir, "137.62e6", datetime.timedelta(seconds=0.5), **options))
+
+    def assertSignal(self, results):
+        self.assertEqual(results["SIGNAL"], os.path.join(self.dir, "signal.wav"))
+        with open(results["SIGNAL"], "rb") as f:
+            content = f.read()
+        self.assertTrue(content.startswith(b"RIFF"))
+        self.assertGreater(len(content), 4)
+
+    def test_pipeline(self):
+        results = self.capture()
+        self.assertSignal(results)
+        self.assertNotIn("RAW", results)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "signal.raw")))
+
+    def test_pipeline_keep_raw(self):
+        results = self.capture(keep_raw=True)
+        self.assertSignal(results)
+        self.assertGreater(os.path.getsize(results["RAW"]), 0)
+
+    def test_without_pipeline(self):
+        results = self.capture(pipeline=False)
+        self.assertSignal(results)
+        self.assertGreater(os.path.getsize(results["RAW"]), 0)
+
+    def test_options_from_config(self):
+        config = {"recipes": {"noaa-apt": {"keep_raw": True}}}
+        options = factory.get_recipe_options("noaa-apt", config)
+        self.assertEqual(options, {"keep_raw": True})
+        self.assertEqual(factory.get_recipe_options("meteor-qpsk", config), {})
+        self.assertEqual(factory.get_recipe_options("noaa-apt", {}), {})
+
+        results = self.capture(**options)
+        self.assertSignal(results)
+        self.assertIn("RAW", results)
+
+    def test_noaa_apt_py_options(self):
+        results = dict(noaa_apt_py.execute(self.dir, "137.62e6", datetime.timedelta(seconds=0.5), keep_raw=True))
+        self.assertSignal(results)
+        self.assertGreater(os.path.getsize(results["RAW"]), 0)
+        self.assertTrue(os.path.exists(results["PRODUCT"]))
+
+
+class TestReceiverDevices(FakeBinariesTestCase):
+    def test_device_args(self):
+        self.assertEqual(get_rtl_fm_device_args(None), ())
+        self.assertEqual(get_rtl_fm_device_args("1"), ("-d", "1"))
+        self.assertEqual(get_rtl_fm_device_args("driver=rtlsdr,serial=00000002"), ("-d", "00000002"))
+        self.assertEqual(get_rtl_fm_device_args("driver=rtlsdr,rtl=1"), ("-d", "1"))
+        with self.assertRaises(ValueError):
+            get_rtl_fm_device_args("driver=airspy")
+
+        self.assertEqual(get_soapy_device(None, "driver=airspy"), "driver=airspy")
+        self.assertEqual(get_soapy_device("1", "driver=airspy"), "driver=rtlsdr,rtl=1")
+        self.assertEqual(get_soapy_device("00000002", "driver=airspy"), "driver=rtlsdr,serial=00000002")
+        self.assertEqual(get_soapy_device("driver=rtlsdr,serial=2", "driver=airspy"), "driver=rtlsdr,serial=2")
+
+    def test_recipes_on_one_receiver(self):
+        # The same receiver is used by the rtl_fm and SoapySDR recipes
+        for device, serial in (("00000002", "00000002"), ("driver=rtlsdr,serial=00000002", "00000002")):
+            noaa_apt.capture(self.dir, "137.62e6", datetime.timedelta(seconds=0.2), device)
+            args = self.read_args("rtl_fm")
+            self.assertEqual(args[args.index("-d") + 1], serial)
+
+            noaa_apt_gr.execute(self.dir, "137.62e6", datetime.timedelta(seconds=5), device)
+            args = self.read_args("satnogs_noaa_apt_decoder")
+            self.assertEqual(args[args.index("--soapy-rx-device") + 1], "driver=rtlsdr,serial=" + serial)
@@ -1,4 +1,6 @@
 import datetime
+import itertools
+import random
 import unittest
 
 from datetimerange import DateTimeRange
@@ -56,7 +58,7 @@ class TestSelectStrategy(unittest.TestCase):
         ]
 
         self.assertEqual(len(observations), len(expected))
-        for (result_name, _, result_range), (expected_name, exprected_range) in zip(observations, expected):
+        for (result_name, _, result_range, _), (expected_name, exprected_range) in zip(observations, expected):
             self.assertEqual(result_name, expected_name)
             self.assertEqual(result_range, exprected_range)
 
@@ -73,6 +75,155 @@ class TestSelectStrategy(unittest.TestCase):
         ]
 
         self.assertEqual(len(observations), len(expected))
-        for (result_name, _, result_range), (expected_name, exprected_range) in zip(observations, expected):
+        for (result_name, _, result_range, _), (expected_name, exprected_range) in zip(observations, expected):
             self.assertEqual(result_name, expected_name)
             self.assertEqual(result_range, exprected_range)
+
+    def test_optimal_strategy(self):
+        strategy = selectstrategy.strategy_factory("optimal", "elevation")
+        observations = strategy(self.dataset)
+
+        # Greedy max-elevation strategy has the total weight 250
+        expected = [
+            ("A", DateTimeRange(moments[0], moments[2])),
+            ("E", DateTimeRange(moments[4], moments[6])),
+            ("D", DateTimeRange(moments[6], moments[7])),
+            ("G", DateTimeRange(moments[7], moments[8])),
+            ("H", DateTimeRange(moments[8], moments[9]))
+        ]
+
+        self.assertEqual(len(observations), len(expected))
+        for (result_name, _, result_range, _), (expected_name, exprected_range) in zip(observations, expected):
+            self.assertEqual(result_name, expected_name)
+            self.assertEqual(result_range, exprected_range)
+
+    def test_optimal_strategy_duration(self):
+        #    | 0    1    2    3    4    5
+        # A  | |------- A ------|
+        # B  |           |------- B ------|
+        # C  |      |--- C ---|
+        A = get_pass(location, "A", moments[0], moments[3], 10)
+        B = get_pass(location, "B", moments[2], moments[5], 20)
+        C = get_pass(location, "C", moments[1], moments[3], 90)
+        dataset = [(item.sate_id, item) for item in [A, B, C]]
+
+        observations = selectstrategy.strategy_factory("optimal", "duration")(dataset)
+        self.assertEqual([(o.data, o.range) for o in observations], [
+            ("A", DateTimeRange(moments[0], moments[3])),
+            ("B", DateTimeRange(moments[3], moments[5]))
+        ])
+
+    def test_optimal_strategy_priorities(self):
+        A = get_pass(location, "A", moments[0], moments[3], 10)
+        B = get_pass(location, "B", moments[2], moments[5], 20)
+        C = get_pass(location, "C", moments[1], moments[3], 90)
+        dataset = [(item.sate_id, item) for item in [A, B, C]]
+
+        observations = selectstrategy.strategy_factory("optimal", "duration", {"C": 10})(dataset)
+        self.assertEqual([(o.data, o.range) for o in observations], [
+            ("C", DateTimeRange(moments[1], moments[3])),
+            ("B", DateTimeRange(moments[3], moments[5]))
+        ])
+
+    def test_unknown_strategy(self):
+        self.assertRaises(LookupError, selectstrategy.strategy_factory, "foo")
+        self.assertRaises(LookupError, selectstrategy.strategy_factory, "optimal", "foo")
+
+
+def get_random_dataset(rnd: random.Random, count: int):
+    """Random passes on the minute grid, so many of them touch each other."""
+    dataset = []
+    for i in range(count):
+        aos = start + datetime.timedelta(minutes=rnd.randint(0, 600))
+        los = aos + datetime.timedelta(minutes=rnd.randint(0, 15))
+        pass_ = get_pass(location, "S%d" % (i,), aos, los, rnd.randint(0, 90), rnd.random())
+        dataset.append((pass_.sate_id, pass_))
+    return dataset
+
+
+class TestIntervalStrategy(unittest.TestCase):
+    def assertSameObservations(self, observations, expected):
+        self.assertEqual([(o.data, o.range) for o in observations], [(o.data, o.range) for o in expected])
+
+    def test_same_results_as_reference_strategy(self):
+        rnd = random.Random(1234)
+        strategies = [
+            (lambda o: o.pass_.aos, lambda _d, _p, _lr, rr: rr),
+            (lambda o: -o.pass_.max_elevation_deg, selectstrategy.max_elevation_selector),
+            (lambda o: o.pass_.los, lambda _d, _p, lr, rr: lr if lr is not None else rr)
+        ]
+        for _ in range(25):
+            dataset = get_random_dataset(rnd, rnd.randint(0, 60))
+            for sort_key, selector in strategies:
+                for min_seconds in (1, 120):
+                    reference = selectstrategy.create_strategy(sort_key, selector, min_seconds)
+                    interval = selectstrategy.create_interval_strategy(sort_key, selector, min_seconds)
+                    self.assertSameObservations(interval(dataset), reference(dataset))
+
+    def test_empty_dataset(self):
+        self.assertEqual(selectstrategy.aos_priority_strategy([]), [])
+        self.assertEqual(selectstrategy.max_elevation_strategy([]), [])
+
+    def test_multiple_receivers(self):
+        rnd = random.Random(2345)
+        for name in ("aos", "max-elevation", "optimal"):
+            for _ in range(10):
+                dataset = get_random_dataset(rnd, rnd.randint(0, 60))
+                single = selectstrategy.strategy_factory(name)(dataset)
+                observations = selectstrategy.strategy_factory(name, devices=("0", "1"))(dataset)
+
+                self.assertGreaterEqual(len(observations), len(single))
+                self.assertEqual(len(set(o.data for o in observations)), len(observations))
+                for device in ("0", "1"):
+                    ranges = sorted((o.range for o in observations if o.device == device), key=lambda r: r.start_datetime)
+                    for a, b in zip(ranges, ranges[1:]):
+                        self.assertLessEqual(a.end_datetime, b.start_datetime)
+
+    def test_overlapping_passes_on_multiple_receivers(self):
+        A = get_pass(location, "A", moments[0], moments[3], 90)
+        B = get_pass(location, "B", moments[1], moments[4], 80)
+        C = get_pass(location, "C", moments[2], moments[5], 70)
+        dataset = [(item.sate_id, item) for item in [A, B, C]]
+
+        observations = selectstrategy.strategy_factory("max-elevation", devices=("0", "1"))(dataset)
+        self.assertEqual([(o.data, o.range, o.device) for o in observations], [
+            ("A", DateTimeRange(moments[0], moments[3]), "0"),
+            ("B", DateTimeRange(moments[1], moments[4]), "1"),
+            ("C", DateTimeRange(moments[3], moments[5]), "0")
+        ])
+
+
+class TestOptimalStrategy(unittest.TestCase):
+    def get_total_weight(self, weight, observations):
+        return sum(weight(o.data, o.pass_, o.range) for o in observations)
+
+    def get_best_full_passes_weight(self, weight, dataset):
+        """Brute force over all non-overlapping subsets of not trimmed passes (at least 1 second long)."""
+        dataset = [(name, p) for name, p in dataset if p.duration_s >= 1]
+        best = 0.0
+        for count in range(1, len(dataset) + 1):
+            for subset in itertools.combinations(dataset, count):
+                subset = sorted(subset, key=lambda e: e[1].aos)
+                if any(a[1].los > b[1].aos for a, b in zip(subset, subset[1:])):
+                    continue
+                best = max(best, sum(weight(name, p, DateTimeRange(p.aos, p.los)) for name, p in subset))
+        return best
+
+    def test_better_than_full_passes(self):
+        rnd = random.Random(4321)
+        for weight in (selectstrategy.elevation_weight, selectstrategy.duration_weight):
+            strategy = selectstrategy.create_optimal_strategy(weight)
+            for _ in range(20):
+                dataset = get_random_dataset(rnd, rnd.randint(0, 10))
+                expected = self.get_best_full_passes_weight(weight, dataset)
+                passes = {name: p for name, p in dataset}
+
+                observations = strategy(dataset)
+
+                self.assertGreaterEqual(self.get_total_weight(weight, observations), expected)
+                for a, b in zip(observations, observations[1:]):
+                    self.assertLessEqual(a.range.end_datetime, b.range.start_datetime)
+                for o in observations:
+                    self.assertGreaterEqual(o.range.start_datetime, passes[o.data].aos)
+                    self.assertEqual(o.range.end_datetime, passes[o.data].los)
+                    self.assertGreaterEqual(o.range.get_timedelta_second(), 1)
@@ -1,6 +1,12 @@
+from email.parser import BytesParser
+import hashlib
+import io
+import os
+import tempfile
 import unittest
 
-from submitobs import get_mime_type
+from hmac_token import _hash_file
+from submitobs import MultipartBody, get_mime_type
 
 
 class TestSubmitObs(unittest.TestCase):
@@ -20,3 +26,34 @@ class TestSubmitObs(unittest.TestCase):
 
         for case in cases:
             self.assertEqual(get_mime_type(case[0]), case[1])
+
+    def test_multipart_body(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "product.png")
+            content = os.urandom(10000)
+            with open(path, "wb") as f:
+                f.write(content)
+
+            body = MultipartBody([("sat", "NOAA 15"), ("rating", None), ("tle", ["line 1", "line 2"])],
+                                 [("file", path)], chunk_size=1000)
+            chunks = list(body)
+
+        raw = b"".join(chunks)
+        self.assertEqual(len(body), len(raw))
+        self.assertLessEqual(max(len(c) for c in chunks), 1000)
+
+        message = BytesParser().parsebytes(b"Content-Type: " + body.content_type.encode() + b"\r\n\r\n" + raw)
+        parts = [(p.get_param("name", header="content-disposition"), p.get_param("filename", header="content-disposition"),
+                  p.get_content_type(), p.get_payload(decode=True)) for p in message.get_payload()]
+        self.assertEqual(parts, [
+            ("sat", None, "text/plain", b"NOAA 15"),
+            ("tle", None, "text/plain", b"line 1"),
+            ("tle", None, "text/plain", b"line 2"),
+            ("file", "product.png", "image/png", content)
+        ])
+
+    def test_hash_file_in_chunks(self):
+        content = os.urandom(200000)
+        obj = io.BytesIO(content)
+        self.assertEqual(_hash_file(obj), hashlib.sha1(content).hexdigest())
+        self.assertEqual(obj.tell(), 0)
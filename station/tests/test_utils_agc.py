@@ -0,0 +1,64 @@
+import io
+import unittest
+import wave
+
+import numpy as np
+
+from recipes.meteor_qpsk_stream import _NormalizingWriter
+from utils.agc import RunningGain
+
+
+class TestRunningGain(unittest.TestCase):
+    def test_normalize(self):
+        t = np.arange(96000) / 96000
+        samples = 300 * np.sin(2 * np.pi * 1000 * t)
+        agc = RunningGain(96000, target=30000)
+        output = np.concatenate([agc.process(chunk) for chunk in np.array_split(samples, 50)])
+
+        self.assertEqual(output.shape, samples.shape)
+        self.assertAlmostEqual(np.max(np.abs(output)), 30000, delta=30)
+        self.assertAlmostEqual(agc.gain, 100, delta=0.1)
+        self.assertEqual(agc.count, 96000)
+
+    def test_attack_and_release(self):
+        agc = RunningGain(1000, target=1.0, release_s=1.0)
+        frames = np.ones((100, 2))
+        agc.process(frames)
+        self.assertAlmostEqual(agc.gain, 1.0)
+
+        # Stronger signal isn't clipped
+        output = agc.process(10 * frames)
+        self.assertAlmostEqual(agc.gain, 0.1)
+        np.testing.assert_allclose(output, frames)
+
+        # After the fade the gain rises gradually, without the step
+        output = agc.process(frames)
+        self.assertGreater(agc.gain, 0.1)
+        self.assertLess(agc.gain, 1.0)
+        self.assertAlmostEqual(output[0, 0], 0.1)
+        self.assertTrue(np.all(np.diff(output[:, 0]) >= 0))
+
+    def test_silence(self):
+        agc = RunningGain(1000, max_gain=10.0)
+        output = agc.process(np.zeros(100))
+        np.testing.assert_array_equal(output, np.zeros(100))
+        self.assertEqual(agc.gain, 10.0)
+
+
+class TestNormalizingWriter(unittest.TestCase):
+    def test_stream_wav(self):
+        stream = io.BytesIO()
+        writer = _NormalizingWriter(stream, sample_rate=8000, channels=2)
+        samples = np.tile(np.array([[1000, -1000]], dtype="<i2"), (1000, 1)).tobytes()
+        # Chunks not aligned to the frames
+        writer.write(samples[:1001])
+        writer.write(samples[1001:])
+
+        stream.seek(0)
+        with wave.open(stream) as f:
+            self.assertEqual(f.getframerate(), 8000)
+            self.assertEqual(f.getnchannels(), 2)
+            self.assertEqual(f.getsampwidth(), 2)
+            data = np.frombuffer(f.readframes(2000), dtype="<i2").reshape(-1, 2)
+        self.assertEqual(data.shape, (1000, 2))
+        np.testing.assert_array_equal(np.abs(data), np.round(0.9 * 32767))
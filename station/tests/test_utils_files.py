@@ -0,0 +1,39 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from utils.files import atomic_write
+
+
+class TestAtomicWrite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "noaa.txt")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_mode(self):
+        return stat.S_IMODE(os.stat(self.path).st_mode)
+
+    def test_write(self):
+        atomic_write(self.path, b"first")
+        atomic_write(self.path, b"second")
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"second")
+        self.assertEqual(os.listdir(self.directory.name), ["noaa.txt"])
+
+    def test_new_file_gets_default_mode(self):
+        umask = os.umask(0o022)
+        try:
+            atomic_write(self.path, b"data")
+        finally:
+            os.umask(umask)
+        self.assertEqual(self.get_mode(), 0o644)
+
+    def test_existing_mode_is_kept(self):
+        atomic_write(self.path, b"first")
+        os.chmod(self.path, 0o640)
+        atomic_write(self.path, b"second")
+        self.assertEqual(self.get_mode(), 0o640)
@@ -0,0 +1,120 @@
+import json
+import os
+import resource
+import tempfile
+import threading
+import unittest
+
+import sh
+
+from recipes.helpers import set_sh_defaults
+from utils import instrumentation
+from utils.instrumentation import Recorder
+
+
+@set_sh_defaults
+def _recipe(working_dir, sh=sh):
+    sh.sh("-c", "echo data > output.txt")
+    return [("LOG", os.path.join(working_dir, "output.txt"))]
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.dir = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_commands(self):
+        recorder = Recorder(self.dir, "capture")
+        instrumented = recorder.wrap(sh.bake(_cwd=self.dir))
+        instrumented.sh("-c", "i=0; while [ $i -lt 200000 ]; do i=$((i+1)); done")
+        with self.assertRaises(instrumented.ErrorReturnCode_1):
+            instrumented.false()
+        instrumented.sleep(0.1, _bg=True).wait()
+
+        self.assertEqual([r["name"] for r in recorder.commands], ["sh", "false", "sleep"])
+        first, failed, background = recorder.commands
+        self.assertEqual(first["phase"], "capture")
+        self.assertEqual(first["exit_code"], 0)
+        self.assertGreater(first["cpu_s"], 0)
+        self.assertGreater(first["max_rss_kb"], 0)
+        self.assertGreaterEqual(first["bytes_written"], 0)
+        self.assertEqual(failed["exit_code"], 1)
+        self.assertGreaterEqual(background["wall_s"], 0.1)
+        self.assertGreater(background["max_rss_kb"], 0)
+
+    def test_concurrent_commands(self):
+        recorder = Recorder(self.dir)
+        instrumented = recorder.wrap(sh.bake(_cwd=self.dir))
+        before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        # The busy command finishes first, the idle one is reaped after it
+        idle = instrumented.sleep(1, _bg=True)
+        busy = instrumented.sh("-c", "i=0; while [ $i -lt 200000 ]; do i=$((i+1)); done", _bg=True)
+        busy.wait()
+        idle.wait()
+
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total = (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+        records = {r["name"]: r for r in recorder.commands}
+        self.assertGreater(records["sh"]["cpu_s"], 0.05)
+        # The CPU time of the busy command isn't counted twice
+        self.assertLess(records["sleep"]["cpu_s"], 0.05)
+        self.assertLessEqual(records["sh"]["cpu_s"] + records["sleep"]["cpu_s"], total + 0.01)
+
+    def test_stage(self):
+        with instrumentation.stage(self.dir, "process"):
+            sum(i * i for i in range(200000))
+        with instrumentation.stage(self.dir, "process"):
+            pass
+
+        timings = instrumentation.load(self.dir)
+        self.assertEqual(len(timings["stages"]), 2)
+        self.assertGreater(timings["stages"][0]["cpu_s"], 0)
+        self.assertEqual(timings["commands"], [])
+        record = timings["stages"][0]
+        self.assertEqual(record["name"], "process")
+        self.assertGreater(record["wall_s"], 0)
+        self.assertNotIn("max_rss_kb", record)
+
+    def test_concurrent_writes(self):
+        def write(phase):
+            recorder = Recorder(self.dir, phase)
+            for _ in range(20):
+                recorder.commands.append({"name": "sh", "phase": phase})
+                recorder.write()
+
+        threads = [threading.Thread(target=write, args=(str(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        commands = instrumentation.load(self.dir)["commands"]
+        self.assertEqual(len(commands), 80)
+
+    def test_set_sh_defaults(self):
+        results = _recipe(self.dir)
+
+        self.assertTrue(os.path.exists(results[0][1]))
+        with open(os.path.join(self.dir, instrumentation.TIMINGS_FILE)) as f:
+            timings = json.load(f)
+        self.assertEqual(timings["stages"], [])
+        self.assertEqual(len(timings["commands"]), 1)
+        self.assertEqual(timings["commands"][0]["name"], "sh")
+        self.assertEqual(timings["commands"][0]["phase"], "_recipe")
+
+    def test_stage_includes_commands(self):
+        with instrumentation.stage(self.dir, "capture"):
+            _recipe(self.dir)
+
+        timings = instrumentation.load(self.dir)
+        command, = timings["commands"]
+        stage, = timings["stages"]
+        # The usage of the short command may not be sampled
+        self.assertGreaterEqual(stage["cpu_s"], command["cpu_s"] or 0.0)
+
+    def test_load_missing(self):
+        self.assertEqual(instrumentation.load(self.dir), {"stages": [], "commands": []})
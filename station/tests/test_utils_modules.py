@@ -75,3 +75,25 @@ class TestUtilsModules(unittest.TestCase):
         self.assertGreater(len(names), 0)
         for name in names:
             self.assertIsInstance(name, str)
+
+
+class TestUtilsModulesConstants(unittest.TestCase):
+    def test_constant_without_import(self):
+        import sys
+        sys.modules.pop("recipes.meteor_qpsk", None)
+        metadata = moduleUtils.get_constant_in_module_file("recipes", "meteor_qpsk", "RECIPE")
+        self.assertIsInstance(metadata, dict)
+        self.assertEqual(metadata["name"], "meteor-qpsk")
+        self.assertNotIn("recipes.meteor_qpsk", sys.modules)
+
+    def test_non_exist_constant(self):
+        self.assertIsNone(moduleUtils.get_constant_in_module_file("recipes", "meteor_qpsk", "FOO"))
+        self.assertIsNone(moduleUtils.get_constant_in_module_file("recipes", "foo", "RECIPE"))
+        # Not a literal
+        self.assertIsNone(moduleUtils.get_constant_in_module_file("recipes", "factory", "ReceptionResultCategory"))
+
+    def test_list_constants_in_directory(self):
+        names = [name for name, _ in moduleUtils.get_constants_in_directory("recipes", "RECIPE")]
+        self.assertEqual(names, sorted(names))
+        self.assertIn("noaa_apt", names)
+        self.assertNotIn("factory", names)
@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from utils.statistics import QuantileSketch, RunningStatistics
+
+
+class TestRunningStatistics(unittest.TestCase):
+    def test_chunks(self):
+        values = np.random.default_rng(0).normal(1e6, 3.0, size=(1000, 4))
+        statistics = RunningStatistics((4, ))
+        for start in range(0, 1000, 64):
+            statistics.update(values[start:start + 64])
+
+        self.assertEqual(statistics.count, 1000)
+        np.testing.assert_allclose(statistics.mean, values.mean(axis=0))
+        np.testing.assert_allclose(statistics.std, values.std(axis=0), rtol=1e-9)
+
+    def test_merge(self):
+        values = np.random.default_rng(1).normal(-80, 5, size=500)
+        first = RunningStatistics()
+        first.update(values[:123])
+        second = RunningStatistics()
+        second.update(values[123:])
+        first.merge(second)
+        first.merge(RunningStatistics())
+
+        self.assertEqual(first.count, 500)
+        self.assertAlmostEqual(first.mean, values.mean())
+        self.assertAlmostEqual(first.std, values.std())
+
+    def test_empty(self):
+        statistics = RunningStatistics()
+        statistics.update(np.array([]))
+        self.assertEqual(statistics.count, 0)
+        self.assertTrue(np.isnan(statistics.std))
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_quantiles(self):
+        values = np.random.default_rng(2).normal(-80, 5, size=100000)
+        sketch = QuantileSketch(-200, 100, 0.05)
+        for chunk in np.array_split(values, 7):
+            sketch.update(chunk)
+
+        self.assertEqual(sketch.count, values.size)
+        for p in (1, 25, 50, 75, 99):
+            self.assertAlmostEqual(sketch.percentile(p), np.percentile(values, p), delta=0.05)
+        np.testing.assert_allclose(sketch.quantile([0.1, 0.9]), np.quantile(values, [0.1, 0.9]), atol=0.05)
+
+    def test_merge(self):
+        first = QuantileSketch(0, 10, 1)
+        first.update(np.array([0.5, 1.5, np.nan]))
+        second = QuantileSketch(0, 10, 1)
+        second.update(np.array([2.5, 3.5, 100]))
+        first.merge(second)
+
+        self.assertEqual(first.count, 5)
+        self.assertEqual(first.counts[-1], 1)
+        self.assertAlmostEqual(first.quantile(0.4), 2.0)
+        self.assertRaises(ValueError, first.merge, QuantileSketch(0, 10, 0.5))
+
+    def test_empty(self):
+        self.assertTrue(np.isnan(QuantileSketch(0, 10, 1).quantile(0.5)))
@@ -0,0 +1,282 @@
+import os.path
+import tempfile
+import time
+from shutil import rmtree
+import unittest
+
+import numpy as np
+
+import waterfall
+from waterfall import Waterfall
+from utils.png import write_png
+
+
+def write_waterfall(path, spec, tabs=None, samp_rate=48000, nfft_per_row=10):
+    """Writes the waterfall data file in the format of the GNU Radio flowgraph."""
+    nint, nchan = spec.shape
+    if tabs is None:
+        tabs = np.arange(nint, dtype=np.int64) * 100000
+    header = np.zeros(1, dtype=waterfall.HEADER_DTYPE)
+    header['timestamp'] = b"2020-04-03T12:00:00.000000Z"
+    header['nchan'] = nchan
+    header['samp_rate'] = samp_rate
+    header['nfft_per_row'] = nfft_per_row
+    header['center_freq'] = 137.1e6
+    records = np.zeros(nint, dtype=waterfall.get_record_dtype(nchan))
+    records['tabs'] = tabs
+    records['spec'] = spec
+    with open(path, "wb") as f:
+        f.write(header.tobytes())
+        f.write(records.tobytes())
+
+
+class TestWaterfall(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "waterfall.dat")
+        rng = np.random.default_rng(1234)
+        self.spec = rng.normal(-80, 5, size=(2500, 64)).astype(np.float32)
+        self.spec[10, :5] = -np.inf
+        write_waterfall(self.path, self.spec)
+
+    def tearDown(self):
+        rmtree(self.directory, ignore_errors=True)
+
+    def test_read(self):
+        w = Waterfall(self.path)
+        self.assertEqual(w.data['nchan'], 64)
+        self.assertEqual(w.data['samp_rate'], 48000)
+        self.assertEqual(w.data['data'].shape, (2500,))
+        self.assertIsInstance(w.data['data'], np.memmap)
+        np.testing.assert_array_equal(w.data['data']['spec'], self.spec)
+        self.assertEqual(len(w.data['freq']), 64)
+        self.assertEqual(len(w.data['trel']), 2500)
+
+    def test_statistics(self):
+        statistics = Waterfall(self.path).get_statistics()
+        valid = self.spec[self.spec > -200.0].astype(np.float64)
+        self.assertEqual(statistics.count, valid.size)
+        self.assertAlmostEqual(statistics.mean, np.mean(valid), places=6)
+        self.assertAlmostEqual(statistics.std, np.std(valid), places=6)
+        self.assertEqual(statistics.tmin, 0)
+        self.assertEqual(statistics.tmax, 2499 * 100000)
+        self.assertAlmostEqual(statistics.percentile(50), np.median(valid), delta=waterfall.SKETCH_RESOLUTION)
+
+    def test_statistics_merge(self):
+        # The statistics of live data (e.g. the separate parts of the file) are merged
+        first = waterfall.SpectrumStatistics(64)
+        first.update(self.spec[:1000], np.arange(1000))
+        second = waterfall.SpectrumStatistics(64)
+        second.update(self.spec[1000:], np.arange(1000, 2500))
+        first.merge(second)
+
+        expected = Waterfall(self.path).get_statistics()
+        self.assertEqual(first.count, expected.count)
+        self.assertAlmostEqual(first.mean, expected.mean, places=9)
+        self.assertAlmostEqual(first.std, expected.std, places=9)
+        self.assertEqual((first.tmin, first.tmax), (0, 2499))
+        np.testing.assert_array_equal(first.sketch.counts, expected.sketch.counts)
+
+    def test_value_range(self):
+        w = Waterfall(self.path)
+        statistics = w.get_statistics()
+        vmin, vmax = w.get_value_range()
+        self.assertAlmostEqual(vmin, statistics.mean - 2.0 * statistics.std)
+        self.assertAlmostEqual(vmax, statistics.mean + 4.0 * statistics.std)
+
+        valid = self.spec[self.spec > -200.0]
+        vmin, vmax = w.get_value_range(robust=True)
+        self.assertAlmostEqual(vmin, np.percentile(valid, 2.5), delta=waterfall.SKETCH_RESOLUTION)
+        self.assertAlmostEqual(vmax, np.percentile(valid, 99.9), delta=waterfall.SKETCH_RESOLUTION)
+
+        self.assertEqual(w.get_value_range(vmin=-90)[0], -90)
+
+    def test_compressed(self):
+        w = Waterfall(self.path)
+        # Finite spectrum, the same as the original implementation
+        w.data['data'] = np.array(w.data['data'])
+        w.data['data']['spec'][10, :5] = -80.0
+        spec = w.data['data']['spec']
+        std = np.std(spec, axis=0)
+        offset = np.mean(spec, axis=0) + waterfall.OFFSET_IN_STDS * std
+        scale = waterfall.SCALE_IN_STDS * std / 255.0
+        expected = np.clip((spec - offset) / scale, 0.0, 255.0).astype('uint8')
+
+        compressed = w.get_compressed()
+
+        np.testing.assert_allclose(compressed['offset'], offset, rtol=1e-5)
+        np.testing.assert_allclose(compressed['scale'], scale, rtol=1e-5)
+        self.assertLessEqual(np.max(np.abs(compressed['values'].astype(int) - expected)), 1)
+
+    def test_downsampled(self):
+        w = Waterfall(self.path)
+        self.spec[10, :5] = -80.0
+        w.data['data'] = np.array(w.data['data'])
+        w.data['data']['spec'][10, :5] = -80.0
+
+        downsampled = w.get_downsampled(1000)
+        # 2500 rows, 3 rows per output row
+        self.assertEqual(downsampled.shape, (834, 64))
+        np.testing.assert_allclose(downsampled[0], self.spec[0:3].mean(axis=0), rtol=1e-5)
+        np.testing.assert_allclose(downsampled[-1], self.spec[2499:].mean(axis=0), rtol=1e-5)
+
+        self.assertEqual(w.get_downsampled(5000).shape, (2500, 64))
+
+    def test_incomplete_record_is_skipped(self):
+        with open(self.path, "ab") as f:
+            f.write(b"\0" * 100)
+        self.assertEqual(Waterfall(self.path).data['data'].shape, (2500,))
+
+    def test_empty_file(self):
+        write_waterfall(self.path, np.zeros((0, 64), dtype=np.float32))
+        self.assertRaises(EOFError, Waterfall, self.path)
+
+    def test_plot(self):
+        from matplotlib.pyplot import imread
+        figure_path = os.path.join(self.directory, "waterfall.png")
+        Waterfall(self.path).plot(figure_path)
+        image = imread(figure_path)
+        self.assertEqual(image.shape, (waterfall.RASTER_HEIGHT, waterfall.RASTER_WIDTH, 3))
+
+    def test_plot_annotated(self):
+        figure_path = os.path.join(self.directory, "waterfall.png")
+        Waterfall(self.path).plot(figure_path, annotated=True)
+        self.assertGreater(os.path.getsize(figure_path), 0)
+
+
+class TestRender(unittest.TestCase):
+    def test_lut_same_as_matplotlib(self):
+        import matplotlib
+        expected = matplotlib.colormaps['Greens'](np.linspace(0.0, 1.0, 256), bytes=True)[:, :3]
+        lut = waterfall.get_colormap_lut()
+        self.assertEqual(lut.shape, (256, 3))
+        self.assertLessEqual(np.max(np.abs(lut.astype(int) - expected)), 1)
+
+    def test_render(self):
+        spectra = np.repeat(np.linspace(-100, -50, 10)[:, None], 4, axis=1)
+        spectra[0, 0] = np.nan
+        lut = waterfall.get_colormap_lut()
+
+        image = waterfall.render(spectra, -100, -50, width=8, height=20)
+
+        self.assertEqual(image.shape, (20, 8, 3))
+        self.assertEqual(image.dtype, np.uint8)
+        # The first row is at the bottom, as in the annotated plot
+        np.testing.assert_array_equal(image[-1, :], np.repeat(lut[:1], 8, axis=0))
+        np.testing.assert_array_equal(image[0, :], np.repeat(lut[-1:], 8, axis=0))
+
+    def test_render_narrow_carrier(self):
+        spectra = np.full((10, 1024), -100.0)
+        spectra[:, 333] = -50
+        lut = waterfall.get_colormap_lut()
+
+        image = waterfall.render(spectra, -100, -50, width=100, height=10)
+
+        # The channel is drawn, although the image is 10 times narrower
+        column = 333 * 100 // 1024
+        np.testing.assert_array_equal(image[:, column], np.repeat(lut[-1:], 10, axis=0))
+        self.assertEqual(np.count_nonzero(np.all(image == lut[-1], axis=2)), 10)
+
+    def test_write_png(self):
+        from matplotlib.pyplot import imread
+        directory = tempfile.mkdtemp()
+        try:
+            rgb = np.random.default_rng(0).integers(0, 256, size=(30, 20, 3), dtype=np.uint8)
+            path = os.path.join(directory, "rgb.png")
+            write_png(path, rgb)
+            np.testing.assert_array_equal(np.round(imread(path) * 255).astype(np.uint8), rgb)
+
+            gray = rgb[:, :, 0]
+            path = os.path.join(directory, "gray.png")
+            write_png(path, gray)
+            np.testing.assert_array_equal(np.round(imread(path) * 255).astype(np.uint8), gray)
+        finally:
+            rmtree(directory, ignore_errors=True)
+
+
+class TestLiveWaterfall(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "waterfall.dat")
+        self.spec = np.random.default_rng(4321).normal(-80, 5, size=(2500, 64)).astype(np.float32)
+        write_waterfall(self.path, self.spec)
+        with open(self.path, "rb") as f:
+            self.data = f.read()
+
+    def tearDown(self):
+        rmtree(self.directory, ignore_errors=True)
+
+    def assertDownsampled(self, live, spec):
+        rows = live.get_downsampled()
+        factor = live.factor
+        complete = spec.shape[0] // factor
+        self.assertLessEqual(rows.shape[0], live.max_rows)
+        self.assertEqual(rows.shape[0], -(-spec.shape[0] // factor))
+        expected = spec[:complete * factor].reshape(complete, factor, -1).mean(axis=1)
+        np.testing.assert_allclose(rows[:complete], expected, rtol=1e-5)
+        if complete != rows.shape[0]:
+            np.testing.assert_allclose(rows[-1], spec[complete * factor:].mean(axis=0), rtol=1e-5)
+
+    def test_feed(self):
+        live = waterfall.LiveWaterfall(max_rows=100)
+        rng = np.random.default_rng(0)
+        position = 0
+        while position < len(self.data):
+            size = int(rng.integers(1, 20000))
+            live.feed(self.data[position:position + size])
+            position += size
+            if live.header is not None:
+                received = (position - waterfall.HEADER_DTYPE.itemsize) // waterfall.get_record_dtype(64).itemsize
+                self.assertEqual(live.nint, min(received, 2500))
+                if received > 0:
+                    self.assertDownsampled(live, self.spec[:received])
+
+        self.assertEqual(live.header['nchan'], 64)
+        self.assertEqual(live.factor, 32)
+        expected = Waterfall(self.path).get_statistics()
+        self.assertEqual(live.statistics.count, expected.count)
+        self.assertAlmostEqual(live.statistics.mean, expected.mean, places=9)
+
+    def test_empty(self):
+        live = waterfall.LiveWaterfall()
+        live.feed(self.data[:10])
+        self.assertIsNone(live.header)
+        live.feed(self.data[10:waterfall.HEADER_DTYPE.itemsize])
+        self.assertRaises(EOFError, live.get_downsampled)
+
+    def test_follow(self):
+        import threading
+        growing_path = os.path.join(self.directory, "growing.dat")
+        figure_path = os.path.join(self.directory, "waterfall.png")
+        finished = threading.Event()
+
+        def write():
+            with open(growing_path, "wb") as f:
+                for position in range(0, len(self.data), 50000):
+                    f.write(self.data[position:position + 50000])
+                    f.flush()
+                    time.sleep(0.01)
+            finished.set()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        live = waterfall.LiveWaterfall(max_rows=500)
+        live.follow(growing_path, lambda: not finished.is_set(), figure_path,
+                    plot_interval_s=0.0, poll_interval_s=0.005)
+        writer.join()
+
+        self.assertEqual(live.nint, 2500)
+        self.assertDownsampled(live, self.spec)
+        # No temporary files are left
+        self.assertEqual(sorted(os.listdir(self.directory)), ["growing.dat", "waterfall.dat", "waterfall.png"])
+
+    def test_read_stream(self):
+        import io
+        figure_path = os.path.join(self.directory, "waterfall.png")
+        live = waterfall.LiveWaterfall()
+        live.read_stream(io.BytesIO(self.data), block_size=1000)
+        live.plot(figure_path)
+
+        self.assertEqual(live.factor, 2)
+        self.assertDownsampled(live, self.spec)
+        self.assertGreater(os.path.getsize(figure_path), 0)
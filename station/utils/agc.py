@@ -0,0 +1,60 @@
+"""
+Automatic gain control of the streamed samples. It replaces the two-pass
+normalization (e.g. "sox gain -n"), which needs the whole signal before
+the first sample is written. The gain follows the running estimate of the
+peak level: it drops immediately when the signal gets stronger (attack)
+and rises slowly when the signal fades (release).
+"""
+
+import numpy as np
+
+# Peak level of the output (full scale of 16-bit samples with the headroom)
+TARGET_LEVEL = 0.9 * 32767
+# Time constant (in seconds) of the gain increase after the signal fades
+RELEASE_S = 5.0
+# The gain of the silence (e.g. before AOS) isn't increased above this value
+MAX_GAIN = 100.0
+
+
+class RunningGain():
+    """
+    Streaming normalization to the target peak level. The gain is constant
+    within the chunk, except the linear ramp from the previous gain, so the
+    output has no steps at the chunk boundaries.
+
+    :param sample_rate: Number of samples (frames of all channels) per second
+    :param target: Peak level of the output
+    :param release_s: Time constant of the peak estimate decay (in seconds)
+    :param max_gain: Maximal gain
+    """
+
+    def __init__(self, sample_rate: int, target: float = TARGET_LEVEL, release_s: float = RELEASE_S,
+                 max_gain: float = MAX_GAIN):
+        self.sample_rate = sample_rate
+        self.target = target
+        self.release_s = release_s
+        self.max_gain = max_gain
+        self.peak = 0.0
+        self.gain = None
+        self.count = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Returns the normalized samples (float, the same shape), clipped to the
+        target level. The samples are 1-D array or frames x channels.
+        """
+        if samples.size == 0:
+            return np.zeros(samples.shape)
+        decay = np.exp(-samples.shape[0] / (self.sample_rate * self.release_s))
+        self.peak = max(float(np.max(np.abs(samples))), self.peak * decay)
+        gain = min(self.target / self.peak, self.max_gain) if self.peak > 0 else self.max_gain
+        previous = gain if self.gain is None else self.gain
+        # Attack without the ramp, so the stronger chunk isn't clipped
+        if gain < previous:
+            previous = gain
+        ramp = np.linspace(previous, gain, samples.shape[0], endpoint=False) if previous != gain else gain
+        if samples.ndim > 1:
+            ramp = np.reshape(ramp, (-1,) + (1,) * (samples.ndim - 1))
+        self.gain = gain
+        self.count += samples.shape[0]
+        return np.clip(samples * ramp, -self.target, self.target)
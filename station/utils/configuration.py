@@ -1,10 +1,22 @@
+import logging
 import os
 import shutil
 
 import yaml
 
 from utils.models import Configuration
-from utils.globalvars import CONFIG_PATH
+from utils.globalvars import CONFIG_PATH, MAX_LOGGING
+
+
+def _set_log_level(config: Configuration):
+    """Sets the logging level from the config (unless the max logging is enabled)."""
+    if MAX_LOGGING:
+        return
+    try:
+        level = logging._nameToLevel[config["logging"]["level"]]  # type: ignore
+    except (KeyError, TypeError):
+        return
+    logging.getLogger().setLevel(level)
 
 
 def open_config() -> Configuration:
@@ -19,7 +31,9 @@ def open_config() -> Configuration:
         print("WARNING: config file (%s) was missing, generated using template." % config_path)
 
     with open(config_path) as f:
-        return yaml.safe_load(f)  # type: ignore
+        config = yaml.safe_load(f)
+    _set_log_level(config)
+    return config  # type: ignore
 
 
 def save_config(config: Configuration):
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+
+def _get_mode(path: str) -> int:
+    '''Return permissions of existing file, default permissions for new file otherwise'''
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        # The umask can be read only by setting it
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def atomic_write(path: str, data: bytes):
+    '''
+    Write data to file. Data is written to temporary file in the same
+    directory and then renamed, so readers never see the partial content.
+    The file keeps its permissions (new file gets the default ones, not
+    0600 of the temporary file).
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path), suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, _get_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
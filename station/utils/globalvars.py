@@ -1,6 +1,5 @@
 import os
 import logging
-import yaml
 
 # The DEV_ENVIRONMENT controls whether the code is run in development
 # environment, so it uses files in more convenient locations. Also,
@@ -30,25 +29,17 @@ if CONFIG_DIRECTORY is None:
 CONFIG_PATH = os.path.join(CONFIG_DIRECTORY, "config.yml")
 LOG_FILE = os.path.join(CONFIG_DIRECTORY, "log") if not DEV_ENVIRONMENT else None
 METADATA_FILE = os.path.join(CONFIG_DIRECTORY, "metadata.json")
+PLANNER_STATE_FILE = os.path.join(CONFIG_DIRECTORY, "planner.json")
 
 if not os.path.exists(CONFIG_DIRECTORY):
     os.makedirs(CONFIG_DIRECTORY, exist_ok=True)
 
 
 # Loglevel is a bit complicated. By default, it's ERROR, unless it's set in the config file,
-# unless it's a dev environment which is then DEBUG.
-loglevel = logging.ERROR
-
-try:
-    with open(CONFIG_PATH) as f:
-        config = yaml.safe_load(f)  # type: ignore
-        lv = config["logging"]["level"]
-        loglevel = logging._nameToLevel[lv]
-except Exception:
-    pass
-
-if MAX_LOGGING:
-    loglevel = logging.DEBUG
+# unless it's a dev environment which is then DEBUG. The config file isn't parsed here
+# (it's slow), the level from the config is applied when the config is opened
+# (see utils.configuration.open_config).
+loglevel = logging.DEBUG if MAX_LOGGING else logging.ERROR
 
 
 logging.basicConfig(level=loglevel,
@@ -0,0 +1,282 @@
+"""
+Instrumentation of the recipe execution. It records the resource usage of
+the recipe phases (capture, process, see recipes.factory) and of each
+external tool called through "sh" (see recipes.helpers.set_sh_defaults):
+
+- wall time (seconds),
+- CPU time (user + system, seconds),
+- max RSS (peak resident set size, kB), only of the tools,
+- bytes written to the storage.
+
+The records are appended to timings.json in the observation directory
+(the phases are executed by the different processes) and merged into the
+observation metadata, so they reach the server.
+
+The resource usage of each external tool is sampled from /proc/<pid> while
+the tool runs (Linux), so the concurrent tools (e.g. the pipeline
+"rtl_fm | sox", the receptions in the station daemon) aren't charged with
+the usage of each other. The samples are taken more and more rarely (at
+most every MAX_SAMPLE_INTERVAL_S), so the values are the lower bounds: the
+usage after the last sample isn't included. The CPU time includes the
+processes started and waited for by the tool. The usage is null if it
+isn't available.
+
+The stage includes the CPU time and the writes of the calling thread (not
+of the other threads of the station) and of the commands recorded during
+the stage.
+"""
+
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import resource
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.files import atomic_write
+
+TIMINGS_FILE = "timings.json"
+# Lock of the timings file, the phases may append the records concurrently
+TIMINGS_LOCK_FILE = ".timings.lock"
+
+# Intervals (seconds) of sampling the usage of the tool. The interval is
+# doubled after each sample, so the short tools are sampled too.
+FIRST_SAMPLE_INTERVAL_S = 0.05
+MAX_SAMPLE_INTERVAL_S = 1.0
+
+Record = Dict[str, Any]
+
+# Usage of the calling thread only (Linux), of the whole process otherwise
+_RUSAGE_THREAD = getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF)
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _get_usage(who: int):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime, usage.ru_oublock
+
+
+def _read_proc_fields(path: str) -> Dict[str, str]:
+    """Reads "name: value" lines of the /proc file"""
+    with open(path) as f:
+        return dict(line.split(":", 1) for line in f if ":" in line)
+
+
+class _ProcessSampler():
+    """Samples the resource usage of the running process from /proc/<pid>"""
+
+    def __init__(self):
+        self.cpu_s: Optional[float] = None
+        self.max_rss_kb: Optional[int] = None
+        self.bytes_written: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, pid: int):
+        if self._stopped.is_set():
+            return
+        self._thread = threading.Thread(target=self._run, args=(pid,), name="usage-%d" % (pid,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the sampling. Call it when the process is finished."""
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self, pid: int):
+        interval = FIRST_SAMPLE_INTERVAL_S
+        while self._sample(pid) and not self._stopped.wait(interval):
+            interval = min(interval * 2, MAX_SAMPLE_INTERVAL_S)
+
+    def _sample(self, pid: int) -> bool:
+        """Returns False if the process doesn't exist (anymore)"""
+        try:
+            with open("/proc/%d/stat" % (pid,)) as f:
+                # The fields after the command name (in parentheses), from the state
+                fields = f.read().rsplit(")", 1)[1].split()
+            # utime, stime, cutime, cstime
+            self.cpu_s = sum(int(v) for v in fields[11:15]) / _CLOCK_TICKS
+            status = _read_proc_fields("/proc/%d/status" % (pid,))
+            # The peak of the executed tool (the counter is reset by exec)
+            if "VmHWM" in status:
+                rss = int(status["VmHWM"].split()[0])
+                self.max_rss_kb = rss if self.max_rss_kb is None else max(self.max_rss_kb, rss)
+            try:
+                self.bytes_written = int(_read_proc_fields("/proc/%d/io" % (pid,))["write_bytes"])
+            except PermissionError:
+                # /proc/<pid>/io may be restricted
+                pass
+        except (OSError, ValueError, IndexError, KeyError):
+            return False
+        return True
+
+
+class Recorder():
+    """
+    Collects the records of the observation directory. The records are
+    appended to the timings file by write.
+
+    :param directory: Observation (working) directory
+    :param phase: Name of the recipe phase, stored in the command records
+    """
+
+    def __init__(self, directory: str, phase: Optional[str] = None):
+        self.directory = directory
+        self.path = os.path.join(directory, TIMINGS_FILE)
+        self.phase = phase
+        self.stages: List[Record] = []
+        self.commands: List[Record] = []
+        # The commands finish in the threads of "sh"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, commands: Optional[List[Record]] = None) -> Iterator[List[Record]]:
+        """
+        Measures the stage executed in the calling thread. It yields the
+        list, the records of the commands executed in the stage may be added
+        to it (their CPU time and writes are included in the stage).
+        """
+        if commands is None:
+            commands = []
+        start = time.monotonic()
+        cpu_before, blocks_before = _get_usage(_RUSAGE_THREAD)
+        try:
+            yield commands
+        finally:
+            cpu_after, blocks_after = _get_usage(_RUSAGE_THREAD)
+            cpu = cpu_after - cpu_before + sum(c["cpu_s"] or 0.0 for c in commands)
+            # ru_oublock counts 512-byte blocks
+            written = (blocks_after - blocks_before) * 512 + sum(c["bytes_written"] or 0 for c in commands)
+            record = {
+                "name": name,
+                "wall_s": round(time.monotonic() - start, 3),
+                "cpu_s": round(cpu, 3),
+                "bytes_written": written
+            }
+            with self._lock:
+                self.stages.append(record)
+
+    def wrap(self, sh):
+        """Returns "sh" (module or baked), which records the executed commands"""
+        return _InstrumentedSh(sh, self)
+
+    def _run(self, command, args, kwargs):
+        name = os.path.basename(str(command))
+        start = time.monotonic()
+        done = kwargs.get("_done")
+        sampler = _ProcessSampler()
+
+        # Called when the process is finished, also for the background and piped commands
+        def on_done(cmd, success, exit_code):
+            sampler.stop()
+            record = {
+                "name": name,
+                "wall_s": round(time.monotonic() - start, 3),
+                "cpu_s": round(sampler.cpu_s, 3) if sampler.cpu_s is not None else None,
+                "max_rss_kb": sampler.max_rss_kb,
+                "bytes_written": sampler.bytes_written,
+                "phase": self.phase,
+                "exit_code": exit_code
+            }
+            with self._lock:
+                self.commands.append(record)
+            if done is not None:
+                done(cmd, success, exit_code)
+
+        kwargs = dict(kwargs, _done=on_done)
+        # The foreground command is started in the background, so the process
+        # is sampled while it runs, and then waited for.
+        foreground = not any(kwargs.get(k) for k in ("_bg", "_piped", "_iter", "_iter_noblock", "_fg"))
+        if foreground:
+            kwargs.update(_bg=True, _bg_exc=False)
+        running = command(*args, **kwargs)
+        sampler.start(running.pid)
+        if not foreground:
+            return running
+        running.wait()
+        return running if kwargs.get("_return_cmd") else str(running)
+
+    def write(self):
+        """Appends the new records to the timings file"""
+        with self._lock:
+            stages, self.stages = self.stages, []
+            commands, self.commands = self.commands, []
+        if len(stages) == 0 and len(commands) == 0:
+            return
+        with open(os.path.join(self.directory, TIMINGS_LOCK_FILE), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                timings = load(self.directory)
+                timings["stages"] += stages
+                timings["commands"] += commands
+                atomic_write(self.path, json.dumps(timings, indent=4).encode())
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class _InstrumentedCommand():
+    def __init__(self, command, recorder: Recorder):
+        self._command = command
+        self._recorder = recorder
+
+    def __call__(self, *args, **kwargs):
+        return self._recorder._run(self._command, args, kwargs)
+
+    def bake(self, *args, **kwargs):
+        return _InstrumentedCommand(self._command.bake(*args, **kwargs), self._recorder)
+
+    def __str__(self):
+        return str(self._command)
+
+
+class _InstrumentedSh():
+    """Proxy of "sh" - the commands are instrumented, other attributes (e.g. exceptions) are unchanged"""
+
+    def __init__(self, sh, recorder: Recorder):
+        self._sh = sh
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self._sh, name)
+        # The commands of the baked "sh" aren't instances of sh.Command
+        if callable(attribute) and hasattr(attribute, "bake") and not isinstance(attribute, type):
+            return _InstrumentedCommand(attribute, self._recorder)
+        return attribute
+
+    def bake(self, *args, **kwargs):
+        return _InstrumentedSh(self._sh.bake(*args, **kwargs), self._recorder)
+
+
+def load(directory: str) -> Dict[str, List[Record]]:
+    """Returns the records from the timings file in the directory (empty if missing)"""
+    try:
+        with open(os.path.join(directory, TIMINGS_FILE)) as f:
+            timings = json.load(f)
+    except (FileNotFoundError, ValueError):
+        timings = {}
+    return {
+        "stages": timings.get("stages", []),
+        "commands": timings.get("commands", [])
+    }
+
+
+@contextmanager
+def stage(directory: str, name: str) -> Iterator[None]:
+    """
+    Measures the stage and appends the record to the timings file in the
+    directory. The commands written to the file during the stage (e.g. by
+    the recipe, see recipes.helpers.set_sh_defaults) are included in it.
+    """
+    recorder = Recorder(directory)
+    recorded = len(load(directory)["commands"])
+    try:
+        with recorder.stage(name) as commands:
+            try:
+                yield
+            finally:
+                commands += load(directory)["commands"][recorded:]
+    finally:
+        recorder.write()
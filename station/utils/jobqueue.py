@@ -0,0 +1,181 @@
+"""
+Persistent FIFO queue of jobs, stored as JSON files in the directory.
+It survives the station restarts and may be shared by the processes
+(e.g. the receiver cron jobs). Each state of the job is a subdirectory
+and the job is moved between them atomically (rename).
+
+Only one process at a time drains the queue - it holds the lock (see
+JobQueue.lock). The jobs left in "running" belong to the process that
+crashed, so they are returned to "pending" when the lock is acquired. The
+interrupted job is retried at most MAX_ATTEMPTS times, then it fails (it
+may be the cause of the crash). The finished jobs are removed, only the
+last MAX_FAILED_JOBS failed ones are kept for the inspection.
+"""
+
+import datetime
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.files import atomic_write
+from utils.globalvars import CONFIG_DIRECTORY
+
+QUEUE_DIRECTORY = os.path.join(CONFIG_DIRECTORY, "queue")
+
+PENDING = "pending"
+RUNNING = "running"
+FAILED = "failed"
+
+# Number of the attempts of the job interrupted by the crash of the worker
+MAX_ATTEMPTS = 3
+# Number of the failed jobs kept in the queue, the oldest ones are removed
+MAX_FAILED_JOBS = 100
+
+Job = Dict[str, Any]
+
+
+class JobQueue:
+    """
+    :param directory: Directory of the queue, created if it doesn't exist
+    """
+
+    def __init__(self, directory: str = QUEUE_DIRECTORY, max_failed: int = MAX_FAILED_JOBS):
+        self.directory = directory
+        self.max_failed = max_failed
+        for state in (PENDING, RUNNING, FAILED):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state: str, job_id: str) -> str:
+        return os.path.join(self.directory, state, job_id + ".json")
+
+    def _list(self, state: str) -> List[str]:
+        names = os.listdir(os.path.join(self.directory, state))
+        return sorted(n[:-len(".json")] for n in names if n.endswith(".json"))
+
+    def _write(self, state: str, job_id: str, job: Job):
+        # Written under the temporary name, so the drainer never reads incomplete file
+        atomic_write(self._path(state, job_id), json.dumps(job, indent=4).encode())
+
+    def put(self, job: Job) -> str:
+        """
+        Adds the job to the queue. The enqueue time (naive UTC, ISO format) is
+        stored in the "enqueued" field.
+
+        :return: Job identifier, the jobs are ordered by it
+        """
+        now = datetime.datetime.utcnow()
+        job_id = now.strftime("%Y%m%dT%H%M%S%f") + "-" + uuid.uuid4().hex[:8]
+        self._write(PENDING, job_id, dict(job, id=job_id, enqueued=now.isoformat()))
+        return job_id
+
+    def depth(self) -> int:
+        """Returns the number of the pending jobs."""
+        return len(self._list(PENDING))
+
+    def running(self) -> int:
+        """Returns the number of the jobs in progress."""
+        return len(self._list(RUNNING))
+
+    def claim(self) -> Optional[Tuple[str, Job]]:
+        """
+        Moves the oldest pending job to "running".
+
+        :return: Job identifier and the job, None if the queue is empty
+        """
+        for job_id in self._list(PENDING):
+            path = self._path(RUNNING, job_id)
+            try:
+                os.replace(self._path(PENDING, job_id), path)
+            except FileNotFoundError:
+                continue
+            with open(path) as f:
+                return job_id, json.load(f)
+        return None
+
+    def done(self, job_id: str):
+        """Removes the finished job."""
+        os.remove(self._path(RUNNING, job_id))
+
+    def _update(self, job_id: str, state: str, **fields: Any) -> Job:
+        """
+        Updates the fields of the running job and moves it to the state. The
+        updated job is written to the state first, so the crash leaves the
+        complete job in "running" (see recover).
+        """
+        path = self._path(RUNNING, job_id)
+        with open(path) as f:
+            job = json.load(f)
+        job.update(fields)
+        self._write(state, job_id, job)
+        os.remove(path)
+        if state == FAILED:
+            self._prune_failed()
+        return job
+
+    def _prune_failed(self):
+        """Removes the oldest failed jobs above the limit."""
+        failed = self._list(FAILED)
+        for job_id in failed[:max(len(failed) - self.max_failed, 0)]:
+            try:
+                os.remove(self._path(FAILED, job_id))
+            except FileNotFoundError:
+                pass
+
+    def fail(self, job_id: str, error: str):
+        """Moves the job to "failed", with the error description."""
+        self._update(job_id, FAILED, error=error)
+
+    def retry(self, job_id: str, error: str, max_attempts: int = MAX_ATTEMPTS) -> bool:
+        """
+        Returns the interrupted job to "pending", unless it was attempted
+        max_attempts times - then it is moved to "failed".
+
+        :return: True if the job is returned to "pending"
+        """
+        path = self._path(RUNNING, job_id)
+        with open(path) as f:
+            attempts = json.load(f).get("attempts", 0) + 1
+        if attempts >= max_attempts:
+            self._update(job_id, FAILED, attempts=attempts, error=error)
+            return False
+        self._update(job_id, PENDING, attempts=attempts, error=error)
+        return True
+
+    def recover(self, max_attempts: int = MAX_ATTEMPTS) -> Tuple[int, int]:
+        """
+        Returns the interrupted jobs to "pending" (see retry). Call it only
+        with the lock held.
+
+        :return: Number of the jobs returned to "pending" and of the failed ones
+        """
+        returned = failed = 0
+        for job_id in self._list(RUNNING):
+            if any(os.path.exists(self._path(state, job_id)) for state in (PENDING, FAILED)):
+                # The crash after the job was moved, before the running copy was removed
+                os.remove(self._path(RUNNING, job_id))
+                continue
+            if self.retry(job_id, "Interrupted", max_attempts):
+                returned += 1
+            else:
+                failed += 1
+        return returned, failed
+
+    @contextmanager
+    def lock(self) -> Iterator[bool]:
+        """
+        Tries to acquire the exclusive lock of the queue (without waiting).
+        Yields True if it is acquired, False if another process holds it.
+        """
+        with open(os.path.join(self.directory, "lock"), "w") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
@@ -1,5 +1,5 @@
 import sys
-from typing import List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 from utils.functional import first
 
@@ -11,7 +11,10 @@ else:
 
 SATELLITE_SAVE_MODE = Literal["SIGNAL", "PRODUCT", "ALL", "INHERIT", "NONE"]
 GLOBAL_SAVE_MODE = Literal["SIGNAL", "PRODUCT", "ALL", "NONE"]
-STRATEGY = Literal["max-elevation", "aos"]
+STRATEGY = Literal["max-elevation", "aos", "optimal"]
+WEIGHT = Literal["elevation", "duration"]
+PREDICTION = Literal["batch", "iterative"]
+PLANNING = Literal["full", "incremental"]
 
 
 class LocationConfiguration(TypedDict):
@@ -31,6 +34,7 @@ class SatelliteConfiguration(TypedDict, total=False):
     disabled: Optional[bool]
     recipe: Optional[str]
     rate: Optional[str]
+    priority: Optional[float]
 
 
 class ServerConfiguration(TypedDict):
@@ -39,6 +43,13 @@ class ServerConfiguration(TypedDict):
     url: str
 
 
+class ProcessingConfiguration(TypedDict, total=False):
+    workers: int
+    nice: int
+    cpus: Optional[List[int]]
+    skip_empty: bool
+
+
 class Configuration(TypedDict):
     aos_at: int
     location: LocationConfiguration
@@ -48,6 +59,13 @@ class Configuration(TypedDict):
     save_to_disk: Optional[GLOBAL_SAVE_MODE]
     server: ServerConfiguration
     strategy: Optional[STRATEGY]
+    weight: Optional[WEIGHT]
+    prediction: Optional[PREDICTION]
+    planning: Optional[PLANNING]
+    receivers: Optional[List[str]]
+    processing: Optional[ProcessingConfiguration]
+    # Options of the recipes by recipe name, see recipes.factory.get_recipe_options
+    recipes: Optional[Dict[str, Dict[str, Any]]]
     submit: Optional[bool]
     obsdir: Optional[str]
 
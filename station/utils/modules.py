@@ -1,7 +1,8 @@
+import ast
 import importlib
 import os
 from types import ModuleType
-from typing import Callable, Iterable, Optional, Tuple
+from typing import Any, Callable, Iterable, Optional, Tuple
 
 
 def get_module_in_directory(directory: str, name: str) -> Optional[ModuleType]:
@@ -77,3 +78,45 @@ def get_names_of_modules_with_function_in_directory(directory: str, function_nam
         full_module_name = module.__name__
         *_, name = full_module_name.rsplit('.')
         yield name
+
+
+def get_constant_in_module_file(directory: str, name: str, constant_name: str) -> Optional[Any]:
+    '''
+    Return value of module-level constant with given name in module in directory,
+    without importing the module (the source is parsed). The value must be
+    a literal (e.g. dict of strings and numbers). Return None if the module or
+    the constant doesn't exist or the value isn't a literal.
+    '''
+    path = os.path.join(directory, name + ".py")
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        if any(isinstance(t, ast.Name) and t.id == constant_name for t in targets):
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                return None
+    return None
+
+
+def get_constants_in_directory(directory: str, constant_name: str) -> Iterable[Tuple[str, Any]]:
+    '''
+    Find module-level constants with given name in modules from specific
+    directory, without importing them (see get_constant_in_module_file).
+    Return iterator of tuples with module name (relative to directory) and value.
+    '''
+    for filename in sorted(os.listdir(directory)):
+        base, ext = os.path.splitext(filename)
+        if ext != '.py':
+            continue
+        value = get_constant_in_module_file(directory, base, constant_name)
+        if value is not None:
+            yield base, value
@@ -0,0 +1,52 @@
+"""
+Minimal PNG writer (8-bit RGB or grayscale), based only on the standard
+library. It is used to save images rendered directly by NumPy, without
+the overhead of matplotlib figures.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG color types
+GRAYSCALE = 0
+RGB = 2
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(image: np.ndarray, compression: int = 6) -> bytes:
+    """
+    Encodes the image (uint8 array with shape (height, width) or
+    (height, width, 3)) as PNG. The first row is the top of the image.
+    """
+    image = np.asarray(image, dtype=np.uint8)
+    if image.ndim == 2:
+        color_type = GRAYSCALE
+    elif image.ndim == 3 and image.shape[2] == 3:
+        color_type = RGB
+    else:
+        raise ValueError("Unsupported image shape %s" % (image.shape,))
+
+    height, width = image.shape[:2]
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    # Each row starts with the filter type (0 - none)
+    rows = image.reshape(height, -1)
+    raw = np.empty((height, rows.shape[1] + 1), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = rows
+
+    return PNG_SIGNATURE + \
+        _chunk(b"IHDR", header) + \
+        _chunk(b"IDAT", zlib.compress(raw.tobytes(), compression)) + \
+        _chunk(b"IEND", b"")
+
+
+def write_png(path: str, image: np.ndarray, compression: int = 6):
+    """Writes the image (see encode_png) to the PNG file."""
+    with open(path, "wb") as f:
+        f.write(encode_png(image, compression))
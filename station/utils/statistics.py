@@ -0,0 +1,120 @@
+"""
+Streaming statistics. The values are consumed in chunks (e.g. rows of the
+memory-mapped waterfall or the rows received during the recording), so
+the memory usage doesn't depend on the number of values. The partial
+results (e.g. from the separate chunks or workers) may be merged.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+class RunningStatistics():
+    """
+    Count, mean and variance computed with the Welford algorithm. The chunks
+    are combined with the Chan et al. parallel formula, which is numerically
+    stable (no sum of squares).
+
+    :param shape: Shape of the single value, e.g. (nchan,) for the statistics
+        of each channel or () for the statistics of all values.
+    """
+
+    def __init__(self, shape: Tuple[int, ...] = ()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def update(self, values: np.ndarray):
+        """
+        Add values to the statistics
+
+        :param values: Array with shape (n, *shape); 1-D array for the scalar statistics
+        """
+        count = values.shape[0]
+        if count == 0:
+            return
+        values = np.asarray(values, dtype=np.float64)
+        mean = values.mean(axis=0)
+        deviations = values - mean
+        self._merge(count, mean, np.einsum('i...,i...->...', deviations, deviations))
+
+    def merge(self, other: "RunningStatistics"):
+        """Add the values of other statistics"""
+        if other.count != 0:
+            self._merge(other.count, other.mean, other._m2)
+
+    def _merge(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self._m2 = self._m2 + m2 + delta * delta * (self.count * count / total)
+        self.count = total
+
+    @property
+    def variance(self):
+        """Population variance, NaN if there are no values"""
+        if self.count == 0:
+            return np.full(self.mean.shape, np.nan)[()]
+        return self._m2 / self.count
+
+    @property
+    def std(self):
+        """Population standard deviation, NaN if there are no values"""
+        return np.sqrt(self.variance)
+
+
+class QuantileSketch():
+    """
+    Approximate quantiles of the values from the fixed range, based on the
+    histogram with the constant bin width. The error is at most the bin width.
+    The values outside the range are counted in the first or the last bin.
+
+    :param low: Lower bound of the range
+    :param high: Upper bound of the range
+    :param resolution: Width of the bin
+    """
+
+    def __init__(self, low: float, high: float, resolution: float):
+        self.low = low
+        self.resolution = resolution
+        self.counts = np.zeros(int(np.ceil((high - low) / resolution)), dtype=np.int64)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def update(self, values: np.ndarray):
+        """Add values (any shape, NaN is skipped) to the sketch"""
+        values = np.ravel(values)
+        values = values[~np.isnan(values)]
+        bins = np.clip((values - self.low) / self.resolution, 0, self.counts.size - 1).astype(np.intp)
+        self.counts += np.bincount(bins, minlength=self.counts.size)
+
+    def merge(self, other: "QuantileSketch"):
+        """Add the values of other sketch with the same range and resolution"""
+        if other.low != self.low or other.resolution != self.resolution or other.counts.size != self.counts.size:
+            raise ValueError("Sketches with different bins can't be merged")
+        self.counts += other.counts
+
+    def quantile(self, q):
+        """
+        Get approximate quantile(s), interpolated within the bin
+
+        :param q: Quantile or array of quantiles in range [0, 1]
+        :return: Value(s), NaN if there are no values
+        """
+        q = np.asarray(q, dtype=np.float64)
+        cumulative = np.cumsum(self.counts)
+        total = cumulative[-1]
+        if total == 0:
+            return np.full(q.shape, np.nan)[()]
+        rank = q * total
+        index = np.minimum(np.searchsorted(cumulative, rank, side='left'), self.counts.size - 1)
+        before = cumulative[index] - self.counts[index]
+        fraction = np.where(self.counts[index] != 0, (rank - before) / np.maximum(self.counts[index], 1), 0.0)
+        return (self.low + (index + np.clip(fraction, 0.0, 1.0)) * self.resolution)[()]
+
+    def percentile(self, p):
+        """Get approximate percentile(s), see quantile"""
+        return self.quantile(np.asarray(p, dtype=np.float64) / 100.0)
@@ -1,22 +1,238 @@
 # This file is heavily based on waterfall.py from satnogs-client.
 
 
+import mmap
+import os
 import sys
-import matplotlib.pyplot as plt
-import matplotlib
+import time
 import numpy as np
 
-matplotlib.use('Agg')
+from utils.files import atomic_write
+from utils.png import encode_png, write_png
+from utils.statistics import QuantileSketch, RunningStatistics
 
 
 OFFSET_IN_STDS = -2.0
 SCALE_IN_STDS = 8.0
 
+# Number of rows processed at once. The memory used by the statistics and
+# the compression is proportional to it, not to the file size.
+CHUNK_ROWS = 1024
+# Max number of rows drawn on the plot. The figure is 2000 px tall, so more
+# rows aren't visible anyway. The consecutive rows are averaged.
+MAX_PLOT_ROWS = 2000
+# The values below are treated as no signal (e.g. -inf from log of zero)
+MIN_VALID_POWER = -200.0
+# Upper bound and resolution (dB) of the sketch of the power distribution
+MAX_SKETCH_POWER = 100.0
+SKETCH_RESOLUTION = 0.05
+# Percentiles used as the value range of the robust scaling
+ROBUST_PERCENTILES = (2.5, 99.9)
+# Size (in pixels) of the image rendered without matplotlib. It is close to
+# the plot area of the annotated (matplotlib) figure.
+RASTER_WIDTH = 800
+RASTER_HEIGHT = 1600
+
+# Interval (seconds) of writing the partial image during the reception
+LIVE_PLOT_INTERVAL_S = 60.0
+# Interval (seconds) of checking the growing data file for new rows
+LIVE_POLL_INTERVAL_S = 1.0
+
+# Anchor colors of the matplotlib 'Greens' colormap (ColorBrewer), from the lowest value
+GREENS = np.array([
+    (247, 252, 245),
+    (229, 245, 224),
+    (199, 233, 192),
+    (161, 217, 155),
+    (116, 196, 118),
+    (65, 171, 93),
+    (35, 139, 69),
+    (0, 109, 44),
+    (0, 68, 27)
+], dtype=np.float64)
+
+# Header of the waterfall data file. It is followed by the records, see get_record_dtype.
+HEADER_DTYPE = np.dtype([
+    ('timestamp', '|S32'),
+    ('nchan', '>i4'),
+    ('samp_rate', '>i4'),
+    ('nfft_per_row', '>i4'),
+    ('center_freq', '>f4'),
+    ('endianess', '>i4')
+])
+
+
+def get_record_dtype(nchan):
+    """Returns dtype of the single row (timestamp in microseconds and spectrum) of the waterfall data file."""
+    return np.dtype([('tabs', 'int64'), ('spec', 'float32', (nchan, ))])
+
+
+def _release_pages(records, start, end):
+    """
+    Drops the memory-mapped pages of the rows (already copied), so the resident
+    memory doesn't grow with the file size. No-op for arrays in memory.
+    """
+    mm = getattr(records, '_mmap', None)
+    if mm is None or not hasattr(mm, 'madvise') or not hasattr(mmap, 'MADV_DONTNEED'):
+        return
+    # The mapping starts at the offset aligned to the allocation granularity
+    base = records.offset % mmap.ALLOCATIONGRANULARITY
+    begin = base + start * records.itemsize
+    begin -= begin % mmap.PAGESIZE
+    end = min(base + end * records.itemsize, len(mm))
+    if end > begin:
+        mm.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+
+
+def get_colormap_lut(anchors=GREENS, size=256):
+    """
+    Build colormap lookup table by linear interpolation between evenly spaced anchor colors
+
+    :param anchors: RGB colors (0-255) from the lowest to the highest value
+    :param size: Number of colors
+    :return: Lookup table (size x 3)
+    :rtype: np.ndarray of uint8
+    """
+    positions = np.linspace(0.0, 1.0, len(anchors))
+    x = np.linspace(0.0, 1.0, size)
+    lut = np.stack([np.interp(x, positions, anchors[:, channel]) for channel in range(3)], axis=1)
+    return np.round(lut).astype(np.uint8)
+
+
+def render(spectra, vmin, vmax, width=RASTER_WIDTH, height=RASTER_HEIGHT, lut=None):
+    """
+    Render spectra as RGB image using the colormap lookup table. The image is
+    scaled (nearest neighbour) to the size and the first row of the spectra
+    is at the bottom (the same as the annotated plot). If the image is
+    narrower than the spectra, each pixel is the maximum of its group of
+    channels, so the narrow carriers aren't lost.
+
+    :param spectra: Spectra (rows x channels)
+    :param vmin: Value mapped to the first color of the colormap
+    :param vmax: Value mapped to the last color of the colormap
+    :return: Image (height x width x 3)
+    :rtype: np.ndarray of uint8
+    """
+    if lut is None:
+        lut = get_colormap_lut()
+    rows = np.arange(height) * spectra.shape[0] // height
+    columns = np.arange(width) * spectra.shape[1] // width
+    sampled = spectra[rows[::-1]]
+    if spectra.shape[1] > width:
+        # NaN (no data) is ignored, unless the whole group is NaN
+        sampled = np.fmax.reduceat(sampled, columns, axis=1)
+    else:
+        sampled = sampled[:, columns]
+
+    size = lut.shape[0]
+    scaled = (sampled - vmin) * (size / (vmax - vmin)) if vmax > vmin else np.zeros(sampled.shape)
+    # NaN (no data) is drawn with the lowest color, as the matplotlib background
+    indices = np.clip(np.nan_to_num(scaled, nan=0.0, posinf=size, neginf=0.0), 0, size - 1).astype(np.intp)
+    return lut[indices]
+
+
+class SpectrumStatistics():
+    """
+    Statistics of the waterfall spectra, updated with chunks of rows (from
+    the file or received live) in a single pass.
+
+    The statistics of each channel include all values (the same as in the
+    compression), the overall statistics and the percentiles include only
+    the valid values (above MIN_VALID_POWER).
+
+    :param nchan: Number of channels
+    :type nchan: int
+    """
+
+    def __init__(self, nchan):
+        self.channels = RunningStatistics((nchan, ))
+        self.valid = RunningStatistics()
+        self.sketch = QuantileSketch(MIN_VALID_POWER, MAX_SKETCH_POWER, SKETCH_RESOLUTION)
+        self.tmin = None
+        self.tmax = None
+
+    def update(self, spec, tabs):
+        """
+        Add rows to the statistics
+
+        :param spec: Spectra (rows x channels)
+        :param tabs: Timestamps of the rows (microseconds)
+        """
+        if spec.shape[0] == 0:
+            return
+        # The channel with -inf has NaN statistics, as np.mean and np.std would return
+        with np.errstate(invalid='ignore'):
+            self.channels.update(spec)
+        valid = spec[spec > MIN_VALID_POWER]
+        self.valid.update(valid)
+        self.sketch.update(valid)
+        self._update_time_range(np.min(tabs), np.max(tabs))
+
+    def merge(self, other):
+        """Add the rows of other statistics"""
+        with np.errstate(invalid='ignore'):
+            self.channels.merge(other.channels)
+        self.valid.merge(other.valid)
+        self.sketch.merge(other.sketch)
+        if other.tmin is not None:
+            self._update_time_range(other.tmin, other.tmax)
+
+    def _update_time_range(self, tmin, tmax):
+        self.tmin = tmin if self.tmin is None else min(self.tmin, tmin)
+        self.tmax = tmax if self.tmax is None else max(self.tmax, tmax)
+
+    @property
+    def count(self):
+        """Number of valid values"""
+        return self.valid.count
+
+    @property
+    def mean(self):
+        """Mean of valid values"""
+        return float(self.valid.mean) if self.count != 0 else np.nan
+
+    @property
+    def std(self):
+        """Standard deviation of valid values"""
+        return float(self.valid.std)
+
+    @property
+    def channel_mean(self):
+        return self.channels.mean
+
+    @property
+    def channel_std(self):
+        return self.channels.std
+
+    def percentile(self, p):
+        """Approximate percentile(s) of valid values"""
+        return self.sketch.percentile(p)
+
+    def get_value_range(self, robust=False):
+        """
+        Get range of values mapped to the colormap
+
+        :param robust: Use ROBUST_PERCENTILES of valid values, by default
+            the range is from -2 to +4 standard deviations around the mean
+        :return: Minimum and maximum value
+        :rtype: tuple
+        """
+        if self.count <= 100:
+            return -100, -50
+        if robust:
+            vmin, vmax = self.percentile(ROBUST_PERCENTILES)
+            return float(vmin), float(vmax)
+        return self.mean - 2.0 * self.std, self.mean + 4.0 * self.std
+
 
 class Waterfall():
     """
     Parse waterfall data file
 
+    The data file is memory-mapped and processed in chunks of rows, so
+    the memory usage doesn't depend on the file size. The statistics
+    and the compressed spectra are computed only when needed.
+
     :param datafile_path: Path to data file
     :type datafile_path: str_array
     """
@@ -27,32 +243,57 @@ class Waterfall():
         """
         self.logger = logger or sys.stdout
         self.data = self._get_waterfall(datafile_path)
+        self._statistics = None
 
-    def plot(self, figure_path, vmin=None, vmax=None):
+    def plot(self, figure_path, vmin=None, vmax=None, annotated=False, robust=False):
         """
-        Plot waterfall into a figure
+        Plot waterfall into a PNG file
 
         :param figure_path: Path of figure file to save
         :type figure_path: str
         :param value_range: Minimum and maximum value range
         :type value_range: tuple
+        :param annotated: Draw matplotlib figure with axes and colorbar (slow).
+            By default the spectra are rendered directly into the image.
+        :type annotated: bool
+        :param robust: Use percentiles instead of mean and standard deviation
+            for the automatic value range
+        :type robust: bool
+        """
+        vmin, vmax = self.get_value_range(vmin, vmax, robust)
+        if annotated:
+            self._plot_annotated(figure_path, vmin, vmax)
+        else:
+            write_png(figure_path, render(self.get_downsampled(RASTER_HEIGHT), vmin, vmax))
+
+    def get_value_range(self, vmin=None, vmax=None, robust=False):
+        """
+        Get range of values mapped to the colormap. If not specified, it is
+        based on the statistics of the valid values (see SpectrumStatistics.get_value_range).
+
+        :return: Minimum and maximum value
+        :rtype: tuple
         """
-        tmin = np.min(self.data['data']['tabs'] / 1000000.0)
-        tmax = np.max(self.data['data']['tabs'] / 1000000.0)
+        if vmin is None or vmax is None:
+            auto_vmin, auto_vmax = self.get_statistics().get_value_range(robust)
+            vmin = auto_vmin if vmin is None else vmin
+            vmax = auto_vmax if vmax is None else vmax
+        return vmin, vmax
+
+    def _plot_annotated(self, figure_path, vmin, vmax):
+        """Plot waterfall into a matplotlib figure with axes and colorbar"""
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+
+        statistics = self.get_statistics()
+        tmin = statistics.tmin / 1000000.0
+        tmax = statistics.tmax / 1000000.0
         fmin = np.min(self.data['freq'] / 1000.0)
         fmax = np.max(self.data['freq'] / 1000.0)
 
-        if vmin is None or vmax is None:
-            vmin = -100
-            vmax = -50
-            c_idx = self.data['data']['spec'] > -200.0
-            if np.sum(c_idx) > 100:
-                data_mean = np.mean(self.data['data']['spec'][c_idx])
-                data_std = np.std(self.data['data']['spec'][c_idx])
-                vmin = data_mean - 2.0 * data_std
-                vmax = data_mean + 4.0 * data_std
         plt.figure(figsize=(10, 20))
-        plt.imshow(self.data['data']['spec'],
+        plt.imshow(self.get_downsampled(),
                    origin='lower',
                    aspect='auto',
                    interpolation='None',
@@ -68,91 +309,318 @@ class Waterfall():
         plt.savefig(figure_path, bbox_inches='tight')
         plt.close()
 
-    def _read_waterfall(self, datafile_path):
+    def iter_chunks(self, chunk_rows=CHUNK_ROWS):
         """
-        Read waterfall data file
+        Iterate over the waterfall data in chunks of rows
 
-        :param datafile_path: Path to data file
-        :type datafile_path: str
-        :return: Waterfall data
-        :rtype: dict
+        :param chunk_rows: Number of rows in chunk
+        :type chunk_rows: int
+        :return: Iterator of record arrays (tabs and spec), loaded into memory
         """
+        records = self.data['data']
+        for start in range(0, records.shape[0], chunk_rows):
+            chunk = np.array(records[start:start + chunk_rows])
+            _release_pages(records, start, start + chunk.shape[0])
+            yield chunk
 
-        waterfall = {}
-
-        with open(datafile_path, mode='rb') as datafile:
-
-            waterfall = {
-                'timestamp': np.fromfile(datafile, dtype='|S32', count=1)[0],
-                'nchan': np.fromfile(datafile, dtype='>i4', count=1)[0],
-                'samp_rate': np.fromfile(datafile, dtype='>i4', count=1)[0],
-                'nfft_per_row': np.fromfile(datafile, dtype='>i4', count=1)[0],
-                'center_freq': np.fromfile(datafile, dtype='>f4', count=1)[0],
-                'endianess': np.fromfile(datafile, dtype='>i4', count=1)[0]
-            }
+    def get_statistics(self):
+        """
+        Get statistics of the spectra, computed in a single pass over chunks.
+        They are shared by the plot and the compression.
 
-            # Let's disable the logging for now.
-            # self.logger.write("Waterfall details: " + repr(waterfall) + "\n")
-            data_dtypes = np.dtype([('tabs', 'int64'), ('spec', 'float32', (waterfall['nchan'], ))])
-            waterfall['data'] = np.fromfile(datafile, dtype=data_dtypes)
-            if waterfall['data'].size == 0:
-                raise EOFError
+        :return: Statistics
+        :rtype: SpectrumStatistics
+        """
+        if self._statistics is None:
+            statistics = SpectrumStatistics(self.data['nchan'])
+            for chunk in self.iter_chunks():
+                statistics.update(chunk['spec'], chunk['tabs'])
+            self._statistics = statistics
+        return self._statistics
 
-            datafile.close()
+    def get_downsampled(self, max_rows=MAX_PLOT_ROWS):
+        """
+        Get spectra with at most max_rows rows. The consecutive rows are averaged.
 
-        return waterfall
+        :param max_rows: Max number of rows
+        :type max_rows: int
+        :return: Spectra
+        :rtype: np.ndarray
+        """
+        nint = self.data['data'].shape[0]
+        factor = -(-nint // max_rows)
+        # Chunk must be a multiple of the factor, so the averaged groups don't cross chunks
+        chunk_rows = max(CHUNK_ROWS // factor, 1) * factor
+        rows = []
+        for chunk in self.iter_chunks(chunk_rows):
+            spec = chunk['spec']
+            complete = spec.shape[0] - spec.shape[0] % factor
+            if complete != 0:
+                rows.append(spec[:complete].reshape(complete // factor, factor, -1).mean(axis=1, dtype=np.float32))
+            if complete != spec.shape[0]:
+                # The last, incomplete group
+                rows.append(spec[complete:].mean(axis=0, keepdims=True, dtype=np.float32))
+        return np.concatenate(rows)
 
-    def _compress_waterfall(self, waterfall):
+    def get_compressed(self):
         """
         Compress spectra of waterfall
 
-        :param waterfall: Watefall data
-        :type waterfall: dict
         :return: Compressed spectra
         :rtype: dict
         """
-        spec = waterfall['data']['spec']
-        std = np.std(spec, axis=0)
-        offset = np.mean(spec, axis=0) + OFFSET_IN_STDS * std
+        statistics = self.get_statistics()
+        std = statistics.channel_std
+        offset = statistics.channel_mean + OFFSET_IN_STDS * std
         scale = SCALE_IN_STDS * std / 255.0
-        values = np.clip((spec - offset) / scale, 0.0, 255.0).astype('uint8')
+
+        values = np.empty(self.data['data']['spec'].shape, dtype='uint8')
+        row = 0
+        for chunk in self.iter_chunks():
+            spec = chunk['spec']
+            values[row:row + spec.shape[0]] = np.clip((spec - offset) / scale, 0.0, 255.0)
+            row += spec.shape[0]
 
         return {'offset': offset, 'scale': scale, 'values': values}
 
+    def _read_waterfall(self, datafile_path):
+        """
+        Read waterfall data file
+
+        :param datafile_path: Path to data file
+        :type datafile_path: str
+        :return: Waterfall data, the records are memory-mapped
+        :rtype: dict
+        """
+
+        header = np.fromfile(datafile_path, dtype=HEADER_DTYPE, count=1)
+        if header.size == 0:
+            raise EOFError
+        waterfall = {name: header[name][0] for name in HEADER_DTYPE.names}
+
+        # Let's disable the logging for now.
+        # self.logger.write("Waterfall details: " + repr(waterfall) + "\n")
+        data_dtypes = get_record_dtype(waterfall['nchan'])
+        # The incomplete record at the end (the file may be still written) is skipped
+        nint = (os.path.getsize(datafile_path) - HEADER_DTYPE.itemsize) // data_dtypes.itemsize
+        if nint <= 0:
+            raise EOFError
+        waterfall['data'] = np.memmap(datafile_path, dtype=data_dtypes, mode='r',
+                                      offset=HEADER_DTYPE.itemsize, shape=(nint,))
+
+        return waterfall
+
     def _get_waterfall(self, datafile_path):
         """
         Get waterfall data
 
         :param datafile_path: Path to data file
         :type datafile_path: str_array
-        :return: Waterfall data including compressed data
+        :return: Waterfall data
         :rtype: dict
         """
         waterfall = self._read_waterfall(datafile_path)
 
-        nint = waterfall['data']['spec'].shape[0]
+        nint = waterfall['data'].shape[0]
         waterfall['trel'] = np.arange(nint) * waterfall['nfft_per_row'] * waterfall['nchan'] / float(waterfall['samp_rate'])
         waterfall['freq'] = np.linspace(-0.5 * waterfall['samp_rate'],
                                         0.5 * waterfall['samp_rate'],
                                         waterfall['nchan'],
                                         endpoint=False)
-        waterfall['compressed'] = self._compress_waterfall(waterfall)
 
         return waterfall
 
 
+class LiveWaterfall():
+    """
+    Build waterfall from the data received during the recording
+
+    The data (in the format of the waterfall data file) is read from the
+    growing file or the pipe. The rows are downsampled on the fly into the
+    fixed buffer: when it is full, the adjacent rows are averaged and the
+    next rows are grouped by twice as many. So, the memory usage doesn't
+    depend on the pass length and the partial image may be written at any
+    moment.
+
+    :param max_rows: Size of the buffer, the image has from max_rows / 2 to max_rows rows
+    :type max_rows: int
+    """
+
+    def __init__(self, max_rows=RASTER_HEIGHT):
+        self.max_rows = max_rows - max_rows % 2
+        self.header = None
+        self.statistics = None
+        self.factor = 1
+        self._rows = None
+        self._count = 0
+        self._pending_sum = None
+        self._pending_count = 0
+        self._record_dtype = None
+        self._unparsed = b""
+
+    def feed(self, data):
+        """
+        Add bytes of the data file. The incomplete header or record is kept
+        until the next call.
+
+        :param data: Next bytes of the data file
+        :type data: bytes
+        """
+        data = self._unparsed + data
+        if self.header is None:
+            if len(data) < HEADER_DTYPE.itemsize:
+                self._unparsed = data
+                return
+            header = np.frombuffer(data, dtype=HEADER_DTYPE, count=1)
+            self._start({name: header[name][0] for name in HEADER_DTYPE.names})
+            data = data[HEADER_DTYPE.itemsize:]
+
+        count = len(data) // self._record_dtype.itemsize
+        size = count * self._record_dtype.itemsize
+        self._unparsed = data[size:]
+        if count != 0:
+            records = np.frombuffer(data, dtype=self._record_dtype, count=count)
+            self.add_rows(records['spec'], records['tabs'])
+
+    def _start(self, header):
+        nchan = header['nchan']
+        self.header = header
+        self.statistics = SpectrumStatistics(nchan)
+        self._record_dtype = get_record_dtype(nchan)
+        self._rows = np.empty((self.max_rows, nchan), dtype=np.float32)
+        self._pending_sum = np.zeros(nchan)
+
+    def add_rows(self, spec, tabs):
+        """
+        Add spectra to the waterfall
+
+        :param spec: Spectra (rows x channels)
+        :param tabs: Timestamps of the rows (microseconds)
+        """
+        self.statistics.update(spec, tabs)
+        start = 0
+        while start < spec.shape[0]:
+            # Complete the pending group of rows
+            end = min(start + self.factor - self._pending_count, spec.shape[0])
+            self._pending_sum += np.sum(spec[start:end], axis=0, dtype=np.float64)
+            self._pending_count += end - start
+            start = end
+            if self._pending_count == self.factor:
+                self._append(self._pending_sum / self.factor)
+                self._pending_sum[:] = 0.0
+                self._pending_count = 0
+
+            # The complete groups at once
+            groups = min((spec.shape[0] - start) // self.factor, self.max_rows - self._count)
+            if self._pending_count == 0 and groups > 0:
+                end = start + groups * self.factor
+                self._rows[self._count:self._count + groups] = \
+                    spec[start:end].reshape(groups, self.factor, -1).mean(axis=1, dtype=np.float64)
+                self._count += groups
+                start = end
+                if self._count == self.max_rows:
+                    self._compact()
+
+    def _append(self, row):
+        self._rows[self._count] = row
+        self._count += 1
+        if self._count == self.max_rows:
+            self._compact()
+
+    def _compact(self):
+        """Average pairs of rows, the next rows are grouped by twice as many"""
+        half = self._count // 2
+        self._rows[:half] = (self._rows[0:self._count:2] + self._rows[1:self._count:2]) / 2.0
+        self._count = half
+        self.factor *= 2
+
+    @property
+    def nint(self):
+        """Number of received rows"""
+        return self._count * self.factor + self._pending_count
+
+    def get_downsampled(self):
+        """
+        Get downsampled spectra, including the incomplete group of the last rows
+
+        :return: Spectra
+        :rtype: np.ndarray
+        """
+        if self.nint == 0:
+            raise EOFError
+        rows = self._rows[:self._count]
+        if self._pending_count != 0:
+            rows = np.concatenate([rows, (self._pending_sum / self._pending_count)[None, :].astype(np.float32)])
+        return rows
+
+    def plot(self, figure_path, vmin=None, vmax=None, robust=False):
+        """
+        Plot received part of waterfall into a PNG file (see Waterfall.plot).
+        The file is replaced atomically, so it may be viewed during the reception.
+        """
+        if vmin is None or vmax is None:
+            auto_vmin, auto_vmax = self.statistics.get_value_range(robust)
+            vmin = auto_vmin if vmin is None else vmin
+            vmax = auto_vmax if vmax is None else vmax
+        image = render(self.get_downsampled(), vmin, vmax)
+        atomic_write(figure_path, encode_png(image))
+
+    def read_stream(self, stream, block_size=1 << 20):
+        """
+        Read data from the stream (e.g. pipe) until EOF
+
+        :param stream: Binary file object
+        """
+        while True:
+            data = stream.read(block_size)
+            if not data:
+                break
+            self.feed(data)
+
+    def follow(self, datafile_path, is_running, figure_path=None,
+               plot_interval_s=LIVE_PLOT_INTERVAL_S, poll_interval_s=LIVE_POLL_INTERVAL_S):
+        """
+        Read the data file while it is written (like "tail -f"). Returns when
+        the writer is finished and the whole file is read.
+
+        :param datafile_path: Path to data file, it may not exist yet
+        :param is_running: Function returning False when the writer is finished
+        :type is_running: Callable[[], bool]
+        :param figure_path: Path of the partial image written periodically
+        :param plot_interval_s: Interval of writing the partial image
+        :param poll_interval_s: Interval of checking for new data
+        """
+        while not os.path.exists(datafile_path):
+            if not is_running():
+                return
+            time.sleep(poll_interval_s)
+
+        next_plot = time.monotonic() + plot_interval_s
+        with open(datafile_path, "rb") as f:
+            while True:
+                # Check before reading, so no data written before the exit is lost
+                running = is_running()
+                self.read_stream(f)
+                if not running:
+                    break
+                if figure_path is not None and self.nint != 0 and time.monotonic() >= next_plot:
+                    self.plot(figure_path)
+                    next_plot = time.monotonic() + plot_interval_s
+                time.sleep(poll_interval_s)
+
+
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: waterfall.py waterfall.dat [waterfall.png]")
+    args = [a for a in sys.argv[1:] if a not in ("--annotated", "--robust")]
+    if len(args) < 1:
+        print("Usage: waterfall.py waterfall.dat [waterfall.png] [--annotated] [--robust]")
         sys.exit(-1)
 
-    infile = sys.argv[1]
-    if len(sys.argv) >= 3:
-        outfile = sys.argv[2]
+    infile = args[0]
+    if len(args) >= 2:
+        outfile = args[1]
     else:
-        outfile = sys.argv[1]
-        outfile = outfile[:outfile.rfind(".")]
+        outfile = infile[:infile.rfind(".")]
         outfile += ".png"
 
     w = Waterfall(infile)
-    w.plot(outfile)
+    w.plot(outfile, annotated="--annotated" in sys.argv, robust="--robust" in sys.argv)